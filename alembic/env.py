@@ -1,6 +1,5 @@
 from logging.config import fileConfig
 from sqlalchemy import engine_from_config
-from sqlalchemy import pool
 from alembic import context
 import os
 import sys
@@ -9,15 +8,14 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app.database import Base
-from app.config import get_settings
-
-settings = get_settings()
+from app.database.base import sync_database_url
+from app.core.config import SETTINGS
 
 # Alembic配置对象
 config = context.config
 
 # 设置数据库URL
-config.set_main_option("sqlalchemy.url", settings.database_url)
+config.set_main_option("sqlalchemy.url", sync_database_url(SETTINGS.database_url))
 
 # 如果配置了日志，使用它
 if config.config_file_name is not None:
@@ -46,12 +44,14 @@ def run_migrations_online() -> None:
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
     )
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # 每个迁移单独提交，避免长事务
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -59,7 +59,7 @@ def run_migrations_online() -> None:
 
 
 if context.is_offline_mode():
-    run_migrations_online()
+    run_migrations_offline()
 else:
     run_migrations_online()
 
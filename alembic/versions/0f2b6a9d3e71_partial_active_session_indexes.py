@@ -0,0 +1,41 @@
+"""replace full status indexes with partial indexes on ongoing sessions
+
+Revision ID: 0f2b6a9d3e71
+Revises: c5d17e2b8f64
+Create Date: 2026-10-15 16:10:45.582903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f2b6a9d3e71'
+down_revision: Union[str, None] = 'c5d17e2b8f64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 绝大多数行是已完成的会话，热查询只找进行中的
+    op.create_index(
+        'idx_transactions_active', 'transactions', ['charger_id', 'start_time'],
+        postgresql_where=sa.text("status = 'ongoing'"),
+        if_not_exists=True
+    )
+    op.create_index(
+        'idx_orders_active', 'orders', ['charger_id', 'start_time'],
+        postgresql_where=sa.text("status = 'ongoing'"),
+        if_not_exists=True
+    )
+    op.drop_index('idx_transactions_status', table_name='transactions', if_exists=True)
+    op.drop_index('idx_orders_status', table_name='orders', if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index('idx_orders_status', 'orders', ['status'], if_not_exists=True)
+    op.create_index('idx_transactions_status', 'transactions', ['status'], if_not_exists=True)
+    op.drop_index('idx_orders_active', table_name='orders')
+    op.drop_index('idx_transactions_active', table_name='transactions')
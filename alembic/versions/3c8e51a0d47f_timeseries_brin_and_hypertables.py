@@ -0,0 +1,69 @@
+"""timeseries tables: BRIN timestamp indexes and TimescaleDB hypertables
+
+Revision ID: 3c8e51a0d47f
+Revises: 7d0c9db6932a
+Create Date: 2026-10-15 13:18:40.207945
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e51a0d47f'
+down_revision: Union[str, None] = '7d0c9db6932a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 表名 -> (timestamp上的B-tree索引, 压缩分段列)
+TIMESERIES_TABLES = {
+    'meter_values': ('idx_meter_values_timestamp', 'transaction_id'),
+    'heartbeat_history': ('idx_heartbeat_timestamp', 'charger_id'),
+    'status_history': ('idx_status_timestamp', 'charger_id'),
+}
+
+
+def upgrade() -> None:
+    for table, (index_name, _) in TIMESERIES_TABLES.items():
+        # hypertable 要求唯一约束包含分区列
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey")
+        op.create_primary_key(f"{table}_pkey", table, ['id', 'timestamp'])
+        # 追加写入、按时间有序，用BRIN取代timestamp上的B-tree
+        op.drop_index(f"ix_{table}_timestamp", table_name=table, if_exists=True)
+        op.drop_index(index_name, table_name=table, if_exists=True)
+        op.create_index(
+            index_name, table, ['timestamp'],
+            postgresql_using='brin',
+            postgresql_with={'pages_per_range': 32}
+        )
+    
+    conn = op.get_bind()
+    available = conn.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+    ).scalar()
+    if not available:
+        return
+    
+    op.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+    for table, (_, segment_by) in TIMESERIES_TABLES.items():
+        op.execute(
+            f"SELECT create_hypertable('{table}', 'timestamp', "
+            f"chunk_time_interval => INTERVAL '1 day', "
+            f"if_not_exists => TRUE, migrate_data => TRUE)"
+        )
+        op.execute(
+            f"ALTER TABLE {table} SET (timescaledb.compress, "
+            f"timescaledb.compress_segmentby = '{segment_by}')"
+        )
+        op.execute(f"SELECT add_compression_policy('{table}', INTERVAL '7 days', if_not_exists => TRUE)")
+
+
+def downgrade() -> None:
+    # hypertable 无法原地转换回普通表，这里只恢复索引
+    for table, (index_name, _) in TIMESERIES_TABLES.items():
+        op.drop_index(index_name, table_name=table)
+        op.create_index(index_name, table, ['timestamp'])
+        op.create_index(f"ix_{table}_timestamp", table, ['timestamp'])
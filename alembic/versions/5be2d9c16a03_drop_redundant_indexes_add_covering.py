@@ -0,0 +1,65 @@
+"""drop redundant single-column indexes, add covering history indexes
+
+Revision ID: 5be2d9c16a03
+Revises: a41f0e7b92d5
+Create Date: 2026-10-15 14:31:57.340582
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5be2d9c16a03'
+down_revision: Union[str, None] = 'a41f0e7b92d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 已被主键、同列的显式索引或以该列开头的复合索引覆盖的 index=True 索引
+REDUNDANT_INDEXES = [
+    ('chargers', 'id'),
+    ('transactions', 'id'),
+    ('transactions', 'charger_id'),
+    ('transactions', 'id_tag'),
+    ('meter_values', 'id'),
+    ('charger_configurations', 'id'),
+    ('charger_configurations', 'charger_id'),
+    ('orders', 'id'),
+    ('orders', 'user_id'),
+    ('support_messages', 'id'),
+    ('support_messages', 'user_id'),
+    ('ocpp_error_logs', 'id'),
+    ('ocpp_error_logs', 'charger_id'),
+    ('ocpp_error_logs', 'timestamp'),
+    ('heartbeat_history', 'id'),
+    ('heartbeat_history', 'charger_id'),
+    ('status_history', 'id'),
+    ('status_history', 'charger_id'),
+]
+
+# 历史查询的覆盖索引：(索引名, 表名, 附带列)
+COVERING_INDEXES = [
+    ('idx_heartbeat_charger_timestamp', 'heartbeat_history', ['health_status', 'interval_seconds']),
+    ('idx_status_charger_timestamp', 'status_history', ['status', 'previous_status', 'duration_seconds']),
+]
+
+
+def upgrade() -> None:
+    for table, column in REDUNDANT_INDEXES:
+        op.drop_index(f'ix_{table}_{column}', table_name=table, if_exists=True)
+    
+    for index_name, table, include in COVERING_INDEXES:
+        op.drop_index(index_name, table_name=table, if_exists=True)
+        op.create_index(index_name, table, ['charger_id', 'timestamp'], postgresql_include=include)
+
+
+def downgrade() -> None:
+    for index_name, table, _ in COVERING_INDEXES:
+        op.drop_index(index_name, table_name=table)
+        op.create_index(index_name, table, ['charger_id', 'timestamp'])
+    
+    for table, column in REDUNDANT_INDEXES:
+        op.create_index(f'ix_{table}_{column}', table, [column], if_not_exists=True)
@@ -0,0 +1,54 @@
+"""add chargers is_configured generated column
+
+Revision ID: 7d0c9db6932a
+Revises: f6195b3fad29
+Create Date: 2026-10-15 11:02:14.663208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d0c9db6932a'
+down_revision: Union[str, None] = 'f6195b3fad29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 是否已配置（有位置和价格）由数据库生成，list_chargers 直接按该列过滤
+    op.add_column(
+        'chargers',
+        sa.Column(
+            'is_configured', sa.Boolean(),
+            sa.Computed(
+                "latitude IS NOT NULL AND longitude IS NOT NULL "
+                "AND COALESCE(price_per_kwh, 0) > 0",
+                persisted=True
+            ),
+            nullable=False
+        )
+    )
+    op.create_index(
+        'idx_chargers_is_configured', 'chargers', ['is_configured'],
+        postgresql_where=sa.text("is_active"),
+        if_not_exists=True
+    )
+    # 由 idx_chargers_is_configured 取代
+    op.drop_index('idx_chargers_unconfigured', table_name='chargers', if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index(
+        'idx_chargers_unconfigured', 'chargers', ['id'],
+        postgresql_where=sa.text(
+            "latitude IS NULL OR longitude IS NULL "
+            "OR price_per_kwh IS NULL OR price_per_kwh = 0"
+        ),
+        if_not_exists=True
+    )
+    op.drop_index('idx_chargers_is_configured', table_name='chargers')
+    op.drop_column('chargers', 'is_configured')
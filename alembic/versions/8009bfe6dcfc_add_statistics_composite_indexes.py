@@ -0,0 +1,38 @@
+"""add statistics composite indexes
+
+Revision ID: 8009bfe6dcfc
+Revises:
+Create Date: 2026-10-15 09:12:31.402113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8009bfe6dcfc'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 统计接口按 (charger_id, start_time/timestamp) 做范围查询
+    op.create_index(
+        'idx_transactions_charger_start', 'transactions',
+        ['charger_id', 'start_time'], if_not_exists=True
+    )
+    op.create_index(
+        'idx_heartbeat_charger_timestamp', 'heartbeat_history',
+        ['charger_id', 'timestamp'], if_not_exists=True
+    )
+    op.create_index(
+        'idx_status_charger_timestamp', 'status_history',
+        ['charger_id', 'timestamp'], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_transactions_charger_start', table_name='transactions')
@@ -0,0 +1,65 @@
+"""meter_values: JSONB sampled_value and promoted measurand columns
+
+Revision ID: a41f0e7b92d5
+Revises: 3c8e51a0d47f
+Create Date: 2026-10-15 13:52:09.871134
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41f0e7b92d5'
+down_revision: Union[str, None] = '3c8e51a0d47f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _compression_enabled(conn) -> bool:
+    """meter_values 是否为已启用压缩的 hypertable（压缩块上不能修改列类型）"""
+    has_timescale = conn.execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    ).scalar()
+    if not has_timescale:
+        return False
+    return bool(conn.execute(sa.text(
+        "SELECT compression_enabled FROM timescaledb_information.hypertables "
+        "WHERE hypertable_name = 'meter_values'"
+    )).scalar())
+
+
+def _alter_sampled_value(type_, using: str) -> None:
+    conn = op.get_bind()
+    compressed = _compression_enabled(conn)
+    if compressed:
+        op.execute("SELECT remove_compression_policy('meter_values', if_exists => TRUE)")
+        op.execute("SELECT decompress_chunk(c, if_compressed => TRUE) FROM show_chunks('meter_values') c")
+        op.execute("ALTER TABLE meter_values SET (timescaledb.compress = FALSE)")
+    op.alter_column(
+        'meter_values', 'sampled_value',
+        type_=type_, postgresql_using=using, existing_nullable=True
+    )
+    if compressed:
+        op.execute(
+            "ALTER TABLE meter_values SET (timescaledb.compress, "
+            "timescaledb.compress_segmentby = 'transaction_id')"
+        )
+        op.execute("SELECT add_compression_policy('meter_values', INTERVAL '7 days', if_not_exists => TRUE)")
+
+
+def upgrade() -> None:
+    op.add_column('meter_values', sa.Column('voltage', sa.Float(), nullable=True))
+    op.add_column('meter_values', sa.Column('current', sa.Float(), nullable=True))
+    op.add_column('meter_values', sa.Column('soc', sa.Float(), nullable=True))
+    _alter_sampled_value(postgresql.JSONB(), 'sampled_value::jsonb')
+
+
+def downgrade() -> None:
+    _alter_sampled_value(sa.JSON(), 'sampled_value::json')
+    op.drop_column('meter_values', 'soc')
+    op.drop_column('meter_values', 'current')
+    op.drop_column('meter_values', 'voltage')
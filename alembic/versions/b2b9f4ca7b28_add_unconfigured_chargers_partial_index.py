@@ -0,0 +1,34 @@
+"""add unconfigured chargers partial index
+
+Revision ID: b2b9f4ca7b28
+Revises: 8009bfe6dcfc
+Create Date: 2026-10-15 09:40:05.118730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2b9f4ca7b28'
+down_revision: Union[str, None] = '8009bfe6dcfc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # list_chargers?filter_type=unconfigured 只扫描缺少位置或价格的充电桩
+    op.create_index(
+        'idx_chargers_unconfigured', 'chargers', ['id'],
+        postgresql_where=sa.text(
+            "latitude IS NULL OR longitude IS NULL "
+            "OR price_per_kwh IS NULL OR price_per_kwh = 0"
+        ),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_chargers_unconfigured', table_name='chargers')
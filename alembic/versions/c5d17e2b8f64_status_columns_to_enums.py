@@ -0,0 +1,116 @@
+"""convert low-cardinality status columns to PostgreSQL ENUM types
+
+Revision ID: c5d17e2b8f64
+Revises: e93a7c4f5b18
+Create Date: 2026-10-15 15:48:33.120574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d17e2b8f64'
+down_revision: Union[str, None] = 'e93a7c4f5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CHARGER_STATUS_VALUES = (
+    'Available', 'Preparing', 'Charging', 'SuspendedEVSE', 'SuspendedEV',
+    'Finishing', 'Reserved', 'Unavailable', 'Faulted', 'Offline', 'Unknown',
+)
+
+# 枚举类型名 -> (取值, 不在取值内的旧数据归并为, [(表名, 列名, 原长度)])
+ENUM_COLUMNS = {
+    'charger_status': (CHARGER_STATUS_VALUES, 'Unknown', [
+        ('chargers', 'status', 50),
+        ('status_history', 'status', 50),
+        ('status_history', 'previous_status', 50),
+    ]),
+    'session_status': (('ongoing', 'completed', 'cancelled'), 'cancelled', [
+        ('transactions', 'status', 50),
+        ('orders', 'status', 50),
+    ]),
+    'heartbeat_health_status': (('normal', 'warning', 'abnormal'), 'abnormal', [
+        ('heartbeat_history', 'health_status', 20),
+    ]),
+    'support_message_status': (('pending', 'replied'), 'pending', [
+        ('support_messages', 'status', 50),
+    ]),
+}
+
+# 已启用压缩的 hypertable 上不能修改列类型，需要先解压
+COMPRESSED_TABLES = {
+    'status_history': 'charger_id',
+    'heartbeat_history': 'charger_id',
+}
+
+
+def _compressed_tables(conn) -> list:
+    has_timescale = conn.execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    ).scalar()
+    if not has_timescale:
+        return []
+    return [
+        table for table in COMPRESSED_TABLES
+        if conn.execute(sa.text(
+            "SELECT compression_enabled FROM timescaledb_information.hypertables "
+            "WHERE hypertable_name = :table"
+        ), {'table': table}).scalar()
+    ]
+
+
+def _disable_compression(tables: list) -> None:
+    for table in tables:
+        op.execute(f"SELECT remove_compression_policy('{table}', if_exists => TRUE)")
+        op.execute(f"SELECT decompress_chunk(c, if_compressed => TRUE) FROM show_chunks('{table}') c")
+        op.execute(f"ALTER TABLE {table} SET (timescaledb.compress = FALSE)")
+
+
+def _enable_compression(tables: list) -> None:
+    for table in tables:
+        op.execute(
+            f"ALTER TABLE {table} SET (timescaledb.compress, "
+            f"timescaledb.compress_segmentby = '{COMPRESSED_TABLES[table]}')"
+        )
+        op.execute(f"SELECT add_compression_policy('{table}', INTERVAL '7 days', if_not_exists => TRUE)")
+
+
+def upgrade() -> None:
+    compressed = _compressed_tables(op.get_bind())
+    _disable_compression(compressed)
+    
+    for enum_name, (values, fallback, columns) in ENUM_COLUMNS.items():
+        postgresql.ENUM(*values, name=enum_name).create(op.get_bind(), checkfirst=True)
+        quoted_values = ", ".join(f"'{v}'" for v in values)
+        for table, column, _ in columns:
+            op.execute(
+                f"UPDATE {table} SET {column} = '{fallback}' "
+                f"WHERE {column} IS NOT NULL AND {column} NOT IN ({quoted_values})"
+            )
+            op.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} "
+                f"TYPE {enum_name} USING {column}::{enum_name}"
+            )
+    
+    _enable_compression(compressed)
+
+
+def downgrade() -> None:
+    compressed = _compressed_tables(op.get_bind())
+    _disable_compression(compressed)
+    
+    for enum_name, (_, _, columns) in ENUM_COLUMNS.items():
+        for table, column, length in columns:
+            op.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} "
+                f"TYPE VARCHAR({length}) USING {column}::text"
+            )
+        op.execute(f"DROP TYPE IF EXISTS {enum_name}")
+    
+    _enable_compression(compressed)
@@ -0,0 +1,57 @@
+"""ocpp_error_logs: time-partitioned like the other history tables
+
+Revision ID: e93a7c4f5b18
+Revises: 5be2d9c16a03
+Create Date: 2026-10-15 15:06:22.918410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93a7c4f5b18'
+down_revision: Union[str, None] = '5be2d9c16a03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # timestamp 成为主键的一部分，不能为空
+    op.execute("UPDATE ocpp_error_logs SET timestamp = now() WHERE timestamp IS NULL")
+    op.alter_column('ocpp_error_logs', 'timestamp', nullable=False)
+    op.execute("ALTER TABLE ocpp_error_logs DROP CONSTRAINT IF EXISTS ocpp_error_logs_pkey")
+    op.create_primary_key('ocpp_error_logs_pkey', 'ocpp_error_logs', ['id', 'timestamp'])
+    
+    op.drop_index('idx_error_logs_timestamp', table_name='ocpp_error_logs', if_exists=True)
+    op.create_index(
+        'idx_error_logs_timestamp', 'ocpp_error_logs', ['timestamp'],
+        postgresql_using='brin',
+        postgresql_with={'pages_per_range': 32}
+    )
+    
+    conn = op.get_bind()
+    has_timescale = conn.execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    ).scalar()
+    if not has_timescale:
+        return
+    
+    op.execute(
+        "SELECT create_hypertable('ocpp_error_logs', 'timestamp', "
+        "chunk_time_interval => INTERVAL '1 day', "
+        "if_not_exists => TRUE, migrate_data => TRUE)"
+    )
+    op.execute(
+        "ALTER TABLE ocpp_error_logs SET (timescaledb.compress, "
+        "timescaledb.compress_segmentby = 'charger_id')"
+    )
+    op.execute("SELECT add_compression_policy('ocpp_error_logs', INTERVAL '7 days', if_not_exists => TRUE)")
+
+
+def downgrade() -> None:
+    # hypertable 无法原地转换回普通表，这里只恢复索引
+    op.drop_index('idx_error_logs_timestamp', table_name='ocpp_error_logs')
+    op.create_index('idx_error_logs_timestamp', 'ocpp_error_logs', ['timestamp'])
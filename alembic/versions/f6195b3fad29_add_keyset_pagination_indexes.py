@@ -0,0 +1,34 @@
+"""add keyset pagination indexes
+
+Revision ID: f6195b3fad29
+Revises: b2b9f4ca7b28
+Create Date: 2026-10-15 10:21:47.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6195b3fad29'
+down_revision: Union[str, None] = 'b2b9f4ca7b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 订单/事务列表按 (start_time, id) 倒序做键集分页，反向扫描该索引即可
+    op.create_index('idx_orders_start_time_id', 'orders', ['start_time', 'id'], if_not_exists=True)
+    op.create_index('idx_transactions_start_time_id', 'transactions', ['start_time', 'id'], if_not_exists=True)
+    # 单列 start_time 索引已被 (start_time, id) 复合索引覆盖
+    op.drop_index('idx_orders_start_time', table_name='orders', if_exists=True)
+    op.drop_index('idx_transactions_start_time', table_name='transactions', if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index('idx_transactions_start_time', 'transactions', ['start_time'], if_not_exists=True)
+    op.create_index('idx_orders_start_time', 'orders', ['start_time'], if_not_exists=True)
+    op.drop_index('idx_transactions_start_time_id', table_name='transactions')
+    op.drop_index('idx_orders_start_time_id', table_name='orders')
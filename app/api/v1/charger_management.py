@@ -4,14 +4,17 @@
 #
 
 from typing import List, Optional
+import anyio
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, raiseload
 from datetime import datetime, timezone
 
 from app.database import get_db, Charger
 from app.core.logging_config import get_logger
 from app.core.config import get_settings
+from app.core.cache import invalidate_chargers_cache
+from app.utils.charger_hash import CHARGERS_INDEX_KEY, charger_key, flatten_charger, unflatten_charger
 
 settings = get_settings()
 logger = get_logger("ocpp_csms")
@@ -85,7 +88,8 @@ def check_charger_connection(charger_id: str) -> bool:
         # 分布式模式
         try:
             from app.ocpp.distributed_connection_manager import distributed_connection_manager
-            return distributed_connection_manager.is_connected(charger_id)
+            # 同步端点运行在线程池中，回到事件循环执行异步Redis查询
+            return anyio.from_thread.run(distributed_connection_manager.is_connected, charger_id)
         except Exception:
             return False
     else:
@@ -101,21 +105,28 @@ def get_charger_from_redis(charger_id: str) -> Optional[dict]:
     """从Redis获取充电桩信息"""
     try:
         import redis
-        import json
         import os
         
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         redis_client = redis.from_url(redis_url, decode_responses=True)
         
-        charger_data = redis_client.hget("chargers", charger_id)
-        if charger_data:
-            return json.loads(charger_data)
+        fields = redis_client.hgetall(charger_key(charger_id))
+        if fields:
+            return unflatten_charger(fields)
         return None
     except Exception as e:
         logger.error(f"从Redis获取充电桩信息失败: {e}")
         return None
 
 
+def _save_charger_fields(redis_client, charger_id: str, charger_data: dict) -> None:
+    """将部分充电桩字段写入Redis（charger:{id} Hash），并加入充电桩索引"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(charger_key(charger_id), mapping=flatten_charger(charger_data))
+    pipe.sadd(CHARGERS_INDEX_KEY, charger_id)
+    pipe.execute()
+
+
 # ==================== API端点 ====================
 
 @router.get("/pending", summary="获取待配置的充电桩列表")
@@ -137,7 +148,7 @@ def get_pending_chargers(db: Session = Depends(get_db)) -> List[ChargerStatus]:
         # 分布式模式
         try:
             from app.ocpp.distributed_connection_manager import distributed_connection_manager
-            connected_ids = distributed_connection_manager.get_all_connected_chargers()
+            connected_ids = anyio.from_thread.run(distributed_connection_manager.get_all_connected_chargers)
         except Exception:
             connected_ids = []
     else:
@@ -148,13 +159,23 @@ def get_pending_chargers(db: Session = Depends(get_db)) -> List[ChargerStatus]:
         except Exception:
             connected_ids = []
     
+    # 一次查询取出所有已连接充电桩的配置信息，避免逐个查询
+    db_chargers = {}
+    if connected_ids:
+        db_chargers = {
+            row.id: row
+            for row in db.query(
+                Charger.id, Charger.latitude, Charger.longitude, Charger.price_per_kwh
+            ).filter(Charger.id.in_(connected_ids))
+        }
+    
     # 检查每个已连接的充电桩
     for charger_id in connected_ids:
         # 从Redis获取实时状态
         redis_charger = get_charger_from_redis(charger_id)
         
-        # 从数据库获取配置信息
-        db_charger = db.query(Charger).filter(Charger.id == charger_id).first()
+        # 数据库中的配置信息
+        db_charger = db_chargers.get(charger_id)
         
         # 判断是否需要配置
         is_configured = False
@@ -197,7 +218,7 @@ def create_charger(req: CreateChargerRequest, db: Session = Depends(get_db)) ->
     如果充电桩已存在，则更新信息
     """
     # 检查充电桩是否已存在
-    charger = db.query(Charger).filter(Charger.id == req.charger_id).first()
+    charger = db.query(Charger).options(raiseload("*")).filter(Charger.id == req.charger_id).first()
     
     if charger:
         # 更新现有充电桩
@@ -250,14 +271,13 @@ def create_charger(req: CreateChargerRequest, db: Session = Depends(get_db)) ->
         # 同步更新Redis
         try:
             import redis
-            import json
             import os
             
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
             redis_client = redis.from_url(redis_url, decode_responses=True)
             
-            charger_data = get_charger_from_redis(req.charger_id) or {}
-            charger_data.update({
+            # 只写入本次修改的字段，其余字段保持不变
+            charger_data = {
                 "id": req.charger_id,
                 "vendor": req.vendor,
                 "model": req.model,
@@ -269,12 +289,13 @@ def create_charger(req: CreateChargerRequest, db: Session = Depends(get_db)) ->
                     "longitude": req.longitude,
                     "address": req.address or ""
                 }
-            })
+            }
             
-            redis_client.hset("chargers", req.charger_id, json.dumps(charger_data))
+            _save_charger_fields(redis_client, req.charger_id, charger_data)
         except Exception as e:
             logger.warning(f"同步Redis失败: {e}")
         
+        invalidate_chargers_cache()
         logger.info(f"充电桩 {req.charger_id} 已创建/更新")
         
         return {
@@ -303,7 +324,7 @@ def create_charger(req: CreateChargerRequest, db: Session = Depends(get_db)) ->
 @router.post("/location", summary="设置充电桩位置")
 def update_charger_location(req: UpdateChargerLocationRequest, db: Session = Depends(get_db)) -> dict:
     """设置或更新充电桩的地理位置"""
-    charger = db.query(Charger).filter(Charger.id == req.charger_id).first()
+    charger = db.query(Charger).options(raiseload("*")).filter(Charger.id == req.charger_id).first()
     
     if not charger:
         raise HTTPException(status_code=404, detail=f"充电桩 {req.charger_id} 未找到，请先创建充电桩")
@@ -320,23 +341,25 @@ def update_charger_location(req: UpdateChargerLocationRequest, db: Session = Dep
         # 同步更新Redis
         try:
             import redis
-            import json
             import os
             
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
             redis_client = redis.from_url(redis_url, decode_responses=True)
             
-            charger_data = get_charger_from_redis(req.charger_id) or {"id": req.charger_id}
-            charger_data["location"] = {
-                "latitude": req.latitude,
-                "longitude": req.longitude,
-                "address": req.address
+            charger_data = {
+                "id": req.charger_id,
+                "location": {
+                    "latitude": req.latitude,
+                    "longitude": req.longitude,
+                    "address": req.address
+                }
             }
             
-            redis_client.hset("chargers", req.charger_id, json.dumps(charger_data))
+            _save_charger_fields(redis_client, req.charger_id, charger_data)
         except Exception as e:
             logger.warning(f"同步Redis失败: {e}")
         
+        invalidate_chargers_cache()
         logger.info(f"充电桩 {req.charger_id} 位置已更新: ({req.latitude}, {req.longitude})")
         
         return {
@@ -357,7 +380,7 @@ def update_charger_location(req: UpdateChargerLocationRequest, db: Session = Dep
 @router.post("/pricing", summary="设置充电桩定价")
 def update_charger_pricing(req: UpdateChargerPricingRequest, db: Session = Depends(get_db)) -> dict:
     """设置或更新充电桩的价格和充电速率"""
-    charger = db.query(Charger).filter(Charger.id == req.charger_id).first()
+    charger = db.query(Charger).options(raiseload("*")).filter(Charger.id == req.charger_id).first()
     
     if not charger:
         raise HTTPException(status_code=404, detail=f"充电桩 {req.charger_id} 未找到，请先创建充电桩")
@@ -374,21 +397,20 @@ def update_charger_pricing(req: UpdateChargerPricingRequest, db: Session = Depen
         # 同步更新Redis
         try:
             import redis
-            import json
             import os
             
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
             redis_client = redis.from_url(redis_url, decode_responses=True)
             
-            charger_data = get_charger_from_redis(req.charger_id) or {"id": req.charger_id}
-            charger_data["price_per_kwh"] = req.price_per_kwh
+            charger_data = {"id": req.charger_id, "price_per_kwh": req.price_per_kwh}
             if req.charging_rate:
                 charger_data["charging_rate"] = req.charging_rate
             
-            redis_client.hset("chargers", req.charger_id, json.dumps(charger_data))
+            _save_charger_fields(redis_client, req.charger_id, charger_data)
         except Exception as e:
             logger.warning(f"同步Redis失败: {e}")
         
+        invalidate_chargers_cache()
         logger.info(f"充电桩 {req.charger_id} 价格已更新: {req.price_per_kwh} COP/kWh")
         
         return {
@@ -415,7 +437,7 @@ def get_charger_status(charger_id: str, db: Session = Depends(get_db)) -> dict:
     redis_charger = get_charger_from_redis(charger_id)
     
     # 从数据库获取配置信息
-    db_charger = db.query(Charger).filter(Charger.id == charger_id).first()
+    db_charger = db.query(Charger).options(raiseload("*")).filter(Charger.id == charger_id).first()
     
     # 判断配置完整性
     is_configured = db_charger is not None
@@ -4,16 +4,22 @@
 #
 
 from typing import List, Optional
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, raiseload
 from app.database import get_db, Charger
 from app.core.logging_config import get_logger
+from app.core.cache import (
+    CHARGERS_CACHE_KEY, CHARGERS_CACHE_EXPIRE, get_cached, set_cached, json_response
+)
 
 logger = get_logger("ocpp_csms")
 
 router = APIRouter()
 
+# 预先绑定，列表序列化时免去每行的属性查找
+_iso = datetime.isoformat
+
 
 @router.get("", summary="获取所有充电桩")
 def list_chargers(
@@ -26,64 +32,74 @@ def list_chargers(
     支持筛选：
     - configured: 只返回已配置的充电桩（有位置和价格）
     - unconfigured: 只返回未配置的充电桩（缺少位置或价格）
+    
+    结果在Redis中缓存30秒，充电桩数据变化时失效
     """
-    query = db.query(Charger).filter(Charger.is_active == True)
+    cache_field = filter_type or "all"
+    cached = get_cached(CHARGERS_CACHE_KEY, cache_field)
+    if cached is not None:
+        return json_response(cached)
+    
+    query = db.query(Charger).filter(Charger.is_active == True).with_entities(
+        Charger.id,
+        Charger.vendor,
+        Charger.model,
+        Charger.status,
+        Charger.last_seen,
+        Charger.latitude,
+        Charger.longitude,
+        Charger.address,
+        Charger.connector_type,
+        Charger.charging_rate,
+        Charger.price_per_kwh,
+        Charger.is_configured,
+    )
     
-    # 根据筛选类型过滤
+    # 根据筛选类型过滤（is_configured 为数据库生成列）
     if filter_type == "configured":
         # 已配置：有位置和价格
-        query = query.filter(
-            Charger.latitude.isnot(None),
-            Charger.longitude.isnot(None),
-            Charger.price_per_kwh.isnot(None),
-            Charger.price_per_kwh > 0
-        )
+        query = query.filter(Charger.is_configured == True)
     elif filter_type == "unconfigured":
         # 未配置：缺少位置或价格
-        query = query.filter(
-            or_(
-                Charger.latitude.is_(None),
-                Charger.longitude.is_(None),
-                Charger.price_per_kwh.is_(None),
-                Charger.price_per_kwh == 0
-            )
-        )
+        query = query.filter(Charger.is_configured == False)
     
-    chargers = query.all()
-    
-    result = []
-    for c in chargers:
-        # 判断配置状态
-        has_location = c.latitude is not None and c.longitude is not None
-        has_pricing = c.price_per_kwh is not None and c.price_per_kwh > 0
-        is_configured = has_location and has_pricing
-        
-        result.append({
-            "id": c.id,
-            "vendor": c.vendor,
-            "model": c.model,
-            "status": c.status,
-            "last_seen": c.last_seen.isoformat() if c.last_seen else None,
-            "location": {
-                "latitude": c.latitude,
-                "longitude": c.longitude,
-                "address": c.address,
-            },
-            "connector_type": c.connector_type,
-            "charging_rate": c.charging_rate,
-            "price_per_kwh": c.price_per_kwh,
-            "is_configured": is_configured,
-            "has_location": has_location,
-            "has_pricing": has_pricing,
-        })
-    
-    return result
+    result = [_charger_row_to_dict(r) for r in query.all()]
+    return json_response(set_cached(CHARGERS_CACHE_KEY, result, CHARGERS_CACHE_EXPIRE, cache_field))
+
+
+def _charger_row_to_dict(r) -> dict:
+    """将充电桩查询行转换为响应字典"""
+    is_configured = r.is_configured
+    if is_configured:
+        has_location = has_pricing = True
+    else:
+        has_location = r.latitude is not None and r.longitude is not None
+        has_pricing = r.price_per_kwh is not None and r.price_per_kwh > 0
+    return {
+        "id": r.id,
+        "vendor": r.vendor,
+        "model": r.model,
+        "status": r.status,
+        "last_seen": _iso(r.last_seen) if r.last_seen else None,
+        "location": {
+            "latitude": r.latitude,
+            "longitude": r.longitude,
+            "address": r.address,
+        },
+        "connector_type": r.connector_type,
+        "charging_rate": r.charging_rate,
+        "price_per_kwh": r.price_per_kwh,
+        "is_configured": is_configured,
+        "has_location": has_location,
+        "has_pricing": has_pricing,
+    }
 
 
 @router.get("/{charger_id}", summary="获取充电桩详情")
 def get_charger(charger_id: str, db: Session = Depends(get_db)) -> dict:
     """获取单个充电桩的详细信息"""
-    charger = db.query(Charger).filter(Charger.id == charger_id).first()
+    # 响应只用到列属性，禁止关系懒加载以免无意中触发额外查询
+    charger = db.query(Charger).options(raiseload("*")).filter(Charger.id == charger_id).first()
     if not charger:
         raise HTTPException(status_code=404, detail=f"充电桩 {charger_id} 未找到")
     
@@ -21,6 +21,13 @@ else:
 router = APIRouter()
 
 
+async def _is_connected(charger_id: str) -> bool:
+    """检查充电桩是否连接（分布式模式需要查询Redis）"""
+    if settings.enable_distributed:
+        return await connection_manager.is_connected(charger_id)
+    return connection_manager.is_connected(charger_id)
+
+
 class RemoteStartRequest(BaseModel):
     chargePointId: str
     idTag: str
@@ -41,7 +48,7 @@ class RemoteResponse(BaseModel):
 @router.post("/remoteStart", response_model=RemoteResponse, summary="远程启动充电")
 async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
     """远程启动充电事务"""
-    if not connection_manager.is_connected(req.chargePointId):
+    if not await _is_connected(req.chargePointId):
         raise ChargerNotConnectedException(req.chargePointId)
     
     # 使用消息处理器（支持分布式）
@@ -74,7 +81,7 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
 @router.post("/remoteStop", response_model=RemoteResponse, summary="远程停止充电")
 async def remote_stop(req: RemoteStopRequest) -> RemoteResponse:
     """远程停止充电事务"""
-    if not connection_manager.is_connected(req.chargePointId):
+    if not await _is_connected(req.chargePointId):
         raise ChargerNotConnectedException(req.chargePointId)
     
     # 使用消息处理器（支持分布式）
@@ -3,48 +3,74 @@
 # 提供充电订单的查询和管理
 #
 
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+from typing import List, Literal, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 from app.database import get_db, Order
+from app.utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter()
 
+_iso = datetime.isoformat
+
 
 @router.get("", summary="获取订单列表")
 def list_orders(
+    response: Response,
     user_id: Optional[str] = Query(None, description="用户ID"),
     charger_id: Optional[str] = Query(None, description="充电桩ID"),
-    status: Optional[str] = Query(None, description="状态过滤"),
+    status: Optional[Literal["ongoing", "completed", "cancelled"]] = Query(None, description="状态过滤"),
     limit: int = Query(100, le=1000),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="偏移量（已弃用，深分页请使用 before 游标）"),
+    before: Optional[str] = Query(None, description="分页游标，取自上一页响应头 X-Next-Cursor"),
     db: Session = Depends(get_db)
 ) -> List[dict]:
     """获取订单列表"""
-    query = db.query(Order)
+    # 只选需要的列，返回普通Row元组，不经过ORM实例化和identity map
+    query = select(
+        Order.id, Order.charger_id, Order.user_id, Order.id_tag,
+        Order.start_time, Order.end_time, Order.energy_kwh,
+        Order.duration_minutes, Order.total_cost, Order.status,
+    )
     
     if user_id:
-        query = query.filter(Order.user_id == user_id)
+        query = query.where(Order.user_id == user_id)
     if charger_id:
-        query = query.filter(Order.charger_id == charger_id)
+        query = query.where(Order.charger_id == charger_id)
     if status:
-        query = query.filter(Order.status == status)
+        query = query.where(Order.status == status)
+    
+    if before:
+        # 键集分页：直接定位到游标之后，代价与页深无关
+        cursor_time, cursor_id = decode_cursor(before, str)
+        query = query.where(tuple_(Order.start_time, Order.id) < (cursor_time, cursor_id))
+    elif offset:
+        query = query.offset(offset)
     
-    orders = query.order_by(Order.start_time.desc()).offset(offset).limit(limit).all()
+    rows = db.execute(
+        query.order_by(Order.start_time.desc(), Order.id.desc()).limit(limit)
+    ).all()
+    
+    # 满页时返回下一页游标
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last[4], last[0])
     
     return [
         {
-            "id": o.id,
-            "charger_id": o.charger_id,
-            "user_id": o.user_id,
-            "id_tag": o.id_tag,
-            "start_time": o.start_time.isoformat() if o.start_time else None,
-            "end_time": o.end_time.isoformat() if o.end_time else None,
-            "energy_kwh": o.energy_kwh,
-            "duration_minutes": o.duration_minutes,
-            "total_cost": o.total_cost,
-            "status": o.status,
+            "id": order_id,
+            "charger_id": order_charger_id,
+            "user_id": order_user_id,
+            "id_tag": id_tag,
+            "start_time": _iso(start_time) if start_time else None,
+            "end_time": _iso(end_time) if end_time else None,
+            "energy_kwh": energy_kwh,
+            "duration_minutes": duration_minutes,
+            "total_cost": total_cost,
+            "status": order_status,
         }
-        for o in orders
+        for (order_id, order_charger_id, order_user_id, id_tag, start_time, end_time,
+             energy_kwh, duration_minutes, total_cost, order_status) in rows
     ]
-
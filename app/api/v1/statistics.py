@@ -4,22 +4,44 @@
 #
 
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case
-from app.database import get_db, Charger, Transaction, MeterValue, HeartbeatHistory, StatusHistory
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, or_, case
+from sqlalchemy.orm import load_only, raiseload
+from app.database import get_async_db, Charger, Transaction, MeterValue, HeartbeatHistory, StatusHistory
 from app.core.logging_config import get_logger
+from app.utils.time_buckets import bucket_last_status
+from app.core.cache import (
+    HISTORY_CACHE_PREFIX, HISTORY_CACHE_EXPIRE, aget_cached, aset_cached, json_response
+)
 
 logger = get_logger("ocpp_csms")
 router = APIRouter()
 
 
+async def _charger_exists(db: AsyncSession, charger_id: str) -> bool:
+    """只按主键检查充电桩是否存在，不加载整行"""
+    result = await db.execute(select(Charger.id).where(Charger.id == charger_id))
+    return result.scalar() is not None
+
+
+def _date_keys(end_day: date, days: int) -> List[str]:
+    """返回截至 end_day 的最近 days 天日期键，按日期升序"""
+    return [(end_day - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+
+
+def _day_index(end_day: date, day: date, days: int) -> Optional[int]:
+    """日期在 _date_keys 列表中的下标，超出范围返回None"""
+    idx = days - 1 - (end_day - day).days
+    return idx if 0 <= idx < days else None
+
+
 @router.get("/charger/{charger_id}/history", summary="获取充电桩历史监控数据")
-def get_charger_history(
+async def get_charger_history(
     charger_id: str,
     days: int = Query(10, ge=1, le=30, description="查询天数，默认10天"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """
     获取充电桩过去N天的监控数据
@@ -31,9 +53,20 @@ def get_charger_history(
     - 每日充电时长（分钟）
     - 每日收入（COP）
     - 状态分布
+    
+    结果在Redis中缓存5分钟
     """
-    # 验证充电桩是否存在
-    charger = db.query(Charger).filter(Charger.id == charger_id).first()
+    cache_key = f"{HISTORY_CACHE_PREFIX}{charger_id}:{days}"
+    cached = await aget_cached(cache_key)
+    if cached is not None:
+        return json_response(cached)
+    
+    # 验证充电桩是否存在（只加载返回的列）
+    charger = await db.get(Charger, charger_id, options=[load_only(
+        Charger.id, Charger.vendor, Charger.model, Charger.status,
+        Charger.latitude, Charger.longitude, Charger.address,
+        Charger.price_per_kwh, Charger.charging_rate
+    ), raiseload("*")])
     if not charger:
         raise HTTPException(status_code=404, detail=f"充电桩 {charger_id} 未找到")
     
@@ -41,21 +74,27 @@ def get_charger_history(
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    # 获取该充电桩的所有事务（已完成）
-    transactions = db.query(Transaction).filter(
-        Transaction.charger_id == charger_id,
-        Transaction.start_time >= start_date,
-        Transaction.status == "completed"
-    ).all()
-    
-    # 按天统计数据
-    daily_stats = {}
-    
-    # 初始化所有天的数据
-    for i in range(days):
-        date = (end_date - timedelta(days=i)).date()
-        daily_stats[date.isoformat()] = {
-            "date": date.isoformat(),
+    # 按天聚合已完成事务（由数据库完成汇总，避免逐行加载ORM对象）
+    day = func.date_trunc("day", Transaction.start_time).label("day")
+    daily_rows = (await db.execute(
+        select(
+            day,
+            func.count(Transaction.id),
+            func.coalesce(func.sum(Transaction.energy_kwh), 0.0),
+            func.coalesce(func.sum(Transaction.duration_minutes), 0.0),
+            func.coalesce(func.sum(Transaction.total_cost), 0.0),
+        ).where(
+            Transaction.charger_id == charger_id,
+            Transaction.start_time >= start_date,
+            Transaction.status == "completed"
+        ).group_by(day)
+    )).all()
+    
+    # 按天统计数据（按日期升序排列，下标由日期偏移直接算出）
+    end_day = end_date.date()
+    daily_stats_list = [
+        {
+            "date": date_key,
             "charging_sessions": 0,
             "total_energy_kwh": 0.0,
             "total_duration_minutes": 0.0,
@@ -63,41 +102,35 @@ def get_charger_history(
             "avg_energy_per_session": 0.0,
             "avg_duration_per_session": 0.0,
         }
+        for date_key in _date_keys(end_day, days)
+    ]
     
-    # 统计事务数据
-    for tx in transactions:
-        if tx.start_time:
-            tx_date = tx.start_time.date()
-            date_key = tx_date.isoformat()
-            
-            if date_key in daily_stats:
-                daily_stats[date_key]["charging_sessions"] += 1
-                if tx.energy_kwh:
-                    daily_stats[date_key]["total_energy_kwh"] += tx.energy_kwh
-                if tx.duration_minutes:
-                    daily_stats[date_key]["total_duration_minutes"] += tx.duration_minutes
-                if tx.total_cost:
-                    daily_stats[date_key]["total_revenue"] += tx.total_cost
-    
-    # 计算平均值
-    for date_key, stats in daily_stats.items():
-        if stats["charging_sessions"] > 0:
-            stats["avg_energy_per_session"] = stats["total_energy_kwh"] / stats["charging_sessions"]
-            stats["avg_duration_per_session"] = stats["total_duration_minutes"] / stats["charging_sessions"]
-    
-    # 转换为列表并按日期排序
-    daily_stats_list = sorted(
-        [stats for stats in daily_stats.values()],
-        key=lambda x: x["date"]
-    )
-    
-    # 计算总计
+    # 填充聚合结果
+    for row_day, sessions, energy, duration, revenue in daily_rows:
+        idx = _day_index(end_day, row_day.date(), days)
+        if idx is not None:
+            stats = daily_stats_list[idx]
+            stats["charging_sessions"] = sessions
+            stats["total_energy_kwh"] = float(energy)
+            stats["total_duration_minutes"] = float(duration)
+            stats["total_revenue"] = float(revenue)
+    
+    # 计算平均值，同时累加总计
     total_stats = {
-        "total_sessions": sum(s["charging_sessions"] for s in daily_stats_list),
-        "total_energy_kwh": sum(s["total_energy_kwh"] for s in daily_stats_list),
-        "total_duration_minutes": sum(s["total_duration_minutes"] for s in daily_stats_list),
-        "total_revenue": sum(s["total_revenue"] for s in daily_stats_list),
+        "total_sessions": 0,
+        "total_energy_kwh": 0.0,
+        "total_duration_minutes": 0.0,
+        "total_revenue": 0.0,
     }
+    for stats in daily_stats_list:
+        sessions = stats["charging_sessions"]
+        if sessions > 0:
+            stats["avg_energy_per_session"] = stats["total_energy_kwh"] / sessions
+            stats["avg_duration_per_session"] = stats["total_duration_minutes"] / sessions
+        total_stats["total_sessions"] += sessions
+        total_stats["total_energy_kwh"] += stats["total_energy_kwh"]
+        total_stats["total_duration_minutes"] += stats["total_duration_minutes"]
+        total_stats["total_revenue"] += stats["total_revenue"]
     
     if total_stats["total_sessions"] > 0:
         total_stats["avg_energy_per_session"] = total_stats["total_energy_kwh"] / total_stats["total_sessions"]
@@ -106,7 +139,7 @@ def get_charger_history(
         total_stats["avg_energy_per_session"] = 0.0
         total_stats["avg_duration_per_session"] = 0.0
     
-    return {
+    result = {
         "charger_id": charger_id,
         "period": {
             "start": start_date.isoformat(),
@@ -129,39 +162,40 @@ def get_charger_history(
             "charging_rate": charger.charging_rate
         }
     }
+    return json_response(await aset_cached(cache_key, result, HISTORY_CACHE_EXPIRE))
 
 
 @router.get("/charger/{charger_id}/status-history", summary="获取充电桩状态变化历史")
-def get_charger_status_history(
+async def get_charger_status_history(
     charger_id: str,
     days: int = Query(10, ge=1, le=30, description="查询天数"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """
     获取充电桩状态变化历史
     
     注意：当前实现基于事务数据推断状态，未来可以添加状态历史表
     """
-    charger = db.query(Charger).filter(Charger.id == charger_id).first()
-    if not charger:
+    if not await _charger_exists(db, charger_id):
         raise HTTPException(status_code=404, detail=f"充电桩 {charger_id} 未找到")
     
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    # 获取该时间段内的所有事务
-    transactions = db.query(Transaction).filter(
-        Transaction.charger_id == charger_id,
-        Transaction.start_time >= start_date
-    ).all()
-    
-    # 按天统计状态分布（基于事务推断）
-    daily_status = {}
-    
-    for i in range(days):
-        date = (end_date - timedelta(days=i)).date()
-        daily_status[date.isoformat()] = {
-            "date": date.isoformat(),
+    # 按天统计事务数量（GROUP BY day）
+    day = func.date_trunc("day", Transaction.start_time).label("day")
+    daily_counts = (await db.execute(
+        select(day, func.count(Transaction.id)).where(
+            Transaction.charger_id == charger_id,
+            Transaction.start_time >= start_date
+        ).group_by(day)
+    )).all()
+    
+    # 按天统计状态分布（基于事务推断），按日期升序排列
+    end_day = end_date.date()
+    status_history = [
+        {
+            "date": date_key,
             "status_distribution": {
                 "Available": 0,
                 "Charging": 0,
@@ -170,22 +204,14 @@ def get_charger_status_history(
                 "Unavailable": 0
             }
         }
+        for date_key in _date_keys(end_day, days)
+    ]
     
-    # 统计每天的状态（基于事务）
-    for tx in transactions:
-        if tx.start_time:
-            tx_date = tx.start_time.date()
-            date_key = tx_date.isoformat()
-            
-            if date_key in daily_status:
-                # 有事务表示当天有充电，推断为Charging状态
-                daily_status[date_key]["status_distribution"]["Charging"] += 1
-    
-    # 转换为列表
-    status_history = sorted(
-        [stats for stats in daily_status.values()],
-        key=lambda x: x["date"]
-    )
+    # 有事务表示当天有充电，推断为Charging状态
+    for row_day, count in daily_counts:
+        idx = _day_index(end_day, row_day.date(), days)
+        if idx is not None:
+            status_history[idx]["status_distribution"]["Charging"] = count
     
     return {
         "charger_id": charger_id,
@@ -199,60 +225,101 @@ def get_charger_status_history(
 
 
 @router.get("/charger/{charger_id}/heartbeat-history", summary="获取充电桩心跳历史")
-def get_charger_heartbeat_history(
+async def get_charger_heartbeat_history(
     charger_id: str,
     hours: int = Query(24, ge=1, le=168, description="查询小时数，默认24小时"),
-    db: Session = Depends(get_db)
+    aggregate_only: bool = Query(False, description="只返回统计结果，不返回心跳列表"),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """
     获取充电桩心跳历史数据，用于健康状态监控
     
     返回数据包括：
-    - 心跳时间点列表
+    - 心跳时间点列表（aggregate_only=true 时省略）
     - 每个心跳点的健康状态（normal/warning/abnormal）
     - 心跳间隔统计
     """
-    charger = db.query(Charger).filter(Charger.id == charger_id).first()
-    if not charger:
+    if not await _charger_exists(db, charger_id):
         raise HTTPException(status_code=404, detail=f"充电桩 {charger_id} 未找到")
     
     end_time = datetime.now(timezone.utc)
     start_time = end_time - timedelta(hours=hours)
     
-    # 获取心跳历史记录
-    heartbeats = db.query(HeartbeatHistory).filter(
+    period = {
+        "start": start_time.isoformat(),
+        "end": end_time.isoformat(),
+        "hours": hours
+    }
+    heartbeat_filter = (
         HeartbeatHistory.charger_id == charger_id,
         HeartbeatHistory.timestamp >= start_time,
         HeartbeatHistory.timestamp <= end_time
-    ).order_by(HeartbeatHistory.timestamp.asc()).all()
+    )
     
-    # 转换为前端需要的格式
+    if aggregate_only:
+        # 仅统计：按健康状态分组，数据库只返回几行
+        grouped = (await db.execute(
+            select(
+                HeartbeatHistory.health_status,
+                func.count(HeartbeatHistory.id),
+                func.sum(HeartbeatHistory.interval_seconds),
+                func.count(HeartbeatHistory.interval_seconds),
+            ).where(*heartbeat_filter).group_by(HeartbeatHistory.health_status)
+        )).all()
+        
+        health_stats = {"normal": 0, "warning": 0, "abnormal": 0}
+        total_heartbeats = 0
+        interval_sum = 0.0
+        interval_n = 0
+        for health_status, count, group_interval_sum, group_interval_n in grouped:
+            if health_status in health_stats:
+                health_stats[health_status] = count
+            total_heartbeats += count
+            if group_interval_n:
+                interval_sum += group_interval_sum
+                interval_n += group_interval_n
+        
+        return {
+            "charger_id": charger_id,
+            "period": period,
+            "health_stats": health_stats,
+            "avg_interval_seconds": interval_sum / interval_n if interval_n else None,
+            "total_heartbeats": total_heartbeats
+        }
+    
+    # 获取心跳历史记录
+    heartbeats = (await db.execute(
+        select(
+            HeartbeatHistory.timestamp,
+            HeartbeatHistory.health_status,
+            HeartbeatHistory.interval_seconds,
+        ).where(*heartbeat_filter).order_by(HeartbeatHistory.timestamp.asc())
+    )).all()
+    
+    # 转换为前端需要的格式，同时统计健康状态分布和心跳间隔
     heartbeat_data = []
+    health_stats = {"normal": 0, "warning": 0, "abnormal": 0}
+    interval_sum = 0.0
+    interval_n = 0
     for hb in heartbeats:
+        interval = hb.interval_seconds
         heartbeat_data.append({
             "timestamp": hb.timestamp.isoformat(),
             "health_status": hb.health_status,
-            "interval_seconds": hb.interval_seconds,
+            "interval_seconds": interval,
         })
-    
-    # 统计健康状态分布
-    health_stats = {
-        "normal": len([h for h in heartbeat_data if h["health_status"] == "normal"]),
-        "warning": len([h for h in heartbeat_data if h["health_status"] == "warning"]),
-        "abnormal": len([h for h in heartbeat_data if h["health_status"] == "abnormal"]),
-    }
+        if hb.health_status in health_stats:
+            health_stats[hb.health_status] += 1
+        if interval is not None:
+            interval_sum += interval
+            interval_n += 1
     
     # 计算平均心跳间隔
-    intervals = [h["interval_seconds"] for h in heartbeat_data if h["interval_seconds"] is not None]
-    avg_interval = sum(intervals) / len(intervals) if intervals else None
+    avg_interval = interval_sum / interval_n if interval_n else None
     
     return {
         "charger_id": charger_id,
-        "period": {
-            "start": start_time.isoformat(),
-            "end": end_time.isoformat(),
-            "hours": hours
-        },
+        "period": period,
         "heartbeats": heartbeat_data,
         "health_stats": health_stats,
         "avg_interval_seconds": avg_interval,
@@ -261,10 +328,10 @@ def get_charger_heartbeat_history(
 
 
 @router.get("/charger/{charger_id}/status-timeline", summary="获取充电桩状态时间线")
-def get_charger_status_timeline(
+async def get_charger_status_timeline(
     charger_id: str,
     hours: int = Query(24, ge=1, le=168, description="查询小时数，默认24小时"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, Any]:
     """
     获取充电桩状态变化时间线
@@ -274,19 +341,30 @@ def get_charger_status_timeline(
     - 每个状态的持续时间
     - 状态分布统计（离线、空闲、充电中）
     """
-    charger = db.query(Charger).filter(Charger.id == charger_id).first()
-    if not charger:
+    # 只需要当前状态
+    charger_row = (await db.execute(
+        select(Charger.status).where(Charger.id == charger_id)
+    )).one_or_none()
+    if charger_row is None:
         raise HTTPException(status_code=404, detail=f"充电桩 {charger_id} 未找到")
+    current_status = charger_row.status
     
     end_time = datetime.now(timezone.utc)
     start_time = end_time - timedelta(hours=hours)
     
     # 获取状态历史记录
-    status_records = db.query(StatusHistory).filter(
-        StatusHistory.charger_id == charger_id,
-        StatusHistory.timestamp >= start_time,
-        StatusHistory.timestamp <= end_time
-    ).order_by(StatusHistory.timestamp.asc()).all()
+    status_records = (await db.execute(
+        select(
+            StatusHistory.timestamp,
+            StatusHistory.status,
+            StatusHistory.previous_status,
+            StatusHistory.duration_seconds,
+        ).where(
+            StatusHistory.charger_id == charger_id,
+            StatusHistory.timestamp >= start_time,
+            StatusHistory.timestamp <= end_time
+        ).order_by(StatusHistory.timestamp.asc())
+    )).all()
     
     # 转换为前端需要的格式
     timeline_data = []
@@ -299,19 +377,17 @@ def get_charger_status_timeline(
         })
     
     # 统计状态分布（按小时分组）
-    # 将时间线按小时分组，统计每个小时的状态分布
-    hourly_status = {}
-    current_status = charger.status  # 当前状态
+    # 第 i 个桶覆盖 [end_time - (i+1)h, end_time - ih)，每个桶保留最后一个状态
+    buckets = bucket_last_status(
+        [record.timestamp for record in status_records],
+        [record.status for record in status_records],
+        end_time,
+        hours
+    )
     
-    # 从最新到最旧遍历，构建每小时的状态
-    for i in range(hours):
-        hour_start = end_time - timedelta(hours=i+1)
-        hour_end = end_time - timedelta(hours=i)
-        
-        # 找到这个小时内的状态变化
-        hour_statuses = [r for r in status_records if hour_start <= r.timestamp < hour_end]
-        
-        # 统计这个小时内的状态分布
+    # 从最旧到最新构建每小时的状态列表
+    hourly_status_list = []
+    for i in range(hours - 1, -1, -1):
         status_counts = {
             "Offline": 0,
             "Available": 0,
@@ -320,27 +396,19 @@ def get_charger_status_timeline(
             "Unavailable": 0
         }
         
-        # 如果有状态变化，使用变化后的状态
-        if hour_statuses:
+        last_status = buckets[i]
+        if last_status is not None:
             # 使用最后一个状态变化后的状态
-            last_status = hour_statuses[-1].status
             status_counts[last_status] = 1
-        else:
+        elif current_status in status_counts:
             # 如果没有状态变化，使用当前状态
-            if current_status in status_counts:
-                status_counts[current_status] = 1
+            status_counts[current_status] = 1
         
-        hour_key = hour_end.strftime("%Y-%m-%d %H:00")
-        hourly_status[hour_key] = status_counts
-    
-    # 转换为列表格式
-    hourly_status_list = [
-        {
-            "hour": hour,
-            "status_distribution": status_dist
-        }
-        for hour, status_dist in sorted(hourly_status.items())
-    ]
+        hour_end = end_time - timedelta(hours=i)
+        hourly_status_list.append({
+            "hour": hour_end.strftime("%Y-%m-%d %H:00"),
+            "status_distribution": status_counts
+        })
     
     # 总体状态分布统计
     total_status_dist = {
@@ -365,6 +433,6 @@ def get_charger_status_timeline(
         "timeline": timeline_data,
         "hourly_status": hourly_status_list,
         "total_status_distribution": total_status_dist,
-        "current_status": charger.status
+        "current_status": current_status
     }
 
@@ -3,45 +3,72 @@
 # 提供充电事务的查询和管理
 #
 
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+from typing import List, Literal, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 from app.database import get_db, Transaction
+from app.utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter()
 
+_iso = datetime.isoformat
+
 
 @router.get("", summary="获取事务列表")
 def list_transactions(
+    response: Response,
     charger_id: Optional[str] = Query(None, description="充电桩ID"),
-    status: Optional[str] = Query(None, description="状态过滤"),
+    status: Optional[Literal["ongoing", "completed", "cancelled"]] = Query(None, description="状态过滤"),
     limit: int = Query(100, le=1000),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="偏移量（已弃用，深分页请使用 before 游标）"),
+    before: Optional[str] = Query(None, description="分页游标，取自上一页响应头 X-Next-Cursor"),
     db: Session = Depends(get_db)
 ) -> List[dict]:
     """获取事务列表"""
-    query = db.query(Transaction)
+    # 只选需要的列，返回普通Row元组，不经过ORM实例化和identity map
+    query = select(
+        Transaction.id, Transaction.transaction_id, Transaction.charger_id,
+        Transaction.id_tag, Transaction.user_id, Transaction.start_time,
+        Transaction.end_time, Transaction.energy_kwh,
+        Transaction.duration_minutes, Transaction.status,
+    )
     
     if charger_id:
-        query = query.filter(Transaction.charger_id == charger_id)
+        query = query.where(Transaction.charger_id == charger_id)
     if status:
-        query = query.filter(Transaction.status == status)
+        query = query.where(Transaction.status == status)
+    
+    if before:
+        # 键集分页：直接定位到游标之后，代价与页深无关
+        cursor_time, cursor_id = decode_cursor(before, int)
+        query = query.where(tuple_(Transaction.start_time, Transaction.id) < (cursor_time, cursor_id))
+    elif offset:
+        query = query.offset(offset)
     
-    transactions = query.order_by(Transaction.start_time.desc()).offset(offset).limit(limit).all()
+    rows = db.execute(
+        query.order_by(Transaction.start_time.desc(), Transaction.id.desc()).limit(limit)
+    ).all()
+    
+    # 满页时返回下一页游标
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last[5], last[0])
     
     return [
         {
-            "id": t.id,
-            "transaction_id": t.transaction_id,
-            "charger_id": t.charger_id,
-            "id_tag": t.id_tag,
-            "user_id": t.user_id,
-            "start_time": t.start_time.isoformat() if t.start_time else None,
-            "end_time": t.end_time.isoformat() if t.end_time else None,
-            "energy_kwh": t.energy_kwh,
-            "duration_minutes": t.duration_minutes,
-            "status": t.status,
+            "id": row_id,
+            "transaction_id": transaction_id,
+            "charger_id": txn_charger_id,
+            "id_tag": id_tag,
+            "user_id": user_id,
+            "start_time": _iso(start_time) if start_time else None,
+            "end_time": _iso(end_time) if end_time else None,
+            "energy_kwh": energy_kwh,
+            "duration_minutes": duration_minutes,
+            "status": txn_status,
         }
-        for t in transactions
+        for (row_id, transaction_id, txn_charger_id, id_tag, user_id, start_time,
+             end_time, energy_kwh, duration_minutes, txn_status) in rows
     ]
-
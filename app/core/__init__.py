@@ -3,9 +3,11 @@
 # 包含配置、安全、异常、日志、中间件等核心组件
 #
 
-from app.core.config import get_settings, Settings
+from app.core.config import get_settings, Settings, SETTINGS
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token, verify_token,
+    verify_password, verify_and_update_password, get_password_hash,
+    averify_password, averify_and_update_password, aget_password_hash,
+    create_access_token, verify_token,
     get_current_user, verify_api_key
 )
 from app.core.exceptions import (
@@ -18,8 +20,13 @@ from app.core.middleware import LoggingMiddleware, SecurityHeadersMiddleware
 __all__ = [
     "get_settings",
     "Settings",
+    "SETTINGS",
     "verify_password",
+    "verify_and_update_password",
     "get_password_hash",
+    "averify_password",
+    "averify_and_update_password",
+    "aget_password_hash",
     "create_access_token",
     "verify_token",
     "get_current_user",
@@ -0,0 +1,94 @@
+#
+# 响应缓存
+# 使用Redis缓存读多写少的API响应（存储已序列化的JSON字节）
+#
+
+from typing import Any, Optional
+import orjson
+import redis
+import redis.asyncio as aioredis
+from fastapi import Response
+from app.core.config import SETTINGS
+from app.core.logging_config import get_logger
+
+logger = get_logger("ocpp_csms")
+
+# 缓存直接保存JSON字节，不做解码
+_redis: redis.Redis = redis.from_url(SETTINGS.redis_url)
+# 异步接口使用的客户端，供 async 端点在事件循环中直接 await
+_aredis: aioredis.Redis = aioredis.from_url(SETTINGS.redis_url)
+
+# 充电桩列表缓存：Hash，字段为筛选类型，整体失效时直接删除
+CHARGERS_CACHE_KEY = "cache:chargers"
+CHARGERS_CACHE_EXPIRE = 30
+
+# 充电桩历史统计缓存
+HISTORY_CACHE_PREFIX = "cache:hist:"
+HISTORY_CACHE_EXPIRE = 300
+
+
+def get_cached(key: str, field: Optional[str] = None) -> Optional[bytes]:
+    """读取缓存，未命中或Redis不可用时返回None"""
+    try:
+        if field is None:
+            return _redis.get(key)
+        return _redis.hget(key, field)
+    except Exception as e:
+        logger.warning(f"读取缓存失败 {key}: {e}")
+        return None
+
+
+def set_cached(key: str, value: Any, expire: int, field: Optional[str] = None) -> bytes:
+    """序列化并写入缓存，返回序列化后的JSON字节"""
+    body = orjson.dumps(value)
+    try:
+        if field is None:
+            _redis.setex(key, expire, body)
+        else:
+            pipe = _redis.pipeline()
+            pipe.hset(key, field, body)
+            pipe.expire(key, expire)
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"写入缓存失败 {key}: {e}")
+    return body
+
+
+async def aget_cached(key: str, field: Optional[str] = None) -> Optional[bytes]:
+    """get_cached 的异步版本，供 async 端点使用"""
+    try:
+        if field is None:
+            return await _aredis.get(key)
+        return await _aredis.hget(key, field)
+    except Exception as e:
+        logger.warning(f"读取缓存失败 {key}: {e}")
+        return None
+
+
+async def aset_cached(key: str, value: Any, expire: int, field: Optional[str] = None) -> bytes:
+    """set_cached 的异步版本，供 async 端点使用"""
+    body = orjson.dumps(value)
+    try:
+        if field is None:
+            await _aredis.setex(key, expire, body)
+        else:
+            async with _aredis.pipeline() as pipe:
+                pipe.hset(key, field, body)
+                pipe.expire(key, expire)
+                await pipe.execute()
+    except Exception as e:
+        logger.warning(f"写入缓存失败 {key}: {e}")
+    return body
+
+
+def invalidate_chargers_cache() -> None:
+    """充电桩数据变化时清除列表缓存"""
+    try:
+        _redis.delete(CHARGERS_CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"清除充电桩缓存失败: {e}")
+
+
+def json_response(body: bytes) -> Response:
+    """将已序列化的JSON字节包装为响应"""
+    return Response(content=body, media_type="application/json")
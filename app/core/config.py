@@ -3,7 +3,7 @@
 # 使用pydantic-settings进行配置验证和管理
 #
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List, Optional
 from functools import lru_cache
 
@@ -27,6 +27,8 @@ class Settings(BaseSettings):
     db_max_overflow: int = 20
     db_pool_recycle: int = 3600
     db_echo: bool = False
+    timeseries_retention_days: Optional[int] = None  # 时序历史表保留天数（需TimescaleDB，None表示永久保留）
+    db_last_seen_interval_seconds: int = 10  # 充电桩 last_seen 落库的最小间隔，减少心跳带来的整行更新
     
     # Redis配置
     redis_url: str = "redis://localhost:6379/0"
@@ -40,6 +42,7 @@ class Settings(BaseSettings):
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    valid_api_keys: List[str] = ["charger-api-key-1", "charger-api-key-2"]  # 充电桩API密钥，生产环境应通过环境变量配置
     
     # CORS配置
     cors_origins: List[str] = ["*"]  # 生产环境应限制具体域名
@@ -97,10 +100,13 @@ class Settings(BaseSettings):
     default_charging_rate: float = 7.0  # kW
     default_price_per_kwh: float = 2700.0  # COP/kWh
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = False
+    # 配置在进程内只读，frozen 让 pydantic 跳过 __setattr__ 校验
+    model_config = SettingsConfigDict(
+        frozen=True,
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=False,
+    )
 
 
 @lru_cache()
@@ -108,3 +114,9 @@ def get_settings() -> Settings:
     """获取配置实例（单例）"""
     return Settings()
 
+
+# 导入时绑定的配置实例，热路径直接引用，免去每次调用 get_settings()
+SETTINGS = get_settings()
+
+# 常用字段的模块级别名
+LOG_LEVEL = SETTINGS.log_level
@@ -4,8 +4,9 @@
 #
 
 from typing import Any, Dict, Optional
-from fastapi import HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
+import orjson
 from fastapi.exceptions import RequestValidationError
 import logging
 
@@ -23,16 +24,35 @@ class OCPPException(HTTPException):
     ):
         super().__init__(status_code=status_code, detail=detail, headers=headers)
         self.error_code = error_code or "OCPP_ERROR"
+    
+    def to_response(self) -> Optional[Response]:
+        """返回预先构造好的响应；为None时由处理器按通用格式构造"""
+        return None
 
 
 class ChargerNotFoundException(OCPPException):
     """充电桩未找到异常"""
+    # 预编译的响应体，只需填入充电桩ID（已按JSON字符串转义）
+    _BODY_TEMPLATE = (
+        '{"success":false,"error":{"code":"CHARGER_NOT_FOUND",'
+        '"message":"充电桩 %s 未找到","status_code":404}}'
+    ).encode()
+    
     def __init__(self, charger_id: str):
         super().__init__(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"充电桩 {charger_id} 未找到",
             error_code="CHARGER_NOT_FOUND"
         )
+        self.charger_id = charger_id
+    
+    def to_response(self) -> Response:
+        escaped_id = orjson.dumps(self.charger_id)[1:-1]
+        return Response(
+            content=self._BODY_TEMPLATE % escaped_id,
+            status_code=status.HTTP_404_NOT_FOUND,
+            media_type="application/json"
+        )
 
 
 class ChargerNotConnectedException(OCPPException):
@@ -76,10 +96,14 @@ class AuthorizationException(OCPPException):
 
 
 # 异常处理器
-async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
+async def http_exception_handler(request: Request, exc: HTTPException) -> Response:
     """HTTP异常处理器"""
     logger.error(f"HTTP异常: {exc.status_code} - {exc.detail}")
-    return JSONResponse(
+    if isinstance(exc, OCPPException):
+        response = exc.to_response()
+        if response is not None:
+            return response
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -92,10 +116,10 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
     )
 
 
-async def validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+async def validation_exception_handler(request: Request, exc: RequestValidationError) -> ORJSONResponse:
     """验证异常处理器"""
     logger.error(f"验证错误: {exc.errors()}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "success": False,
@@ -108,10 +132,10 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-async def general_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+async def general_exception_handler(request: Request, exc: Exception) -> ORJSONResponse:
     """通用异常处理器"""
     logger.exception(f"未处理的异常: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
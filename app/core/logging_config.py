@@ -5,20 +5,21 @@
 
 import logging
 import sys
-import json
-from datetime import datetime
+import time
 from typing import Dict, Any
-from app.core.config import get_settings
-
-settings = get_settings()
+import orjson
+from app.core.config import SETTINGS, LOG_LEVEL
 
 
 class JSONFormatter(logging.Formatter):
     """JSON格式化器"""
     
+    # 时间戳直接取自 record.created，按 UTC 格式化
+    converter = time.gmtime
+    
     def format(self, record: logging.LogRecord) -> str:
         log_obj: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -39,13 +40,13 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, "action"):
             log_obj["action"] = record.action
         
-        return json.dumps(log_obj, ensure_ascii=False)
+        return orjson.dumps(log_obj, default=str).decode()
 
 
 def setup_logging():
     """设置日志配置"""
     # 获取日志级别
-    log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
+    log_level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
     
     # 清除现有处理器
     root_logger = logging.getLogger()
@@ -56,7 +57,7 @@ def setup_logging():
     console_handler.setLevel(log_level)
     
     # 设置格式
-    if settings.log_format == "json":
+    if SETTINGS.log_format == "json":
         formatter = JSONFormatter()
     else:
         formatter = logging.Formatter(
@@ -67,8 +68,8 @@ def setup_logging():
     root_logger.addHandler(console_handler)
     
     # 文件处理器（如果配置了日志文件）
-    if settings.log_file:
-        file_handler = logging.FileHandler(settings.log_file)
+    if SETTINGS.log_file:
+        file_handler = logging.FileHandler(SETTINGS.log_file)
         file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
         root_logger.addHandler(file_handler)
@@ -2,18 +2,33 @@
 # 安全认证和授权
 #
 
+import asyncio
+import hashlib
+import logging
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Dict, Any, FrozenSet, Tuple
+import jwt
+from argon2 import PasswordHasher, Type
+from argon2.exceptions import InvalidHashError, VerifyMismatchError
+import bcrypt
 from fastapi import Security, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from app.core.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger("ocpp_csms")
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+    logger.info("xxhash 未安装，API密钥摘要使用 blake2b")
+
+# 密码哈希：Argon2id（OWASP推荐参数：m=46MiB, t=1, p=1）
+# 直接使用argon2-cffi，省去passlib每次调用的方案识别；旧的bcrypt哈希仍可验证并在登录时升级
+_password_hasher = PasswordHasher(time_cost=1, memory_cost=47104, parallelism=1, type=Type.ID)
 
 # HTTP Bearer认证
 security = HTTPBearer()
@@ -22,36 +37,122 @@ security = HTTPBearer()
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
+def api_key_digest(api_key: str) -> int:
+    """
+    API密钥的查找摘要
+    
+    API密钥是高熵随机串，查找时用快速的非加密哈希即可，不需要bcrypt/Argon2这类慢哈希；
+    密钥迁移到数据库后，按该摘要建立内存索引
+    """
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_intdigest(api_key)
+    return int.from_bytes(hashlib.blake2b(api_key.encode(), digest_size=16).digest(), "big")
+
+
+# 有效API密钥的摘要（启动时从配置读取一次），内存中不保留明文
+_VALID_API_KEY_DIGESTS: FrozenSet[int] = frozenset(api_key_digest(key) for key in settings.valid_api_keys)
+
+
+def _is_legacy_bcrypt(hashed_password: str) -> bool:
+    """是否为旧的bcrypt哈希（$2a$/$2b$/$2y$）"""
+    return hashed_password.startswith("$2")
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    if _is_legacy_bcrypt(hashed_password):
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    try:
+        return _password_hasher.verify(hashed_password, plain_password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    验证密码，哈希方案或参数已过时（如bcrypt）时同时返回新哈希
+    
+    Returns:
+        (是否验证通过, 需要持久化的新哈希或None)
+    """
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if _is_legacy_bcrypt(hashed_password) or _password_hasher.check_needs_rehash(hashed_password):
+        return True, _password_hasher.hash(plain_password)
+    return True, None
 
 
 def get_password_hash(password: str) -> str:
     """生成密码哈希"""
-    return pwd_context.hash(password)
+    return _password_hasher.hash(password)
+
+
+# 哈希计算耗时数十毫秒，异步上下文中放到线程池执行，避免阻塞事件循环
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（异步）"""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
+async def averify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码并在需要时返回新哈希（异步）"""
+    return await asyncio.to_thread(verify_and_update_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    """生成密码哈希（异步）"""
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+# 令牌签名参数在启动时确定一次
+_JWT_KEY = settings.secret_key.encode()
+_JWT_ALGORITHM = settings.algorithm
+_JWT_ALGORITHMS = [settings.algorithm]
+_DEFAULT_TOKEN_EXPIRE = timedelta(minutes=settings.access_token_expire_minutes)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    return encoded_jwt
+    to_encode["exp"] = datetime.now(timezone.utc) + (expires_delta or _DEFAULT_TOKEN_EXPIRE)
+    return jwt.encode(to_encode, _JWT_KEY, algorithm=_JWT_ALGORITHM)
+
+
+# 令牌验证结果缓存：token -> (过期时间戳, payload)，只缓存验证通过且带exp的令牌
+_TOKEN_CACHE_MAX_SIZE = 10000
+_token_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _cache_token(token: str, payload: Dict[str, Any]) -> None:
+    """按令牌自身的exp缓存验证结果"""
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)):
+        return
+    if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+        # 先清理已过期的，仍然满时淘汰最早插入的
+        now = time.time()
+        for cached_token in [t for t, (t_exp, _) in _token_cache.items() if t_exp <= now]:
+            del _token_cache[cached_token]
+        if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+            del _token_cache[next(iter(_token_cache))]
+    _token_cache[token] = (float(exp), payload)
 
 
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    """验证令牌"""
+    """验证令牌（同一令牌在过期前只做一次签名校验）"""
+    cached = _token_cache.get(token)
+    if cached is not None:
+        exp, payload = cached
+        if exp > time.time():
+            return dict(payload)
+        _token_cache.pop(token, None)
+        return None
+    
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
-    except JWTError:
+        payload = jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS)
+    except jwt.InvalidTokenError:
         return None
+    _cache_token(token, payload)
+    return dict(payload)
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, Any]:
@@ -75,10 +176,8 @@ async def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> b
             detail="缺少API密钥",
         )
     
-    # TODO: 从数据库验证API密钥
-    # 这里简化处理，实际应该从数据库查询
-    valid_keys = {"charger-api-key-1", "charger-api-key-2"}  # 生产环境应从配置或数据库读取
-    if api_key not in valid_keys:
+    # TODO: 从数据库验证API密钥（按 api_key_digest 建立缓存）
+    if api_key_digest(api_key) not in _VALID_API_KEY_DIGESTS:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的API密钥",
@@ -11,7 +11,10 @@ from app.database.models import (
 )
 
 # 然后导入base（需要Base已定义）
-from app.database.base import engine, SessionLocal, get_db, init_db, check_db_health
+from app.database.base import (
+    engine, SessionLocal, get_db, init_db, check_db_health,
+    async_engine, AsyncSessionLocal, get_async_db
+)
 from sqlalchemy.orm import Session
 
 __all__ = [
@@ -20,6 +23,9 @@ __all__ = [
     "SessionLocal",
     "Session",  # SQLAlchemy Session 类型
     "get_db",
+    "async_engine",
+    "AsyncSessionLocal",
+    "get_async_db",
     "init_db",
     "check_db_health",
     "Charger",
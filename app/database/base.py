@@ -4,20 +4,42 @@
 #
 
 import os
-from sqlalchemy import create_engine
+import time
+import orjson
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from app.core.config import get_settings
+from app.core.logging_config import get_logger
 
 settings = get_settings()
+logger = get_logger("ocpp_csms")
 
 # 创建Base（在models中会继承）
 Base = declarative_base()
 
+def _json_dumps(value) -> str:
+    """JSON/JSONB列的序列化（orjson）"""
+    return orjson.dumps(value).decode()
+
+
+def sync_database_url(url: str) -> str:
+    """将数据库URL转换为psycopg（v3）驱动"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
 # 创建数据库引擎（带连接池）
+# psycopg v3：同一语句执行5次后自动使用服务端预编译语句，OCPP处理中的重复INSERT/SELECT免去解析和规划
 engine = create_engine(
-    settings.database_url,
+    sync_database_url(settings.database_url),
+    connect_args={"prepare_threshold": 5},
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
     poolclass=QueuePool,
     pool_size=settings.db_pool_size,
     max_overflow=settings.db_max_overflow,
@@ -26,8 +48,33 @@ engine = create_engine(
     echo=settings.db_echo
 )
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 创建会话工厂（提交后不过期属性，序列化响应时无需重新查询）
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+
+
+def _async_database_url(url: str) -> str:
+    """将同步驱动的数据库URL转换为asyncpg驱动"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# 创建异步数据库引擎（统计等只读接口使用，默认AsyncAdaptedQueuePool）
+async_engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_pre_ping=True,
+    pool_recycle=settings.db_pool_recycle,
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
+    echo=settings.db_echo
+)
+
+# 创建异步会话工厂
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 
 # 数据库依赖注入
@@ -36,23 +83,108 @@ def get_db() -> Session:
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        # 请求处理出错时回滚未提交的修改
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
+# 异步数据库依赖注入
+async def get_async_db() -> AsyncSession:
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# 时序表及其压缩分段列（转换为TimescaleDB hypertable）
+TIMESERIES_TABLES = {
+    "meter_values": "transaction_id",
+    "heartbeat_history": "charger_id",
+    "status_history": "charger_id",
+    "ocpp_error_logs": "charger_id",
+}
+
+
 # 初始化数据库
 def init_db():
     """初始化数据库表"""
     Base.metadata.create_all(bind=engine)
+    setup_timescale()
+
+
+def setup_timescale() -> None:
+    """
+    TimescaleDB可用时将时序表转换为按天分块的hypertable，并对7天前的数据启用压缩
+    
+    配置了 timeseries_retention_days 时添加保留策略，过期数据按整块删除，无需逐行DELETE
+    """
+    try:
+        with engine.begin() as conn:
+            available = conn.execute(
+                text("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+            ).scalar()
+            if not available:
+                logger.info("TimescaleDB 不可用，时序表保持普通表")
+                return
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+            for table, segment_by in TIMESERIES_TABLES.items():
+                created = conn.execute(text(
+                    f"SELECT created FROM create_hypertable('{table}', 'timestamp', "
+                    f"chunk_time_interval => INTERVAL '1 day', "
+                    f"if_not_exists => TRUE, migrate_data => TRUE)"
+                )).scalar()
+                if created:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} SET (timescaledb.compress, "
+                        f"timescaledb.compress_segmentby = '{segment_by}')"
+                    ))
+                    conn.execute(text(
+                        f"SELECT add_compression_policy('{table}', INTERVAL '7 days', if_not_exists => TRUE)"
+                    ))
+                    logger.info(f"已将 {table} 转换为 hypertable")
+                if settings.timeseries_retention_days:
+                    retention_days = int(settings.timeseries_retention_days)
+                    # 已有策略的保留时长与配置不同时先删除：if_not_exists 只会保留旧的 drop_after
+                    unchanged = conn.execute(text(
+                        "SELECT (config->>'drop_after')::interval = make_interval(days => :days) "
+                        "FROM timescaledb_information.jobs "
+                        "WHERE proc_name = 'policy_retention' AND hypertable_name = :table"
+                    ), {"days": retention_days, "table": table}).scalar()
+                    if unchanged is False:
+                        conn.execute(text(f"SELECT remove_retention_policy('{table}')"))
+                        logger.info(f"{table} 的数据保留时长改为 {retention_days} 天")
+                    conn.execute(text(
+                        f"SELECT add_retention_policy('{table}', "
+                        f"INTERVAL '{retention_days} days', if_not_exists => TRUE)"
+                    ))
+                else:
+                    conn.execute(text(f"SELECT remove_retention_policy('{table}', if_exists => TRUE)"))
+    except Exception as e:
+        logger.warning(f"配置 TimescaleDB 失败: {e}")
 
 
 # 数据库健康检查
+_HEALTH_STMT = text("SELECT 1")
+_HEALTH_CACHE_TTL = 1.0
+# (检查时间, 检查结果)，探针频繁调用时在TTL内复用结果，避免反复占用连接池
+_last_health_check = (0.0, False)
+
+
 def check_db_health() -> bool:
-    """检查数据库连接健康状态"""
+    """检查数据库连接健康状态（结果缓存1秒）"""
+    global _last_health_check
+    checked_at, healthy = _last_health_check
+    now = time.monotonic()
+    if now - checked_at < _HEALTH_CACHE_TTL:
+        return healthy
+    
     try:
         with engine.connect() as conn:
-            conn.execute("SELECT 1")
-        return True
+            healthy = conn.execute(_HEALTH_STMT).scalar() == 1
     except Exception:
-        return False
+        healthy = False
+    _last_health_check = (now, healthy)
+    return healthy
 
@@ -0,0 +1,167 @@
+#
+# 批量写入器
+# 心跳、状态、计量值、错误日志等高频追加写入的表先进入内存队列，
+# 由后台任务按批次（条数或时间窗口）合并成一条多行 INSERT 写入；
+# 写入失败的行放回队首有限次重试，无效数据改为逐行写入，只丢弃出错的行
+#
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Table
+from sqlalchemy.exc import DataError, IntegrityError
+from app.database.base import engine
+from app.database.models import HeartbeatHistory, StatusHistory, MeterValue, OCPPErrorLog
+from app.core.logging_config import get_logger
+
+logger = get_logger("ocpp_csms")
+
+# 队列中的停止标记：后台任务写完手头的批次后退出
+_STOP = object()
+
+
+class BatchWriter:
+    """单表批量写入器"""
+
+    def __init__(
+        self,
+        table: Table,
+        max_batch: int = 500,
+        max_delay: float = 0.2,
+        max_attempts: int = 5,
+        retry_delay: float = 1.0,
+    ):
+        self.table = table
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # 写入失败待重试的行及已尝试次数，下一批优先写入
+        self._retry: List[Tuple[Dict[str, Any], int]] = []
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """加入一行待写入数据；后台任务未启动时直接同步写入"""
+        if self._task is None:
+            self._flush([row])
+            return
+        self._queue.put_nowait(row)
+
+    def start(self) -> None:
+        """启动后台写入任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"批量写入器已启动: {self.table.name}")
+
+    async def stop(self) -> None:
+        """停止后台任务（先写完正在收集的批次），再写入待重试和队列中剩余的数据"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+        remaining = self._retry
+        self._retry = []
+        while not self._queue.empty():
+            remaining.append((self._queue.get_nowait(), 0))
+        if remaining:
+            await self._write(remaining)
+        if self._retry:
+            logger.error(f"批量写入器停止时仍有 {len(self._retry)} 行未能写入 {self.table.name}")
+            self._retry = []
+        logger.info(f"批量写入器已停止: {self.table.name}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entries = self._retry
+            self._retry = []
+            if not entries:
+                row = await self._queue.get()
+                if row is _STOP:
+                    return
+                entries = [(row, 0)]
+            deadline = loop.time() + self.max_delay
+            while len(entries) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                entries.append((row, 0))
+            await self._write(entries)
+            if self._retry and not stopping:
+                # 数据库暂时不可用时不要立即重试
+                await asyncio.sleep(self.retry_delay)
+
+    async def _write(self, entries: List[Tuple[Dict[str, Any], int]]) -> None:
+        """在线程中写入一批数据，失败的行放回重试列表，超过最大尝试次数的丢弃"""
+        failed = await asyncio.to_thread(self._flush, [row for row, _ in entries])
+        dropped = 0
+        for index in failed:
+            row, attempts = entries[index]
+            if attempts + 1 >= self.max_attempts:
+                dropped += 1
+            else:
+                self._retry.append((row, attempts + 1))
+        if dropped:
+            logger.error(f"{dropped} 行重试 {self.max_attempts} 次仍未能写入 {self.table.name}，已丢弃")
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        一次事务内以executemany写入整批数据，返回需要重试的行下标
+        
+        数据本身无效（外键、枚举等）导致失败时改为逐行写入，只丢弃无效的行
+        """
+        try:
+            with engine.begin() as conn:
+                conn.execute(self.table.insert(), rows)
+            logger.debug(f"批量写入 {self.table.name}: {len(rows)} 行")
+            return []
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"批量写入 {self.table.name} 遇到无效数据，改为逐行写入（{len(rows)} 行）: {e}")
+            return self._flush_rows(rows)
+        except Exception as e:
+            logger.error(f"批量写入 {self.table.name} 失败（{len(rows)} 行），稍后重试: {e}", exc_info=True)
+            return list(range(len(rows)))
+
+    def _flush_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """逐行写入，无效的行记录后丢弃，其他错误的行返回下标等待重试"""
+        failed = []
+        for index, row in enumerate(rows):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(self.table.insert(), row)
+            except (IntegrityError, DataError) as e:
+                logger.error(f"丢弃无法写入 {self.table.name} 的数据 {row}: {e}")
+            except Exception as e:
+                logger.error(f"写入 {self.table.name} 失败，稍后重试: {e}")
+                failed.append(index)
+        return failed
+
+
+heartbeat_writer = BatchWriter(HeartbeatHistory.__table__)
+status_writer = BatchWriter(StatusHistory.__table__)
+meter_value_writer = BatchWriter(MeterValue.__table__)
+error_log_writer = BatchWriter(OCPPErrorLog.__table__)
+
+_WRITERS = (heartbeat_writer, status_writer, meter_value_writer, error_log_writer)
+
+
+def start_batch_writers() -> None:
+    """启动所有批量写入器"""
+    for writer in _WRITERS:
+        writer.start()
+
+
+async def stop_batch_writers() -> None:
+    """停止所有批量写入器并写入剩余数据"""
+    for writer in _WRITERS:
+        await writer.stop()
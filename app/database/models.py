@@ -4,19 +4,46 @@
 #
 
 from datetime import datetime, timezone
+from functools import partial
+from typing import Optional
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, 
-    DateTime, Text, ForeignKey, JSON, Index
+    DateTime, Text, ForeignKey, JSON, Index, Computed, Enum, text
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database.base import Base
 
+# 所有时间戳列共用的默认值工厂
+_utcnow = partial(datetime.now, timezone.utc)
+
+
+# 低基数状态列使用PostgreSQL ENUM，定长存储，索引更小
+# OCPP 1.6 ChargePointStatus，外加平台使用的 Offline / Unknown
+CHARGER_STATUS_VALUES = (
+    "Available", "Preparing", "Charging", "SuspendedEVSE", "SuspendedEV",
+    "Finishing", "Reserved", "Unavailable", "Faulted", "Offline", "Unknown",
+)
+ChargerStatusEnum = Enum(*CHARGER_STATUS_VALUES, name="charger_status")
+SessionStatusEnum = Enum("ongoing", "completed", "cancelled", name="session_status")
+HealthStatusEnum = Enum("normal", "warning", "abnormal", name="heartbeat_health_status")
+SupportMessageStatusEnum = Enum("pending", "replied", name="support_message_status")
+
+_CHARGER_STATUS_SET = frozenset(CHARGER_STATUS_VALUES)
+
+
+def normalize_charger_status(status: Optional[str]) -> Optional[str]:
+    """充电桩上报的状态不在枚举中时记为 Unknown"""
+    if status is None or status in _CHARGER_STATUS_SET:
+        return status
+    return "Unknown"
+
 
 class Charger(Base):
     """充电桩基本信息"""
     __tablename__ = "chargers"
     
-    id = Column(String(100), primary_key=True, index=True)
+    id = Column(String(100), primary_key=True)
     vendor = Column(String(100), nullable=True)
     model = Column(String(100), nullable=True)
     serial_number = Column(String(100), nullable=True)
@@ -31,14 +58,24 @@ class Charger(Base):
     connector_type = Column(String(50), default="Type2")
     charging_rate = Column(Float, default=7.0)  # kW
     price_per_kwh = Column(Float, default=2700.0)  # COP/kWh
+    # 是否已配置（有位置和价格），由数据库生成
+    is_configured = Column(
+        Boolean,
+        Computed(
+            "latitude IS NOT NULL AND longitude IS NOT NULL "
+            "AND COALESCE(price_per_kwh, 0) > 0",
+            persisted=True
+        ),
+        nullable=False
+    )
     
     # 状态信息
-    status = Column(String(50), default="Unknown")
-    last_seen = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    status = Column(ChargerStatusEnum, default="Unknown")
+    last_seen = Column(DateTime(timezone=True), default=_utcnow)
     
     # 元数据
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
     is_active = Column(Boolean, default=True)
     
     # 关系
@@ -48,6 +85,7 @@ class Charger(Base):
     __table_args__ = (
         Index('idx_chargers_status', 'status'),
         Index('idx_chargers_last_seen', 'last_seen'),
+        Index('idx_chargers_is_configured', 'is_configured', postgresql_where=text("is_active")),
     )
 
 
@@ -55,12 +93,12 @@ class Transaction(Base):
     """充电事务"""
     __tablename__ = "transactions"
     
-    id = Column(Integer, primary_key=True, index=True)
-    charger_id = Column(String(100), ForeignKey("chargers.id"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    charger_id = Column(String(100), ForeignKey("chargers.id"), nullable=False)
     transaction_id = Column(Integer, nullable=False, index=True)
     
     # 用户信息
-    id_tag = Column(String(100), nullable=False, index=True)
+    id_tag = Column(String(100), nullable=False)
     user_id = Column(String(100), nullable=True)
     
     # 时间信息
@@ -79,20 +117,22 @@ class Transaction(Base):
     total_cost = Column(Float, nullable=True)
     
     # 状态
-    status = Column(String(50), default="ongoing")  # ongoing, completed, cancelled
+    status = Column(SessionStatusEnum, default="ongoing")
     
     # 元数据
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
     
     # 关系
     charger = relationship("Charger", back_populates="transactions")
     meter_values = relationship("MeterValue", back_populates="transaction", cascade="all, delete-orphan")
     
     __table_args__ = (
-        Index('idx_transactions_status', 'status'),
+        # 只索引进行中的事务，查找活动会话时索引很小且常驻缓存
+        Index('idx_transactions_active', 'charger_id', 'start_time', postgresql_where=text("status = 'ongoing'")),
         Index('idx_transactions_id_tag', 'id_tag'),
-        Index('idx_transactions_start_time', 'start_time'),
+        Index('idx_transactions_charger_start', 'charger_id', 'start_time'),
+        Index('idx_transactions_start_time_id', 'start_time', 'id'),
     )
 
 
@@ -100,21 +140,27 @@ class MeterValue(Base):
     """计量值记录"""
     __tablename__ = "meter_values"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # 主键包含timestamp，以便转换为按时间分区的hypertable
+    id = Column(Integer, primary_key=True, autoincrement=True)
     transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False, index=True)
     
     connector_id = Column(Integer, nullable=True)
-    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     
-    # 计量数据（JSON格式存储完整数据）
+    # 计量数据（JSONB格式存储完整数据）
     value = Column(Integer, nullable=False)  # 主要值（Wh）
-    sampled_value = Column(JSON, nullable=True)  # 完整采样值数据
+    sampled_value = Column(JSONB, nullable=True)  # 完整采样值数据
+    
+    # 常用测量值单独成列，统计查询无需解析JSON
+    voltage = Column(Float, nullable=True)  # V
+    current = Column(Float, nullable=True)  # A
+    soc = Column(Float, nullable=True)  # %
     
     # 关系
     transaction = relationship("Transaction", back_populates="meter_values")
     
     __table_args__ = (
-        Index('idx_meter_values_timestamp', 'timestamp'),
+        Index('idx_meter_values_timestamp', 'timestamp', postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
     )
 
 
@@ -122,14 +168,14 @@ class ChargerConfiguration(Base):
     """充电桩配置参数"""
     __tablename__ = "charger_configurations"
     
-    id = Column(Integer, primary_key=True, index=True)
-    charger_id = Column(String(100), ForeignKey("chargers.id"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    charger_id = Column(String(100), ForeignKey("chargers.id"), nullable=False)
     
     config_key = Column(String(100), nullable=False)
     config_value = Column(Text, nullable=True)
     
     # 元数据
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
     
     # 关系
     charger = relationship("Charger", back_populates="configurations")
@@ -143,11 +189,11 @@ class Order(Base):
     """充电订单（业务层）"""
     __tablename__ = "orders"
     
-    id = Column(String(100), primary_key=True, index=True)
+    id = Column(String(100), primary_key=True)
     transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True, index=True)
     charger_id = Column(String(100), ForeignKey("chargers.id"), nullable=False, index=True)
     
-    user_id = Column(String(100), nullable=False, index=True)
+    user_id = Column(String(100), nullable=False)
     id_tag = Column(String(100), nullable=False)
     
     # 时间信息
@@ -162,16 +208,17 @@ class Order(Base):
     total_cost = Column(Float, nullable=True)
     
     # 状态
-    status = Column(String(50), default="ongoing")  # ongoing, completed, cancelled
+    status = Column(SessionStatusEnum, default="ongoing")
     
     # 元数据
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
     
     __table_args__ = (
-        Index('idx_orders_status', 'status'),
+        # 只索引进行中的订单
+        Index('idx_orders_active', 'charger_id', 'start_time', postgresql_where=text("status = 'ongoing'")),
         Index('idx_orders_user_id', 'user_id'),
-        Index('idx_orders_start_time', 'start_time'),
+        Index('idx_orders_start_time_id', 'start_time', 'id'),
     )
 
 
@@ -179,16 +226,16 @@ class SupportMessage(Base):
     """客服消息"""
     __tablename__ = "support_messages"
     
-    id = Column(String(100), primary_key=True, index=True)
-    user_id = Column(String(100), nullable=False, index=True)
+    id = Column(String(100), primary_key=True)
+    user_id = Column(String(100), nullable=False)
     username = Column(String(100), nullable=False)
     
     message = Column(Text, nullable=False)
     reply = Column(Text, nullable=True)
     
-    status = Column(String(50), default="pending")  # pending, replied
+    status = Column(SupportMessageStatusEnum, default="pending")
     
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
     replied_at = Column(DateTime(timezone=True), nullable=True)
     
     __table_args__ = (
@@ -202,8 +249,9 @@ class OCPPErrorLog(Base):
     """OCPP错误日志"""
     __tablename__ = "ocpp_error_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
-    charger_id = Column(String(100), nullable=True, index=True)
+    # 主键包含timestamp，以便转换为按时间分区的hypertable
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    charger_id = Column(String(100), nullable=True)
     
     action = Column(String(100), nullable=False)
     error_code = Column(String(100), nullable=False)
@@ -212,10 +260,10 @@ class OCPPErrorLog(Base):
     request_payload = Column(JSON, nullable=True)
     response_payload = Column(JSON, nullable=True)
     
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, default=_utcnow, nullable=False)
     
     __table_args__ = (
-        Index('idx_error_logs_timestamp', 'timestamp'),
+        Index('idx_error_logs_timestamp', 'timestamp', postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
         Index('idx_error_logs_charger_id', 'charger_id'),
     )
 
@@ -224,23 +272,25 @@ class HeartbeatHistory(Base):
     """心跳历史记录"""
     __tablename__ = "heartbeat_history"
     
-    id = Column(Integer, primary_key=True, index=True)
-    charger_id = Column(String(100), nullable=False, index=True)
+    # 主键包含timestamp，以便转换为按时间分区的hypertable
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    charger_id = Column(String(100), nullable=False)
     
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, default=_utcnow, nullable=False)
     
     # 健康状态：基于心跳间隔计算
     # 正常：心跳间隔 <= 35秒
     # 警告：心跳间隔 35-60秒
     # 异常：心跳间隔 > 60秒或丢失
-    health_status = Column(String(20), default="normal")  # normal, warning, abnormal
+    health_status = Column(HealthStatusEnum, default="normal")
     
     # 心跳间隔（秒）
     interval_seconds = Column(Float, nullable=True)
     
     __table_args__ = (
-        Index('idx_heartbeat_charger_timestamp', 'charger_id', 'timestamp'),
-        Index('idx_heartbeat_timestamp', 'timestamp'),
+        # 覆盖索引：心跳历史查询可走index-only scan
+        Index('idx_heartbeat_charger_timestamp', 'charger_id', 'timestamp', postgresql_include=['health_status', 'interval_seconds']),
+        Index('idx_heartbeat_timestamp', 'timestamp', postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
     )
 
 
@@ -248,19 +298,21 @@ class StatusHistory(Base):
     """状态变化历史记录"""
     __tablename__ = "status_history"
     
-    id = Column(Integer, primary_key=True, index=True)
-    charger_id = Column(String(100), nullable=False, index=True)
+    # 主键包含timestamp，以便转换为按时间分区的hypertable
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    charger_id = Column(String(100), nullable=False)
     
-    status = Column(String(50), nullable=False)  # Available, Charging, Offline, Faulted, Unavailable
-    previous_status = Column(String(50), nullable=True)
+    status = Column(ChargerStatusEnum, nullable=False)
+    previous_status = Column(ChargerStatusEnum, nullable=True)
     
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, default=_utcnow, nullable=False)
     
     # 状态持续时间（秒），用于统计
     duration_seconds = Column(Float, nullable=True)
     
     __table_args__ = (
-        Index('idx_status_charger_timestamp', 'charger_id', 'timestamp'),
-        Index('idx_status_timestamp', 'timestamp'),
+        # 覆盖索引：状态时间线查询可走index-only scan
+        Index('idx_status_charger_timestamp', 'charger_id', 'timestamp', postgresql_include=['status', 'previous_status', 'duration_seconds']),
+        Index('idx_status_timestamp', 'timestamp', postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
         Index('idx_status_charger_status', 'charger_id', 'status'),
     )
@@ -3,17 +3,34 @@
 # 使用 Redis 保存充电桩状态（简化 OCPP 1.6J 流程，测试用途）。
 
 import asyncio
-import json
 import logging
 import os
+import time
+import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Callable, Dict, List
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+import orjson
 import redis
+import redis.asyncio as aioredis
+
+from app.utils.redis_write_queue import RedisWriteQueue
+from app.utils.ws_registry import ShardedRegistry
+from app.ocpp.response_batcher import ResponseBatcher
+from app.utils.energy import compute_energy_x100
+from app.utils.order_codec import decode_order
+from app.utils.charger_hash import (
+    CHARGERS_INDEX_KEY,
+    LEGACY_CHARGERS_HASH_KEY,
+    charger_key,
+    flatten_charger,
+    unflatten_charger,
+)
 
 
 # Configure logging
@@ -29,29 +46,38 @@ try:
     from app.core.config import get_settings
     MQTT_AVAILABLE = True
 except ImportError as e:
-    logger.warning(f"MQTT 传输不可用: {e}")
+    logger.warning("MQTT 传输不可用: %s", e)
     MQTT_AVAILABLE = False
 
 # 历史记录支持
 try:
     from app.utils.history_recorder import (
-        record_heartbeat, 
-        record_status_change, 
-        get_last_heartbeat_time,
-        get_last_status
+        enqueue_heartbeat,
+        enqueue_status_change, 
+        get_last_status,
+        start_heartbeat_recorder,
+        stop_heartbeat_recorder,
     )
     HISTORY_RECORDING_AVAILABLE = True
 except ImportError as e:
-    logger.warning(f"历史记录功能不可用: {e}")
+    logger.warning("历史记录功能不可用: %s", e)
     HISTORY_RECORDING_AVAILABLE = False
 
 # 数据库支持
 try:
-    from app.database import init_db, check_db_health, SessionLocal, Charger
-    from datetime import datetime, timezone as tz
+    from app.database import init_db, check_db_health, engine, Charger
+    from sqlalchemy import case, func, or_, tuple_
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from app.database.models import normalize_charger_status
+    from app.database.batch_writer import start_batch_writers, stop_batch_writers
+    from app.core.cache import invalidate_chargers_cache
+    from app.core.config import SETTINGS
+    from datetime import datetime, timedelta, timezone as tz
+    # 充电桩 last_seen 落库的最小间隔
+    LAST_SEEN_PERSIST_INTERVAL = timedelta(seconds=SETTINGS.db_last_seen_interval_seconds)
     DATABASE_AVAILABLE = True
 except ImportError as e:
-    logger.warning(f"数据库功能不可用: {e}")
+    logger.warning("数据库功能不可用: %s", e)
     DATABASE_AVAILABLE = False
 
 
@@ -60,6 +86,8 @@ except ImportError as e:
 async def lifespan(app: FastAPI):
     """应用生命周期管理，初始化多种传输方式（MQTT、HTTP、WebSocket）"""
     # 启动时
+    # HTTP OCPP 适配器在传输管理器初始化后绑定，未启用时为None
+    app.state.http_ocpp_adapter = None
     # 初始化数据库
     if DATABASE_AVAILABLE:
         try:
@@ -69,7 +97,28 @@ async def lifespan(app: FastAPI):
             else:
                 logger.warning("数据库连接失败，跳过表初始化")
         except Exception as e:
-            logger.error(f"数据库初始化失败: {e}", exc_info=True)
+            logger.error("数据库初始化失败: %s", e, exc_info=True)
+        # 心跳/状态等历史记录批量写入
+        start_batch_writers()
+        start_charger_db_sync()
+        if HISTORY_RECORDING_AVAILABLE:
+            start_heartbeat_recorder()
+    
+    try:
+        await migrate_chargers_once()
+    except Exception as e:
+        logger.error("充电桩数据迁移失败: %s", e, exc_info=True)
+    try:
+        await build_order_indexes()
+    except Exception as e:
+        logger.error("建立订单索引失败: %s", e, exc_info=True)
+    try:
+        await migrate_messages_once()
+    except Exception as e:
+        logger.error("留言数据迁移失败: %s", e, exc_info=True)
+    redis_write_queue.start()
+    start_active_flush()
+    start_charger_write_behind()
     
     if MQTT_AVAILABLE:
         try:
@@ -84,19 +133,23 @@ async def lifespan(app: FastAPI):
                 # 在 Docker 容器中，优先使用环境变量，否则使用 mqtt-broker（Docker 服务名）
                 mqtt_host = os.getenv("MQTT_BROKER_HOST")
                 if not mqtt_host:
-                    # 检查是否在 Docker 网络中（通过检查是否能解析 mqtt-broker）
-                    try:
-                        import socket
-                        socket.gethostbyname("mqtt-broker")
-                        mqtt_host = "mqtt-broker"
-                        logger.info("检测到 Docker 网络，使用 mqtt-broker 作为 MQTT broker 地址")
-                    except:
-                        mqtt_host = settings.mqtt_broker_host or "localhost"
+                    mqtt_host = settings.mqtt_broker_host or "localhost"
+                    # 只在容器内探测 Docker 网络（能否解析 mqtt-broker），异步解析且限时，不阻塞启动
+                    if os.getenv("DOCKERIZED") or os.path.exists("/.dockerenv"):
+                        try:
+                            await asyncio.wait_for(
+                                asyncio.get_running_loop().getaddrinfo("mqtt-broker", None),
+                                timeout=0.2
+                            )
+                            mqtt_host = "mqtt-broker"
+                            logger.info("检测到 Docker 网络，使用 mqtt-broker 作为 MQTT broker 地址")
+                        except (OSError, asyncio.TimeoutError):
+                            pass
                 
-                # 如果检测到 Docker 网络，临时修改配置
+                # 如果检测到 Docker 网络，使用带新地址的配置副本（配置对象是只读的）
                 if mqtt_host != settings.mqtt_broker_host:
-                    # 直接修改 settings 对象（因为它是单例）
-                    settings.mqtt_broker_host = mqtt_host
+                    settings = settings.model_copy(update={"mqtt_broker_host": mqtt_host})
+                    transport_manager.settings = settings
             
             # 检查并配置 HTTP（可通过环境变量 ENABLE_HTTP_TRANSPORT 启用）
             # 环境变量优先级高于配置文件
@@ -118,15 +171,16 @@ async def lifespan(app: FastAPI):
                 await transport_manager.initialize(enabled_transports)
                 # 然后设置消息处理器（确保所有适配器都已创建）
                 transport_manager.set_message_handler(handle_ocpp_message)
-                logger.info(f"传输管理器已初始化，启用了 {len(enabled_transports)} 种传输方式: {[t.value for t in enabled_transports]}")
+                app.state.http_ocpp_adapter = transport_manager.get_adapter(TransportType.HTTP)
+                logger.info("传输管理器已初始化，启用了 %s 种传输方式: %s", len(enabled_transports), [t.value for t in enabled_transports])
                 # 验证消息处理器已设置
                 for transport_type, adapter in transport_manager.adapters.items():
                     if adapter.message_handler:
-                        logger.info(f"{transport_type.value} 适配器消息处理器已设置")
+                        logger.info("%s 适配器消息处理器已设置", transport_type.value)
                     else:
-                        logger.warning(f"{transport_type.value} 适配器消息处理器未设置")
+                        logger.warning("%s 适配器消息处理器未设置", transport_type.value)
         except Exception as e:
-            logger.error(f"传输管理器初始化失败: {e}", exc_info=True)
+            logger.error("传输管理器初始化失败: %s", e, exc_info=True)
             # 不阻止应用启动，只是某些传输方式不可用
     
     yield
@@ -137,13 +191,27 @@ async def lifespan(app: FastAPI):
             await transport_manager.shutdown()
             logger.info("传输管理器已关闭")
         except Exception as e:
-            logger.error(f"关闭传输管理器时出错: {e}", exc_info=True)
+            logger.error("关闭传输管理器时出错: %s", e, exc_info=True)
+    
+    # 写入队列中剩余的 Redis 数据
+    await stop_active_flush()
+    await stop_charger_write_behind()
+    await redis_write_queue.stop()
+    await redis_client.aclose()
+    await redis_pool.aclose()
+    
+    if DATABASE_AVAILABLE:
+        if HISTORY_RECORDING_AVAILABLE:
+            await stop_heartbeat_recorder()
+        await stop_charger_db_sync()
+        await stop_batch_writers()
 
 
 # ---- App & CORS ----
 app = FastAPI(
     title="Local OCPP 1.6J CSMS",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -156,199 +224,334 @@ app.add_middleware(
 
 # ---- Redis Client ----
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-redis_client: redis.Redis = redis.from_url(REDIS_URL, decode_responses=True)
-
-CHARGERS_HASH_KEY = "chargers"
-MESSAGES_LIST_KEY = "messages"  # Redis list for messages
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+# 连接用完时等待空闲连接的最长秒数（超时才报错）
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "10"))
+# 进程内共享一个连接池，异步客户端在 Redis I/O 期间不阻塞事件循环；
+# 使用 BlockingConnectionPool，重连高峰时超过上限的命令排队等待，而不是立即抛出 "Too many connections"
+redis_pool = aioredis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+)
+redis_client: aioredis.Redis = aioredis.Redis(connection_pool=redis_pool)
+# 充电桩/订单的 HSET 经异步队列合并后批量写入
+redis_write_queue = RedisWriteQueue(redis_client)
+
+MESSAGES_LIST_KEY = "messages"  # 旧格式：Redis list，仅用于启动时迁移
+MESSAGES_HASH_KEY = "messages_by_id"  # 留言按ID存储（Hash）
+MESSAGES_INDEX_KEY = "messages_z"  # 留言ID按创建时间排序（Sorted Set，分数为毫秒时间戳）
+MESSAGES_MAX = 100  # 只保留最近的留言条数
 ORDERS_HASH_KEY = "orders"  # Redis hash for charging orders
+USER_ORDERS_KEY_PREFIX = "user_orders:"  # 每个用户的订单索引（Sorted Set，分数为开始时间）
+USER_ORDERS_INDEX_READY_KEY = "orders:user_index_ready"  # 历史订单已建立用户索引的标记
+CHARGER_ORDERS_KEY_PREFIX = "orders_by_charger:"  # 每个充电桩的订单索引（Sorted Set，分数为开始时间）
+CHARGER_ORDERS_INDEX_READY_KEY = "orders:charger_index_ready"  # 历史订单已建立充电桩索引的标记
+ORDERS_START_TS_READY_KEY = "orders:start_ts_ready"  # 历史订单已补写 start_ts 的标记
 
 # ---- WebSocket connection registry ----
-charger_websockets: Dict[str, WebSocket] = {}
+charger_websockets: ShardedRegistry[WebSocket] = ShardedRegistry(shards=16)
+# 等待充电桩响应的 CSMS 调用：charger_id -> {messageId: Future}，由 /ocpp 接收循环分发响应
+pending_calls: Dict[str, Dict[str, asyncio.Future]] = {}
+
+# ---- In-process charger cache ----
+# 每个充电桩的 WebSocket/MQTT 消息由本进程处理，充电桩数据以内存为准并写穿到 Redis；
+# 条目从 Redis 加载后 CHARGER_CACHE_TTL 秒过期重新加载，以便看到其他入口（如管理API）的修改
+CHARGER_CACHE_TTL = 30.0
+charger_cache: Dict[str, Dict[str, Any]] = {}
+_charger_cache_expires: Dict[str, float] = {}
+# 实时电量接口用到的少量字段，保存/加载充电桩时更新，前端轮询时直接读内存
+active_meta: Dict[str, Dict[str, Any]] = {}
+
+
+def _update_active_meta(charger: Dict[str, Any]) -> Dict[str, Any]:
+    session = charger.get("session") or {}
+    price_per_kwh = charger.get("price_per_kwh", 2700.0)
+    meta = active_meta[charger["id"]] = {
+        "price_per_kwh": price_per_kwh,
+        # 价格（COP/kWh）× 100 取整，实时费用按整数计算
+        "price_x100": round(float(price_per_kwh) * 100),
+        "charging_rate": charger.get("charging_rate", 7.0),
+        "transaction_id": session.get("transaction_id"),
+        "order_id": session.get("order_id"),
+        "meter": session.get("meter", 0),
+    }
+    return meta
 
 
 # ---- 统一的 OCPP 消息处理函数（供 MQTT 和 WebSocket 使用）----
-async def handle_ocpp_message(charger_id: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    """统一的 OCPP 消息处理函数"""
-    charger = next((c for c in load_chargers() if c["id"] == charger_id), get_default_charger(charger_id))
-    charger["last_seen"] = now_iso()
+def _clear_stale_session(charger_id: str, charger: Dict[str, Any]) -> None:
+    """状态变为 Available 时清理残留的 transaction_id（防止数据不一致）"""
+    session = charger["session"]
+    if session.get("transaction_id") is not None:
+        session["transaction_id"] = None
+        session["order_id"] = None
+        logger.info("[%s] Auto-cleared stale transaction_id when status became Available", charger_id)
+
+
+async def _handle_boot_notification(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """BootNotification：更新厂商信息并接受注册"""
+    try:
+        charger["status"] = "Available"
+        vendor = str(payload.get("vendor", ""))
+        model = str(payload.get("model", ""))
+        firmware_version = str(payload.get("firmwareVersion", ""))
+        serial_number = str(payload.get("serialNumber", ""))
+        
+        charger["vendor"] = vendor if vendor else charger.get("vendor")
+        charger["model"] = model if model else charger.get("model")
+        charger["firmware_version"] = firmware_version if firmware_version else charger.get("firmware_version")
+        charger["serial_number"] = serial_number if serial_number else charger.get("serial_number")
+        _clear_stale_session(charger_id, charger)
+        
+        await update_active(charger_id, vendor=vendor or None, model=model or None, status="Available")
+        await save_charger(charger)
+        
+        logger.info("[%s] BootNotification: vendor=%s, model=%s", charger_id, vendor, model)
+        
+        return {
+            "status": "Accepted",
+            "currentTime": ts,
+            "interval": 30,
+        }
+    except Exception as e:
+        logger.error("[%s] BootNotification处理错误: %s", charger_id, e, exc_info=True)
+        return {"status": "Rejected", "error": str(e)}
+
+
+async def _save_last_seen(charger_id: str, charger: Dict[str, Any], ts: str) -> None:
+    """只改变了 last_seen 的消息：已保存过的充电桩只写这一个字段，不做整条序列化和比较"""
+    if charger_id in _charger_fields:
+        touch_charger(charger, ts)
+    else:
+        await save_charger(charger)
+
+
+async def _handle_heartbeat(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """Heartbeat：刷新在线时间并记录心跳历史"""
+    await update_active(charger_id)
+    await _save_last_seen(charger_id, charger, ts)
     
-    # 处理不同的 OCPP 消息
-    if action == "BootNotification":
+    # 记录心跳历史
+    if HISTORY_RECORDING_AVAILABLE:
         try:
-            charger["status"] = "Available"
-            vendor = str(payload.get("vendor", ""))
-            model = str(payload.get("model", ""))
-            firmware_version = str(payload.get("firmwareVersion", ""))
-            serial_number = str(payload.get("serialNumber", ""))
-            
-            charger["vendor"] = vendor if vendor else charger.get("vendor")
-            charger["model"] = model if model else charger.get("model")
-            charger["firmware_version"] = firmware_version if firmware_version else charger.get("firmware_version")
-            charger["serial_number"] = serial_number if serial_number else charger.get("serial_number")
-            
-            update_active(charger_id, vendor=vendor or None, model=model or None, status="Available")
-            save_charger(charger)
-            
-            logger.info(f"[{charger_id}] BootNotification: vendor={vendor}, model={model}")
-            
-            return {
-                "status": "Accepted",
-                "currentTime": now_iso(),
-                "interval": 30,
-            }
+            enqueue_heartbeat(charger_id)
         except Exception as e:
-            logger.error(f"[{charger_id}] BootNotification处理错误: {e}", exc_info=True)
-            return {"status": "Rejected", "error": str(e)}
+            logger.error("[%s] 记录心跳历史失败: %s", charger_id, e, exc_info=True)
     
-    elif action == "Heartbeat":
-        update_active(charger_id)
-        save_charger(charger)
-        
-        # 记录心跳历史
-        if HISTORY_RECORDING_AVAILABLE:
-            try:
-                previous_heartbeat_time = get_last_heartbeat_time(charger_id)
-                record_heartbeat(charger_id, previous_heartbeat_time)
-            except Exception as e:
-                logger.error(f"[{charger_id}] 记录心跳历史失败: {e}", exc_info=True)
-        
-        return {"currentTime": now_iso()}
+    return {"currentTime": ts}
+
+
+async def _handle_status_notification(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """StatusNotification：更新状态并记录状态变化历史"""
+    new_status = str(payload.get("status", "Unknown"))
+    previous_status = charger.get("status")
+    charger["status"] = new_status
+    if new_status == "Available":
+        _clear_stale_session(charger_id, charger)
+    await update_active(charger_id, status=new_status)
+    await save_charger(charger)
     
-    elif action == "StatusNotification":
-        new_status = str(payload.get("status", "Unknown"))
-        previous_status = charger.get("status")
-        charger["status"] = new_status
-        if new_status == "Available":
-            session = charger.setdefault("session", {
-                "authorized": False,
-                "transaction_id": None,
-                "meter": 0,
-            })
-            if session.get("transaction_id") is not None:
-                session["transaction_id"] = None
-                session["order_id"] = None
-        update_active(charger_id, status=new_status)
-        save_charger(charger)
-        
-        # 记录状态变化历史
-        if HISTORY_RECORDING_AVAILABLE and previous_status != new_status:
-            try:
-                record_status_change(charger_id, new_status, previous_status)
-            except Exception as e:
-                logger.error(f"[{charger_id}] 记录状态历史失败: {e}", exc_info=True)
-        
-        return {}
+    # 记录状态变化历史
+    if HISTORY_RECORDING_AVAILABLE and previous_status != new_status:
+        try:
+            enqueue_status_change(charger_id, new_status, previous_status)
+        except Exception as e:
+            logger.error("[%s] 记录状态历史失败: %s", charger_id, e, exc_info=True)
     
-    elif action == "Authorize":
-        id_tag = str(payload.get("idTag", ""))
-        charger["session"]["authorized"] = True if id_tag else False
-        save_charger(charger)
-        auth_status = "Accepted" if id_tag else "Invalid"
-        return {"idTagInfo": {"status": auth_status}}
+    return {}
+
+
+async def _handle_authorize(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """Authorize：校验 idTag"""
+    id_tag = str(payload.get("idTag", ""))
+    authorized = bool(id_tag)
+    # 授权状态没有变化时只刷新 last_seen
+    if charger["session"].get("authorized") == authorized:
+        await _save_last_seen(charger_id, charger, ts)
+    else:
+        charger["session"]["authorized"] = authorized
+        await save_charger(charger)
+    auth_status = "Accepted" if id_tag else "Invalid"
+    return {"idTagInfo": {"status": auth_status}}
+
+
+async def _handle_start_transaction(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """StartTransaction：开始事务并创建订单"""
+    tx_id = payload.get("transactionId") or _time_id(1_000_000_000)
+    id_tag = str(payload.get("idTag", ""))
+    charger["session"]["transaction_id"] = tx_id
+    charger["status"] = "Charging"
     
-    elif action == "StartTransaction":
-        tx_id = payload.get("transactionId") or int(datetime.now().timestamp())
-        id_tag = str(payload.get("idTag", ""))
-        charger["session"]["transaction_id"] = tx_id
-        charger["status"] = "Charging"
-        
-        charging_rate = charger.get("charging_rate", 7.0)
-        order_id = f"order_{tx_id}"
-        start_time = now_iso()
-        create_order(
-            order_id=order_id,
-            charger_id=charger_id,
-            user_id=id_tag,
-            id_tag=id_tag,
-            charging_rate=charging_rate,
-            start_time=start_time,
-        )
-        charger["session"]["order_id"] = order_id
-        
-        update_active(charger_id, status="Charging", txn_id=tx_id)
-        save_charger(charger)
-        
-        return {
-            "transactionId": tx_id,
-            "idTagInfo": {"status": "Accepted"},
-        }
+    charging_rate = charger.get("charging_rate", 7.0)
+    order_id = f"order_{tx_id}"
+    start_time = ts
+    await create_order(
+        order_id=order_id,
+        charger_id=charger_id,
+        user_id=id_tag,
+        id_tag=id_tag,
+        charging_rate=charging_rate,
+        start_time=start_time,
+    )
+    charger["session"]["order_id"] = order_id
     
-    elif action == "MeterValues":
-        # 处理 MeterValues 消息，提取电量数据
-        meter_value = payload.get("meterValue", [])
-        if meter_value:
-            # 取第一个 meterValue 中的 sampledValue
-            sampled_values = meter_value[0].get("sampledValue", [])
-            if sampled_values:
-                # 查找 Energy.Active.Import.Register 类型的值
-                energy_value = None
-                for sv in sampled_values:
-                    if sv.get("measurand") == "Energy.Active.Import.Register":
-                        energy_value = sv.get("value")
-                        break
-                
-                # 如果找到了能量值，更新充电桩的meter值
-                if energy_value is not None:
-                    try:
-                        meter_wh = int(float(energy_value))  # 转换为整数（Wh）
-                        charger["session"]["meter"] = meter_wh
-                        save_charger(charger)
-                        logger.info(f"[{charger_id}] MeterValues: 更新电量 = {meter_wh} Wh ({meter_wh/1000.0:.2f} kWh)")
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"[{charger_id}] MeterValues: 无法解析电量值 {energy_value}: {e}")
+    await update_active(charger_id, status="Charging", txn_id=tx_id)
+    await save_charger(charger)
+    
+    return {
+        "transactionId": tx_id,
+        "idTagInfo": {"status": "Accepted"},
+    }
+
+
+async def _handle_meter_values(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """MeterValues：提取电量数据"""
+    # 简化格式 {"meter": Wh}（WebSocket 演示客户端使用）
+    if "meter" in payload and not payload.get("meterValue"):
+        try:
+            charger["session"]["meter"] = int(payload["meter"])
+        except (ValueError, TypeError) as e:
+            logger.warning("[%s] MeterValues: 无法解析电量值 %s: %s", charger_id, payload["meter"], e)
+            return {}
+        await save_charger_deferred(charger)
+        logger.info("[%s] MeterValues: 更新电量 = %s Wh", charger_id, charger["session"]["meter"])
         return {}
+    # 处理 MeterValues 消息，提取电量数据
+    meter_value = payload.get("meterValue", [])
+    if meter_value:
+        # 取第一个 meterValue 中的 sampledValue
+        sampled_values = meter_value[0].get("sampledValue", [])
+        if sampled_values:
+            # 查找 Energy.Active.Import.Register 类型的值
+            energy_value = None
+            for sv in sampled_values:
+                if sv.get("measurand") == "Energy.Active.Import.Register":
+                    energy_value = sv.get("value")
+                    break
+            
+            # 如果找到了能量值，更新充电桩的meter值
+            if energy_value is not None:
+                try:
+                    meter_wh = int(float(energy_value))  # 转换为整数（Wh）
+                    charger["session"]["meter"] = meter_wh
+                    await save_charger_deferred(charger)
+                    logger.info("[%s] MeterValues: 更新电量 = %s Wh (%.2f kWh)", charger_id, meter_wh, meter_wh/1000.0)
+                except (ValueError, TypeError) as e:
+                    logger.warning("[%s] MeterValues: 无法解析电量值 %s: %s", charger_id, energy_value, e)
+    return {}
+
+
+async def _handle_stop_transaction(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """StopTransaction：结束事务并结算订单"""
+    tx_id = charger["session"].get("transaction_id")
+    order_id = charger["session"].get("order_id")
     
-    elif action == "StopTransaction":
-        tx_id = charger["session"].get("transaction_id")
-        order_id = charger["session"].get("order_id")
-        
-        if order_id:
-            order = get_order(order_id)
-            if order and order.get("status") == "ongoing":
-                start_time_str = order.get("start_time")
-                end_time_str = now_iso()
-                
-                start_time = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-                end_time = datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
-                duration_seconds = (end_time - start_time).total_seconds()
-                duration_minutes = duration_seconds / 60.0
-                
-                charging_rate = order.get("charging_rate", 7.0)
-                energy_kwh = charging_rate * (duration_minutes / 60.0)
-                
-                update_order(
-                    order_id=order_id,
-                    end_time=end_time_str,
-                    duration_minutes=round(duration_minutes, 2),
-                    energy_kwh=round(energy_kwh, 2),
-                )
-        
-        charger["session"]["transaction_id"] = None
-        charger["session"]["order_id"] = None
-        charger["status"] = "Available"
-        update_active(charger_id, status="Available", txn_id=None)
-        save_charger(charger)
-        
-        return {
-            "stopped": True,
-            "transactionId": tx_id,
-            "idTagInfo": {"status": "Accepted"},
-        }
+    if order_id:
+        await settle_order(order_id, ts)
     
-    elif action in ["FirmwareStatusNotification", "DiagnosticsStatusNotification"]:
-        save_charger(charger)
-        return {}
+    charger["session"]["transaction_id"] = None
+    charger["session"]["order_id"] = None
+    charger["status"] = "Available"
+    await update_active(charger_id, status="Available", txn_id=None)
+    await save_charger(charger)
     
-    elif action == "DataTransfer":
-        save_charger(charger)
-        return {
-            "status": "Accepted",
-            "data": None
-        }
+    return {
+        "stopped": True,
+        "transactionId": tx_id,
+        "idTagInfo": {"status": "Accepted"},
+    }
+
+
+async def _handle_status_report(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """FirmwareStatusNotification / DiagnosticsStatusNotification：只刷新在线时间"""
+    await _save_last_seen(charger_id, charger, ts)
+    return {}
+
+
+async def _handle_data_transfer(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """DataTransfer：接受厂商自定义数据"""
+    await _save_last_seen(charger_id, charger, ts)
+    return {
+        "status": "Accepted",
+        "data": None
+    }
+
+
+# 动作 -> 处理函数，导入时构建一次，每条消息一次字典查找
+_OCPP_HANDLERS: Dict[str, Callable[[str, Dict[str, Any], Dict[str, Any], str], Awaitable[Dict[str, Any]]]] = {
+    "BootNotification": _handle_boot_notification,
+    "Heartbeat": _handle_heartbeat,
+    "StatusNotification": _handle_status_notification,
+    "Authorize": _handle_authorize,
+    "StartTransaction": _handle_start_transaction,
+    "MeterValues": _handle_meter_values,
+    "StopTransaction": _handle_stop_transaction,
+    "FirmwareStatusNotification": _handle_status_report,
+    "DiagnosticsStatusNotification": _handle_status_report,
+    "DataTransfer": _handle_data_transfer,
+}
+
+
+async def _handle_ws_boot_notification(charger_id: str, charger: Dict[str, Any], payload: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """
+    WebSocket 的 BootNotification：充电桩声明支持时，之后的响应合并为 JSON 数组发送
     
-    else:
-        logger.warning(f"[{charger_id}] 未知的 OCPP 动作: {action}")
+    与原 /ocpp 行为一致，处理出错（如Redis写入失败）时仍返回 Accepted，错误只记录日志
+    """
+    resp = await _handle_boot_notification(charger_id, charger, payload, ts)
+    if resp.get("status") != "Accepted":
+        # 无论Redis是否成功，都返回正常的OCPP响应
+        logger.warning("[%s] BootNotification处理出错，仍返回 Accepted", charger_id)
+        resp = {"status": "Accepted", "currentTime": ts, "interval": 30}
+    if payload.get("responseBatching") is True:
+        resp["responseBatching"] = True
+    return resp
+
+
+# ocpp_ws 接收循环的分发表
+_WS_HANDLERS: Dict[str, Callable[[str, Dict[str, Any], Dict[str, Any], str], Awaitable[Dict[str, Any]]]] = {
+    **_OCPP_HANDLERS,
+    "BootNotification": _handle_ws_boot_notification,
+}
+
+# 固定内容的 WebSocket 响应，模块加载时序列化一次
+_WS_ACK_TEMPLATES: Dict[str, str] = {
+    action: orjson.dumps({"action": action}).decode()
+    for action in ("StatusNotification", "MeterValues", "FirmwareStatusNotification", "DiagnosticsStatusNotification")
+}
+_WS_AUTHORIZE_TEMPLATES: Dict[str, str] = {
+    status: orjson.dumps({"action": "Authorize", "idTagInfo": {"status": status}}).decode()
+    for status in ("Accepted", "Invalid")
+}
+
+
+def _ws_response(action: str, resp: Dict[str, Any]) -> Dict[str, Any] | str:
+    """组装 ocpp_ws 的响应；固定内容的响应直接使用预先序列化的模板"""
+    if not resp:
+        template = _WS_ACK_TEMPLATES.get(action)
+        if template is not None:
+            return template
+    elif action == "Authorize" and len(resp) == 1:
+        template = _WS_AUTHORIZE_TEMPLATES.get(resp["idTagInfo"]["status"])
+        if template is not None:
+            return template
+    return {"action": action, **resp}
+
+
+async def handle_ocpp_message(charger_id: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """统一的 OCPP 消息处理函数"""
+    handler = _OCPP_HANDLERS.get(action)
+    if handler is None:
+        logger.warning("[%s] 未知的 OCPP 动作: %s", charger_id, action)
         return {"error": "UnknownAction", "action": action}
+    
+    # 整条消息使用同一个时间戳
+    ts = now_iso()
+    charger = await get_charger(charger_id) or get_default_charger(charger_id)
+    charger["last_seen"] = ts
+    return await handler(charger_id, charger, payload, ts)
 
 
 # ---- Helper function to send OCPP messages from CSMS to Charge Point ----
@@ -361,55 +564,157 @@ async def send_ocpp_call(charger_id: str, action: str, payload: Dict[str, Any],
     if not ws:
         raise HTTPException(status_code=404, detail=f"Charger {charger_id} is not connected")
     
+    # 按消息ID等待响应，同一充电桩可以并发多个调用，响应不会被其他接收方读走
+    message_id = uuid.uuid4().hex
+    future = asyncio.get_running_loop().create_future()
+    calls = pending_calls.setdefault(charger_id, {})
+    calls[message_id] = future
     try:
         message = {
+            "messageId": message_id,
             "action": action,
             "payload": payload
         }
-        await ws.send_text(json.dumps(message))
-        logger.info(f"[{charger_id}] -> CSMS发送OCPP调用: {action}")
+        await ws.send_text(orjson.dumps(message).decode())
+        logger.info("[%s] -> CSMS发送OCPP调用: %s", charger_id, action)
         
-        # 等待响应（简化版本，实际应该使用消息ID匹配）
         try:
-            response = await asyncio.wait_for(ws.receive_text(), timeout=timeout)
-            response_data = json.loads(response)
-            logger.info(f"[{charger_id}] <- 收到响应: {action}")
+            response_data = await asyncio.wait_for(future, timeout=timeout)
+            logger.info("[%s] <- 收到响应: %s", charger_id, action)
             return {"success": True, "data": response_data}
         except asyncio.TimeoutError:
-            logger.warning(f"[{charger_id}] OCPP调用超时: {action}")
+            logger.warning("[%s] OCPP调用超时: %s", charger_id, action)
             return {"success": False, "error": "Timeout waiting for response"}
     except Exception as e:
-        logger.error(f"[{charger_id}] 发送OCPP调用失败: {e}", exc_info=True)
+        logger.error("[%s] 发送OCPP调用失败: %s", charger_id, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to send OCPP call: {str(e)}")
+    finally:
+        calls.pop(message_id, None)
+
+
+def resolve_pending_call(charger_id: str, msg: Any) -> bool:
+    """
+    如果收到的消息是对 CSMS 调用的响应，交给对应的等待方
+    
+    支持 OCPP-J 的 CallResult [3, id, payload] / CallError [4, id, code, desc, details]，
+    以及带 messageId 的简化格式；不带 messageId 且没有 action 的响应交给最早的等待调用
+    """
+    calls = pending_calls.get(charger_id)
+    if not calls:
+        return False
+    if isinstance(msg, list):
+        if len(msg) < 3 or msg[0] not in (3, 4):
+            return False
+        message_id = msg[1]
+        result = msg[2] if msg[0] == 3 else {"errorCode": msg[2], "errorDescription": msg[3] if len(msg) > 3 else ""}
+    elif isinstance(msg, dict) and msg.get("messageId") in calls:
+        message_id, result = msg["messageId"], msg
+    elif isinstance(msg, dict) and not msg.get("action"):
+        message_id, result = next(iter(calls)), msg
+    else:
+        return False
+    future = calls.pop(message_id, None)
+    if future is None or future.done():
+        return False
+    future.set_result(result)
+    return True
+
+
+_now_iso_cache: tuple[int, str] = (0, "")
 
 
 def now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    """当前UTC时间（ISO格式，精确到秒）；同一秒内的调用复用同一个字符串"""
+    global _now_iso_cache
+    second = time.time_ns() // 1_000_000_000
+    if second != _now_iso_cache[0]:
+        _now_iso_cache = (second, datetime.fromtimestamp(second, timezone.utc).isoformat())
+    return _now_iso_cache[1]
+
+
+_last_time_ids: Dict[int, int] = {}
+
+
+def _time_id(unit_ns: int) -> int:
+    """按时间生成递增的整数ID（unit_ns 为时间单位的纳秒数）；同一单位内重复时顺延，避免订单/留言ID冲突"""
+    value = time.time_ns() // unit_ns
+    last = _last_time_ids.get(unit_ns, 0)
+    if value <= last:
+        value = last + 1
+    _last_time_ids[unit_ns] = value
+    return value
+
+
+def _parse_iso(value: str) -> datetime:
+    """解析ISO时间；Python 3.11+ 的 fromisoformat 可直接解析 "Z" 后缀，旧版本失败时再替换"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        if value.endswith("Z"):
+            return datetime.fromisoformat(value[:-1] + "+00:00")
+        raise
+
+
+def _iso_epoch(value: str) -> float:
+    """ISO时间转Unix时间戳；now_iso() 刚生成的字符串直接取缓存的秒数，不再解析"""
+    if value == _now_iso_cache[1]:
+        return float(_now_iso_cache[0])
+    return _parse_iso(value).timestamp()
+
+
+def _order_start_ts(order: Dict[str, Any]) -> float:
+    """订单开始的Unix时间戳（旧订单没有 start_ts 时解析 start_time）"""
+    start_ts = order.get("start_ts")
+    if start_ts is not None:
+        return float(start_ts)
+    return _iso_epoch(order["start_time"])
+
+
+# 新充电桩的默认数据模板（id/last_seen 在复制时填入）
+_DEFAULT_CHARGER_TEMPLATE: Dict[str, Any] = {
+    "id": None,
+    "vendor": None,
+    "model": None,
+    "firmware_version": None,
+    "serial_number": None,
+    "status": "Unknown",
+    "last_seen": None,
+    "location": {
+        "latitude": None,
+        "longitude": None,
+        "address": "",
+    },
+    "session": {
+        "authorized": False,
+        "transaction_id": None,
+        "order_id": None,
+        "meter": 0,
+    },
+    "connector_type": "Type2",  # 充电头类型: GBT, Type1, Type2, CCS1, CCS2
+    "charging_rate": 7.0,  # 充电速率 (kW)
+    "price_per_kwh": 2700.0,  # 每度电价格 (COP/kWh)
+}
 
 
 def get_default_charger(charger_id: str) -> Dict[str, Any]:
-    return {
-        "id": charger_id,
-        "vendor": None,
-        "model": None,
-        "firmware_version": None,
-        "serial_number": None,
-        "status": "Unknown",
-        "last_seen": now_iso(),
-        "location": {
-            "latitude": None,
-            "longitude": None,
-            "address": "",
-        },
-        "session": {
-            "authorized": False,
-            "transaction_id": None,
-            "meter": 0,
-        },
-        "connector_type": "Type2",  # 充电头类型: GBT, Type1, Type2, CCS1, CCS2
-        "charging_rate": 7.0,  # 充电速率 (kW)
-        "price_per_kwh": 2700.0,  # 每度电价格 (COP/kWh)
-    }
+    # 模板只有一层嵌套且值都是不可变标量，复制外层和两个子字典即可
+    charger = dict(_DEFAULT_CHARGER_TEMPLATE)
+    charger["location"] = dict(_DEFAULT_CHARGER_TEMPLATE["location"])
+    charger["session"] = dict(_DEFAULT_CHARGER_TEMPLATE["session"])
+    charger["id"] = charger_id
+    charger["last_seen"] = now_iso()
+    return charger
+
+
+def _normalize_session(charger: Dict[str, Any]) -> Dict[str, Any]:
+    """加载时补齐 session 及其字段，处理函数可以直接使用 charger["session"]"""
+    session = charger.get("session")
+    if session is None:
+        charger["session"] = dict(_DEFAULT_CHARGER_TEMPLATE["session"])
+    elif len(session) < len(_DEFAULT_CHARGER_TEMPLATE["session"]):
+        for name, value in _DEFAULT_CHARGER_TEMPLATE["session"].items():
+            session.setdefault(name, value)
+    return charger
 
 
 def migrate_charger_data(charger: Dict[str, Any]) -> Dict[str, Any]:
@@ -429,123 +734,405 @@ def migrate_charger_data(charger: Dict[str, Any]) -> Dict[str, Any]:
         
         # 修复：如果状态是 Available 但 transaction_id 不为 null，清理 transaction_id
         if charger.get("status") == "Available" and charger["session"].get("transaction_id") is not None:
-            logger.info(f"[{charger.get('id')}] Auto-fixing: clearing stale transaction_id for Available charger")
+            logger.info("[%s] Auto-fixing: clearing stale transaction_id for Available charger", charger.get('id'))
             charger["session"]["transaction_id"] = None
             charger["session"]["order_id"] = None
     
     return charger
 
 
-def load_chargers() -> List[Dict[str, Any]]:
-    items = redis_client.hgetall(CHARGERS_HASH_KEY)
+# 启动时的一次性迁移是否已完成，完成后读路径不再逐条迁移
+_MIGRATION_DONE = False
+
+# 每个充电桩在 Redis 中已有的字段值，保存时只写入变化的字段
+_charger_fields: Dict[str, Dict[str, str]] = {}
+
+
+async def migrate_chargers_once() -> None:
+    """
+    启动时执行一次：把旧格式（单个 Hash 中的 JSON）的充电桩拆成独立 Hash，
+    并补齐缺失字段，只回写确实有变化的字段
+    """
+    global _MIGRATION_DONE
+    stored = await _fetch_charger_fields(await redis_client.smembers(CHARGERS_INDEX_KEY))
+    candidates = []  # (充电桩ID, Redis 中已有字段, 充电桩数据)
+    for charger_id, fields in stored.items():
+        try:
+            candidates.append((charger_id, fields, unflatten_charger(fields)))
+        except Exception:
+            continue
+    legacy = await redis_client.hgetall(LEGACY_CHARGERS_HASH_KEY)
+    legacy_done = []  # 已迁移（或早已存在新格式）的旧格式条目，迁移后删除
+    legacy_failed = []  # 无法解析的旧格式条目，保留在旧 Hash 中
+    for charger_id, val in legacy.items():
+        if charger_id in stored:
+            legacy_done.append(charger_id)
+            continue
+        try:
+            charger = orjson.loads(val)
+        except orjson.JSONDecodeError:
+            charger = None
+        if not isinstance(charger, dict):
+            legacy_failed.append(charger_id)
+            continue
+        candidates.append((charger_id, {}, charger))
+        legacy_done.append(charger_id)
+    if legacy_failed:
+        logger.error("以下旧格式充电桩数据无法解析，保留在 %s 中: %s", LEGACY_CHARGERS_HASH_KEY, legacy_failed)
+    
+    pipe = redis_client.pipeline(transaction=False)
+    migrated = 0
+    for charger_id, fields, charger in candidates:
+        target = flatten_charger(migrate_charger_data(_normalize_session(charger)))
+        changed = {k: v for k, v in target.items() if fields.get(k) != v}
+        if changed:
+            pipe.hset(charger_key(charger_id), mapping=changed)
+            pipe.sadd(CHARGERS_INDEX_KEY, charger_id)
+            migrated += 1
+    if legacy_done:
+        pipe.hdel(LEGACY_CHARGERS_HASH_KEY, *legacy_done)
+    await pipe.execute()
+    _MIGRATION_DONE = True
+    logger.info("充电桩数据迁移完成: 共 %s 个，回写 %s 个（旧格式 %s 个）", len(candidates), migrated, len(legacy))
+
+
+async def _fetch_charger_fields(charger_ids) -> Dict[str, Dict[str, str]]:
+    """一次管道往返读取多个充电桩的 Hash 字段（合并写入队列中尚未落地的字段）"""
+    charger_ids = list(charger_ids)
+    pipe = redis_client.pipeline(transaction=False)
+    for charger_id in charger_ids:
+        pipe.hgetall(charger_key(charger_id))
+    result: Dict[str, Dict[str, str]] = {}
+    for charger_id, fields in zip(charger_ids, await pipe.execute()):
+        fields.update(redis_write_queue.pending_fields(charger_key(charger_id)))
+        if fields:
+            result[charger_id] = fields
+    return result
+
+
+async def load_chargers() -> List[Dict[str, Any]]:
     chargers: List[Dict[str, Any]] = []
-    for _, val in items.items():
+    stored = await _fetch_charger_fields(await redis_client.smembers(CHARGERS_INDEX_KEY))
+    for fields in stored.values():
         try:
-            charger = json.loads(val)
-            # 迁移旧数据，补充缺失字段
-            charger = migrate_charger_data(charger)
-            # 如果数据有更新，保存回去
-            save_charger(charger)
-            chargers.append(charger)
+            charger = unflatten_charger(fields)
         except Exception:
             continue
+        _normalize_session(charger)
+        # 启动迁移完成前，在内存中补齐旧数据缺失的字段
+        chargers.append(charger if _MIGRATION_DONE else migrate_charger_data(charger))
     return chargers
 
 
-def save_charger(charger: Dict[str, Any]) -> None:
-    """保存充电桩数据到Redis，带错误处理"""
+async def get_charger(charger_id: str) -> Dict[str, Any] | None:
+    """
+    按ID读取单个充电桩（优先内存缓存），不存在时返回None；
+    Redis 错误或数据无法解析时抛出异常，调用方不能当作不存在而用默认数据覆盖
+    """
+    charger = charger_cache.get(charger_id)
+    if charger is not None and _charger_cache_expires.get(charger_id, 0.0) > time.monotonic():
+        return charger
+    if charger is not None and charger_id in _deferred_chargers:
+        # 还有未保存的修改，不能用 Redis 中的旧数据覆盖
+        return charger
+    charger = await _load_one(charger_id)
+    if charger is not None:
+        charger_cache[charger_id] = charger
+        _charger_cache_expires[charger_id] = time.monotonic() + CHARGER_CACHE_TTL
+        _update_active_meta(charger)
+    return charger
+
+
+async def _load_one(charger_id: str) -> Dict[str, Any] | None:
+    """从Redis读取单个充电桩（HGETALL charger:{id}），Hash 为空时返回None，读取或解析失败时抛出异常"""
+    key = charger_key(charger_id)
     try:
-        redis_client.hset(CHARGERS_HASH_KEY, charger["id"], json.dumps(charger))
+        fields = await redis_client.hgetall(key)
+    except Exception as e:
+        logger.error("Redis错误，无法读取充电桩 %s: %s", charger_id, e)
+        raise
+    fields.update(redis_write_queue.pending_fields(key))
+    if not fields:
+        return None
+    try:
+        charger = unflatten_charger(fields)
+    except Exception as e:
+        logger.error("充电桩 %s 的数据无法解析: %s", charger_id, e)
+        raise
+    _charger_fields[charger_id] = fields
+    _normalize_session(charger)
+    return charger if _MIGRATION_DONE else migrate_charger_data(charger)
+
+
+async def save_charger(charger: Dict[str, Any]) -> None:
+    """更新内存缓存并把变化的字段保存到Redis（经写入队列批量写入），带错误处理"""
+    charger_id = charger["id"]
+    charger_cache[charger_id] = charger
+    _update_active_meta(charger)
+    # 保存不刷新过期时间，缓存仍会定期从 Redis 重新加载
+    _charger_cache_expires.setdefault(charger_id, time.monotonic() + CHARGER_CACHE_TTL)
+    fields = flatten_charger(charger)
+    stored = _charger_fields.get(charger_id)
+    try:
+        if stored is None:
+            # 本进程第一次写入该充电桩，确保它在索引中
+            await redis_client.sadd(CHARGERS_INDEX_KEY, charger_id)
+            changed = fields
+        else:
+            changed = {k: v for k, v in fields.items() if stored.get(k) != v}
+        if changed:
+            redis_write_queue.hset(charger_key(charger_id), mapping=changed)
+        _charger_fields[charger_id] = fields
     except redis.exceptions.ResponseError as e:
         # Redis配置错误（如MISCONF），记录但不中断流程
-        logger.error(f"Redis配置错误，无法保存充电桩 {charger['id']}: {e}")
-        logger.warning(f"充电桩数据未保存到Redis，但连接继续: {charger['id']}")
+        logger.error("Redis配置错误，无法保存充电桩 %s: %s", charger_id, e)
+        logger.warning("充电桩数据未保存到Redis，但连接继续: %s", charger_id)
     except Exception as e:
         # 其他Redis错误，记录但不中断流程
-        logger.error(f"Redis错误，无法保存充电桩 {charger['id']}: {e}", exc_info=True)
-        logger.warning(f"充电桩数据未保存到Redis，但连接继续: {charger['id']}")
+        logger.error("Redis错误，无法保存充电桩 %s: %s", charger_id, e, exc_info=True)
+        logger.warning("充电桩数据未保存到Redis，但连接继续: %s", charger_id)
     
-    # 同步到数据库
+    # 标记为待同步，由后台任务批量写入数据库
     if DATABASE_AVAILABLE:
-        try:
-            sync_charger_to_db(charger)
-        except Exception as e:
-            logger.error(f"同步充电桩 {charger['id']} 到数据库失败: {e}", exc_info=True)
+        mark_charger_dirty(charger)
 
 
-def sync_charger_to_db(charger: Dict[str, Any]) -> None:
-    """将充电桩数据同步到数据库"""
-    if not DATABASE_AVAILABLE:
+# ---- 充电桩延迟保存（write-behind）----
+# 高频消息（MeterValues、心跳）只更新内存并标记，后台任务每隔 CHARGER_WRITE_BEHIND_INTERVAL 秒
+# 对每个充电桩做一次 save_charger，同一窗口内的多次修改只序列化、比较一次
+CHARGER_WRITE_BEHIND_INTERVAL = 0.25
+_deferred_chargers: set[str] = set()
+_write_behind_task: asyncio.Task | None = None
+
+
+async def save_charger_deferred(charger: Dict[str, Any]) -> None:
+    """更新内存缓存并延迟保存；后台任务未启动时直接保存"""
+    if _write_behind_task is None:
+        await save_charger(charger)
         return
+    charger_id = charger["id"]
+    charger_cache[charger_id] = charger
+    _charger_cache_expires.setdefault(charger_id, time.monotonic() + CHARGER_CACHE_TTL)
+    _update_active_meta(charger)
+    _deferred_chargers.add(charger_id)
+
+
+async def flush_deferred_chargers() -> None:
+    """保存所有延迟中的充电桩"""
+    if not _deferred_chargers:
+        return
+    charger_ids = list(_deferred_chargers)
+    _deferred_chargers.clear()
+    for charger_id in charger_ids:
+        charger = charger_cache.get(charger_id)
+        if charger is not None:
+            await save_charger(charger)
+
+
+async def _write_behind_loop() -> None:
+    while True:
+        await asyncio.sleep(CHARGER_WRITE_BEHIND_INTERVAL)
+        await flush_deferred_chargers()
+
+
+def start_charger_write_behind() -> None:
+    """启动充电桩延迟保存任务（需在事件循环中调用）"""
+    global _write_behind_task
+    if _write_behind_task is None:
+        _write_behind_task = asyncio.create_task(_write_behind_loop())
+
+
+async def stop_charger_write_behind() -> None:
+    """停止延迟保存任务并保存剩余的充电桩"""
+    global _write_behind_task
+    if _write_behind_task is None:
+        return
+    _write_behind_task.cancel()
+    try:
+        await _write_behind_task
+    except asyncio.CancelledError:
+        pass
+    _write_behind_task = None
+    await flush_deferred_chargers()
+
+
+def touch_charger(charger: Dict[str, Any], ts: str) -> None:
+    """只刷新 last_seen：写入缓存并排队 HSET 单个字段，数据库按落库间隔节流"""
+    charger_id = charger["id"]
+    charger["last_seen"] = ts
+    charger_cache[charger_id] = charger
+    value = orjson.dumps(ts).decode()
+    redis_write_queue.hset(charger_key(charger_id), "last_seen", value)
+    stored = _charger_fields.get(charger_id)
+    if stored is not None:
+        stored["last_seen"] = value
+    if DATABASE_AVAILABLE:
+        synced_at = _last_seen_synced.get(charger_id)
+        if synced_at is None or time.monotonic() - synced_at >= LAST_SEEN_PERSIST_INTERVAL.total_seconds():
+            mark_charger_dirty(charger)
+
+
+# ---- 充电桩数据库同步（批量）----
+# 保存充电桩时只记录ID，后台任务每隔 CHARGER_DB_SYNC_INTERVAL 秒用一条 UPSERT 批量写入
+CHARGER_DB_SYNC_INTERVAL = 1.0
+_dirty_chargers: set[str] = set()
+# 每个充电桩最近一次标记同步的时间（monotonic），用于节流仅 last_seen 变化的同步
+_last_seen_synced: Dict[str, float] = {}
+_charger_db_sync_task: asyncio.Task | None = None
+
+# 同步到数据库的字段（last_seen 单独按间隔节流）
+_CHARGER_SYNC_COLUMNS = (
+    "vendor", "model", "firmware_version", "serial_number", "status",
+    "connector_type", "is_active",
+)
+# 由管理接口（/api/v1/chargers/pricing、/location）维护的字段：内存缓存可能比数据库旧，
+# 只在新建充电桩或本进程修改过时写入，避免覆盖管理员的修改
+_CHARGER_ADMIN_COLUMNS = ("latitude", "longitude", "address", "charging_rate", "price_per_kwh")
+# 本进程修改过位置/价格、尚未同步到数据库的充电桩
+_admin_changed_chargers: set[str] = set()
+
+
+def _charger_db_row(charger: Dict[str, Any]) -> Dict[str, Any]:
+    """将充电桩数据转换为 chargers 表的一行"""
+    try:
+        last_seen = _parse_iso(charger["last_seen"])
+    except Exception:
+        last_seen = datetime.now(tz.utc)
+    loc = charger.get("location")
+    if not isinstance(loc, dict):
+        loc = {}
+    return {
+        "id": charger["id"],
+        "vendor": charger.get("vendor"),
+        "model": charger.get("model"),
+        "firmware_version": charger.get("firmware_version"),
+        "serial_number": charger.get("serial_number"),
+        "status": normalize_charger_status(charger.get("status", "Unknown")),
+        "last_seen": last_seen,
+        "latitude": loc.get("latitude"),
+        "longitude": loc.get("longitude"),
+        "address": loc.get("address"),
+        "connector_type": charger.get("connector_type", "Type2"),
+        "charging_rate": charger.get("charging_rate", 7.0),
+        "price_per_kwh": charger.get("price_per_kwh", 2700.0),
+        "is_active": True,
+    }
+
+
+def _upsert_chargers(rows: List[Dict[str, Any]], include_admin_columns: bool = False) -> bool:
+    """
+    一条 INSERT ... ON CONFLICT DO UPDATE 写入一批充电桩
     
+    没有字段变化（last_seen 未超过落库间隔）的行不做更新；位置和价格只在新建时写入，
+    include_admin_columns 为 True 时也更新已有行的这些字段；返回是否写入成功
+    """
+    columns = _CHARGER_SYNC_COLUMNS + _CHARGER_ADMIN_COLUMNS if include_admin_columns else _CHARGER_SYNC_COLUMNS
+    table = Charger.__table__
+    stmt = pg_insert(table)
+    excluded = stmt.excluded
+    # last_seen 按间隔节流落库，心跳不再每次都改写整行
+    refresh_last_seen = or_(
+        table.c.last_seen.is_(None),
+        excluded.last_seen - table.c.last_seen >= LAST_SEEN_PERSIST_INTERVAL,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={
+            **{name: excluded[name] for name in columns},
+            "last_seen": case((refresh_last_seen, excluded.last_seen), else_=table.c.last_seen),
+            "updated_at": func.now(),
+        },
+        where=or_(
+            tuple_(*(table.c[name] for name in columns)).is_distinct_from(
+                tuple_(*(excluded[name] for name in columns))
+            ),
+            refresh_last_seen,
+        ),
+    ).returning(table.c.id)
     try:
-        db = SessionLocal()
-        try:
-            charger_id = charger["id"]
-            # 查找或创建充电桩记录
-            db_charger = db.query(Charger).filter(Charger.id == charger_id).first()
-            
-            if not db_charger:
-                # 创建新记录
-                db_charger = Charger(id=charger_id)
-                db.add(db_charger)
-            
-            # 更新字段
-            if "vendor" in charger:
-                db_charger.vendor = charger.get("vendor")
-            if "model" in charger:
-                db_charger.model = charger.get("model")
-            if "firmware_version" in charger:
-                db_charger.firmware_version = charger.get("firmware_version")
-            if "serial_number" in charger:
-                db_charger.serial_number = charger.get("serial_number")
-            if "status" in charger:
-                db_charger.status = charger.get("status", "Unknown")
-            if "last_seen" in charger:
-                try:
-                    db_charger.last_seen = datetime.fromisoformat(charger["last_seen"].replace("Z", "+00:00"))
-                except:
-                    db_charger.last_seen = datetime.now(tz.utc)
-            
-            # 更新位置信息
-            if "location" in charger:
-                loc = charger["location"]
-                if isinstance(loc, dict):
-                    db_charger.latitude = loc.get("latitude")
-                    db_charger.longitude = loc.get("longitude")
-                    db_charger.address = loc.get("address")
-            
-            # 更新配置信息
-            if "connector_type" in charger:
-                db_charger.connector_type = charger.get("connector_type", "Type2")
-            if "charging_rate" in charger:
-                db_charger.charging_rate = charger.get("charging_rate", 7.0)
-            if "price_per_kwh" in charger:
-                db_charger.price_per_kwh = charger.get("price_per_kwh", 2700.0)
-            
-            db_charger.is_active = True
-            db_charger.updated_at = datetime.now(tz.utc)
-            
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise
-        finally:
-            db.close()
+        with engine.begin() as conn:
+            written = conn.execute(stmt, rows).all()
     except Exception as e:
-        logger.error(f"同步充电桩 {charger.get('id', 'unknown')} 到数据库失败: {e}", exc_info=True)
+        logger.error("同步 %s 个充电桩到数据库失败: %s", len(rows), e, exc_info=True)
+        return False
+    # 有新增或更新时清除充电桩列表缓存
+    if written:
+        invalidate_chargers_cache()
+    return True
+
+
+def mark_charger_dirty(charger: Dict[str, Any]) -> None:
+    """标记充电桩待同步到数据库；后台任务未启动时直接写入"""
+    charger_id = charger["id"]
+    _last_seen_synced[charger_id] = time.monotonic()
+    if _charger_db_sync_task is None:
+        include_admin = charger_id in _admin_changed_chargers
+        if _upsert_chargers([_charger_db_row(charger)], include_admin) and include_admin:
+            _admin_changed_chargers.discard(charger_id)
+        return
+    _dirty_chargers.add(charger_id)
+
+
+async def flush_dirty_chargers() -> None:
+    """将所有待同步的充电桩批量写入数据库，失败的留待下次重试"""
+    if not _dirty_chargers:
+        return
+    charger_ids = list(_dirty_chargers)
+    _dirty_chargers.clear()
+    # 位置/价格由本进程修改过的单独一批，连同这些字段一起更新
+    admin_ids = [cid for cid in charger_ids if cid in _admin_changed_chargers and cid in charger_cache]
+    other_ids = [cid for cid in charger_ids if cid not in _admin_changed_chargers and cid in charger_cache]
+    _admin_changed_chargers.difference_update(admin_ids)
+    for ids, include_admin in ((admin_ids, True), (other_ids, False)):
+        if not ids:
+            continue
+        rows = [_charger_db_row(charger_cache[cid]) for cid in ids]
+        if not await asyncio.to_thread(_upsert_chargers, rows, include_admin):
+            _dirty_chargers.update(ids)
+            if include_admin:
+                _admin_changed_chargers.update(ids)
+
+
+async def _charger_db_sync_loop() -> None:
+    while True:
+        await asyncio.sleep(CHARGER_DB_SYNC_INTERVAL)
+        await flush_dirty_chargers()
+
+
+def start_charger_db_sync() -> None:
+    """启动充电桩数据库批量同步任务（需在事件循环中调用）"""
+    global _charger_db_sync_task
+    if _charger_db_sync_task is None:
+        _charger_db_sync_task = asyncio.create_task(_charger_db_sync_loop())
+
+
+async def stop_charger_db_sync() -> None:
+    """停止同步任务并写入剩余的充电桩"""
+    global _charger_db_sync_task
+    if _charger_db_sync_task is None:
+        return
+    _charger_db_sync_task.cancel()
+    try:
+        await _charger_db_sync_task
+    except asyncio.CancelledError:
+        pass
+    _charger_db_sync_task = None
+    await flush_dirty_chargers()
 
 
 # ---- Order Management ----
-def create_order(
+async def create_order(
     order_id: str,
     charger_id: str,
     user_id: str,
     id_tag: str,
     charging_rate: float,
     start_time: str,
+    start_ts: int | None = None,
 ) -> Dict[str, Any]:
-    """创建充电订单"""
+    """创建充电订单（start_ts 为开始时间的Unix时间戳，结算时免去解析 start_time）"""
+    if start_ts is None:
+        start_ts = int(_order_score(start_time))
     order = {
         "id": order_id,
         "charger_id": charger_id,
@@ -553,69 +1140,150 @@ def create_order(
         "id_tag": id_tag,
         "charging_rate": charging_rate,
         "start_time": start_time,
+        "start_ts": start_ts,
         "end_time": None,
         "duration_minutes": None,
         "energy_kwh": None,
         "status": "ongoing",  # ongoing, completed, cancelled
     }
-    redis_client.hset(ORDERS_HASH_KEY, order_id, json.dumps(order))
-    logger.info(f"Order created: {order_id} for charger {charger_id}")
+    redis_write_queue.hset(ORDERS_HASH_KEY, order_id, orjson.dumps(order))
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zadd(f"{USER_ORDERS_KEY_PREFIX}{user_id}", {order_id: start_ts})
+        pipe.zadd(f"{CHARGER_ORDERS_KEY_PREFIX}{charger_id}", {order_id: start_ts})
+        await pipe.execute()
+    logger.info("Order created: %s for charger %s", order_id, charger_id)
     return order
 
 
-def update_order(
+async def update_order(
     order_id: str,
     end_time: str,
     duration_minutes: float,
     energy_kwh: float,
+    order: Dict[str, Any] | None = None,
 ) -> None:
-    """更新订单（结束充电时）"""
-    order_data = redis_client.hget(ORDERS_HASH_KEY, order_id)
-    if not order_data:
-        logger.warning(f"Order not found: {order_id}")
+    """更新订单（结束充电时）；传入已读取的订单时不再重新读取"""
+    if order is None:
+        order = await get_order(order_id)
+    if not order:
+        logger.warning("Order not found: %s", order_id)
         return
     
-    order = json.loads(order_data)
     order["end_time"] = end_time
     order["duration_minutes"] = duration_minutes
     order["energy_kwh"] = energy_kwh
     order["status"] = "completed"
     
-    redis_client.hset(ORDERS_HASH_KEY, order_id, json.dumps(order))
-    logger.info(f"Order updated: {order_id}, energy: {energy_kwh} kWh, duration: {duration_minutes} min")
+    redis_write_queue.hset(ORDERS_HASH_KEY, order_id, orjson.dumps(order))
+    logger.info("Order updated: %s, energy: %s kWh, duration: %s min", order_id, energy_kwh, duration_minutes)
+
+
+async def settle_order(order_id: str, end_time: str) -> None:
+    """结算进行中的订单：按开始/结束时间和充电速率计算时长和电量，订单只读取一次"""
+    order = await get_order(order_id)
+    if not order or order.get("status") != "ongoing":
+        return
+    start_ts = int(_order_start_ts(order))
+    end_ts = int(_iso_epoch(end_time))
+    # 电量（kWh）= 充电速率（kW）× 时长（小时），按秒和瓦整数计算，输出时再转换为小数
+    rate_w = round(float(order.get("charging_rate", 7.0)) * 1000)
+    duration_x100, energy_x100 = compute_energy_x100(start_ts, end_ts, rate_w)
+    await update_order(
+        order_id=order_id,
+        end_time=end_time,
+        duration_minutes=duration_x100 / 100,
+        energy_kwh=energy_x100 / 100,
+        order=order,
+    )
 
 
-def get_order(order_id: str) -> Dict[str, Any] | None:
+async def get_order(order_id: str) -> Dict[str, Any] | None:
     """获取单个订单"""
-    order_data = redis_client.hget(ORDERS_HASH_KEY, order_id)
+    order_data = redis_write_queue.get(ORDERS_HASH_KEY, order_id) or await redis_client.hget(ORDERS_HASH_KEY, order_id)
     if not order_data:
         return None
-    return json.loads(order_data)
+    return decode_order(order_data)
+
+
+def _order_score(start_time: str | None) -> float:
+    """用户订单索引的分数：开始时间的Unix时间戳"""
+    try:
+        return _iso_epoch(start_time)
+    except Exception:
+        return 0.0
 
 
-def get_orders_by_user(user_id: str) -> List[Dict[str, Any]]:
-    """获取用户的所有订单"""
-    items = redis_client.hgetall(ORDERS_HASH_KEY)
+async def build_order_indexes() -> None:
+    """
+    为建立索引之前的历史订单补建用户/充电桩订单索引，并补写 start_ts，
+    之后结算不再解析 start_time（每一项只执行一次）
+    """
+    ready_user, ready_charger, ready_start_ts = await redis_client.mget(
+        USER_ORDERS_INDEX_READY_KEY, CHARGER_ORDERS_INDEX_READY_KEY, ORDERS_START_TS_READY_KEY
+    )
+    if ready_user and ready_charger and ready_start_ts:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    count = 0
+    async for order_id, val in redis_client.hscan_iter(ORDERS_HASH_KEY, count=1000):
+        try:
+            order = decode_order(val)
+        except Exception:
+            continue
+        score = order.get("start_ts") or _order_score(order.get("start_time"))
+        if not ready_user:
+            pipe.zadd(f"{USER_ORDERS_KEY_PREFIX}{order.get('user_id')}", {order_id: score})
+        if not ready_charger:
+            pipe.zadd(f"{CHARGER_ORDERS_KEY_PREFIX}{order.get('charger_id')}", {order_id: score})
+        if not ready_start_ts and order.get("start_ts") is None:
+            order["start_ts"] = int(score)
+            pipe.hset(ORDERS_HASH_KEY, order_id, orjson.dumps(order))
+        count += 1
+    pipe.set(USER_ORDERS_INDEX_READY_KEY, 1)
+    pipe.set(CHARGER_ORDERS_INDEX_READY_KEY, 1)
+    pipe.set(ORDERS_START_TS_READY_KEY, 1)
+    await pipe.execute()
+    logger.info("订单索引已建立: %s 个订单", count)
+
+
+async def get_orders_by_user(user_id: str) -> List[Dict[str, Any]]:
+    """获取用户的所有订单（按开始时间倒序，最新的在前）"""
+    order_ids = await redis_client.zrevrange(f"{USER_ORDERS_KEY_PREFIX}{user_id}", 0, -1)
+    return await _load_orders(order_ids)
+
+
+async def get_recent_orders_by_charger(charger_id: str, limit: int) -> List[Dict[str, Any]]:
+    """获取充电桩最近的若干个订单（按开始时间倒序）"""
+    order_ids = await redis_client.zrevrange(f"{CHARGER_ORDERS_KEY_PREFIX}{charger_id}", 0, limit - 1)
+    return await _load_orders(order_ids)
+
+
+async def _load_orders(order_ids: List[str]) -> List[Dict[str, Any]]:
+    """按ID批量读取订单（HMGET），保持传入顺序"""
+    if not order_ids:
+        return []
+    values = await redis_client.hmget(ORDERS_HASH_KEY, order_ids)
     orders = []
-    for _, val in items.items():
+    for order_id, val in zip(order_ids, values):
+        # 刚创建的订单可能还在写入队列中
+        val = redis_write_queue.get(ORDERS_HASH_KEY, order_id) or val
+        if not val:
+            continue
         try:
-            order = json.loads(val)
-            if order.get("user_id") == user_id:
-                orders.append(order)
+            orders.append(decode_order(val))
         except Exception:
             continue
-    # 按开始时间倒序排列（最新的在前）
-    orders.sort(key=lambda x: x.get("start_time", ""), reverse=True)
     return orders
 
 
-def get_all_orders() -> List[Dict[str, Any]]:
+async def get_all_orders() -> List[Dict[str, Any]]:
     """获取所有订单"""
-    items = redis_client.hgetall(ORDERS_HASH_KEY)
+    items = await redis_client.hgetall(ORDERS_HASH_KEY)
+    items.update(redis_write_queue.pending_fields(ORDERS_HASH_KEY))
     orders = []
     for _, val in items.items():
         try:
-            orders.append(json.loads(val))
+            orders.append(decode_order(val))
         except Exception:
             continue
     # 按开始时间倒序排列（最新的在前）
@@ -624,17 +1292,25 @@ def get_all_orders() -> List[Dict[str, Any]]:
 
 
 # ---- In-memory active chargers (for quick inspection) ----
+# 只在内存中更新，变化的记录由后台任务每隔 ACTIVE_FLUSH_INTERVAL 秒写入 Redis Hash
+ACTIVE_CHARGERS_HASH_KEY = "active_chargers"
+ACTIVE_FLUSH_INTERVAL = 1.0
 active_chargers: Dict[str, Dict[str, Any]] = {}
+_dirty_active: set[str] = set()
+_active_flush_task: asyncio.Task | None = None
+# update_active 未传 txn_id 时保持原值（None 表示清除交易）
+_UNSET: Any = object()
 
 
-def update_active(
+async def update_active(
     charger_id: str,
     *,
     vendor: str | None = None,
     model: str | None = None,
     status: str | None = None,
-    txn_id: int | None | str | None = None,
+    txn_id: int | str | None = _UNSET,
 ) -> None:
+    ts = now_iso()
     rec = active_chargers.get(charger_id)
     if rec is None:
         rec = {
@@ -642,7 +1318,7 @@ def update_active(
             "vendor": None,
             "model": None,
             "status": "Unknown",
-            "last_seen": now_iso(),
+            "last_seen": ts,
             "txn_id": None,
         }
         active_chargers[charger_id] = rec
@@ -652,24 +1328,47 @@ def update_active(
         rec["model"] = model
     if status is not None:
         rec["status"] = status
-        # 修复：如果状态变为 Available，自动清理 transaction_id（防止数据不一致）
-        if status == "Available" and (txn_id is None or txn_id == ""):
-            # 从 Redis 加载充电桩数据并清理 transaction_id
-            charger = next((c for c in load_chargers() if c["id"] == charger_id), None)
-            if charger:
-                session = charger.setdefault("session", {
-                    "authorized": False,
-                    "transaction_id": None,
-                    "meter": 0,
-                })
-                if session.get("transaction_id") is not None:
-                    session["transaction_id"] = None
-                    session["order_id"] = None
-                    save_charger(charger)
-                    logger.info(f"[{charger_id}] Auto-cleared stale transaction_id when status became Available")
-    if txn_id is not None or txn_id is None:
+    if txn_id is not _UNSET:
         rec["txn_id"] = txn_id
-    rec["last_seen"] = now_iso()
+    rec["last_seen"] = ts
+    _dirty_active.add(charger_id)
+
+
+def flush_active_chargers() -> None:
+    """把变化的活跃充电桩记录交给写入队列（一次 HSET mapping）"""
+    if not _dirty_active:
+        return
+    mapping = {cid: orjson.dumps(active_chargers[cid]).decode() for cid in _dirty_active if cid in active_chargers}
+    _dirty_active.clear()
+    if mapping:
+        redis_write_queue.hset(ACTIVE_CHARGERS_HASH_KEY, mapping=mapping)
+
+
+async def _active_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(ACTIVE_FLUSH_INTERVAL)
+        flush_active_chargers()
+
+
+def start_active_flush() -> None:
+    """启动活跃充电桩记录的定期写入任务（需在事件循环中调用）"""
+    global _active_flush_task
+    if _active_flush_task is None:
+        _active_flush_task = asyncio.create_task(_active_flush_loop())
+
+
+async def stop_active_flush() -> None:
+    """停止定期写入任务并提交剩余记录"""
+    global _active_flush_task
+    if _active_flush_task is None:
+        return
+    _active_flush_task.cancel()
+    try:
+        await _active_flush_task
+    except asyncio.CancelledError:
+        pass
+    _active_flush_task = None
+    flush_active_chargers()
 
 
 class HealthResponse(BaseModel):
@@ -874,12 +1573,12 @@ def get_supported_ocpp_features() -> Dict[str, Any]:
 
 
 @app.get("/chargers", tags=["REST"])
-def chargers_list() -> List[Dict[str, Any]]:
+async def chargers_list() -> List[Dict[str, Any]]:
     """
     List all chargers from Redis.
     Returns: [{"id": str, "status": str, "last_seen": str, "session": {...}}, ...]
     """
-    return load_chargers()
+    return await load_chargers()
 
 
 @app.post("/api/updateLocation", response_model=RemoteResponse, tags=["REST"])
@@ -887,19 +1586,20 @@ async def update_location(req: UpdateLocationRequest) -> RemoteResponse:
     """
     Update charger location (latitude, longitude, address).
     """
-    charger = next((c for c in load_chargers() if c["id"] == req.chargePointId), None)
+    charger = await get_charger(req.chargePointId)
     if not charger:
         charger = get_default_charger(req.chargePointId)
-        save_charger(charger)
+        await save_charger(charger)
     
     charger["location"] = {
         "latitude": req.latitude,
         "longitude": req.longitude,
         "address": req.address,
     }
-    save_charger(charger)
+    _admin_changed_chargers.add(req.chargePointId)
+    await save_charger(charger)
     
-    logger.info(f"[{req.chargePointId}] Location updated: lat={req.latitude}, lng={req.longitude}")
+    logger.info("[%s] Location updated: lat=%s, lng=%s", req.chargePointId, req.latitude, req.longitude)
     
     return RemoteResponse(
         success=True,
@@ -913,15 +1613,16 @@ async def update_price(req: UpdatePriceRequest) -> RemoteResponse:
     """
     Update charger price per kWh.
     """
-    charger = next((c for c in load_chargers() if c["id"] == req.chargePointId), None)
+    charger = await get_charger(req.chargePointId)
     if not charger:
         charger = get_default_charger(req.chargePointId)
-        save_charger(charger)
+        await save_charger(charger)
     
     charger["price_per_kwh"] = req.pricePerKwh
-    save_charger(charger)
+    _admin_changed_chargers.add(req.chargePointId)
+    await save_charger(charger)
     
-    logger.info(f"[{req.chargePointId}] Price updated: {req.pricePerKwh} COP/kWh")
+    logger.info("[%s] Price updated: %s COP/kWh", req.chargePointId, req.pricePerKwh)
     
     return RemoteResponse(
         success=True,
@@ -942,25 +1643,21 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
     ws = charger_websockets.get(req.chargePointId)
     if not ws:
         # Fallback：如果充电桩未连接 WebSocket，则直接在 Redis 中模拟充电状态
-        charger = next((c for c in load_chargers() if c["id"] == req.chargePointId), None)
+        charger = await get_charger(req.chargePointId)
         if charger is None:
             charger = get_default_charger(req.chargePointId)
-        session = charger.setdefault("session", {
-            "authorized": False,
-            "transaction_id": None,
-            "meter": 0,
-        })
-        tx_id = int(datetime.now().timestamp())
+        session = charger["session"]
+        tx_id = _time_id(1_000_000_000)
         charger["status"] = "Charging"
         session["authorized"] = True
         session["transaction_id"] = tx_id
-        charger["last_seen"] = now_iso()
+        start_time = now_iso()
+        charger["last_seen"] = start_time
         
         # 创建充电订单
         charging_rate = charger.get("charging_rate", 7.0)
         order_id = f"order_{tx_id}"
-        start_time = now_iso()
-        create_order(
+        await create_order(
             order_id=order_id,
             charger_id=req.chargePointId,
             user_id=req.idTag,  # 使用idTag作为user_id
@@ -971,10 +1668,10 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
         # 将订单ID保存到session中，以便停止时使用
         session["order_id"] = order_id
         
-        save_charger(charger)
-        update_active(req.chargePointId, status="Charging", txn_id=tx_id)
+        await save_charger(charger)
+        await update_active(req.chargePointId, status="Charging", txn_id=tx_id)
         logger.info(
-            f"[{req.chargePointId}] RemoteStart fallback: WebSocket missing, simulated transaction {tx_id}, order {order_id}"
+            "[%s] RemoteStart fallback: WebSocket missing, simulated transaction %s, order %s", req.chargePointId, tx_id, order_id
         )
         return RemoteResponse(
             success=True,
@@ -983,30 +1680,30 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
         )
     try:
         # Step 1: Send Authorize to verify the idTag
-        auth_call = json.dumps({
+        auth_call = orjson.dumps({
             "action": "Authorize",
             "payload": {"idTag": req.idTag},
-        })
+        }).decode()
         await ws.send_text(auth_call)
-        logger.info(f"[{req.chargePointId}] Sent Authorize for idTag={req.idTag}")
+        logger.info("[%s] Sent Authorize for idTag=%s", req.chargePointId, req.idTag)
         
         # Step 2: Generate transaction ID and send StartTransaction
-        tx_id = int(datetime.now().timestamp())
-        start_call = json.dumps({
+        tx_id = _time_id(1_000_000_000)
+        start_call = orjson.dumps({
             "action": "StartTransaction",
             "payload": {"transactionId": tx_id},
-        })
+        }).decode()
         await ws.send_text(start_call)
-        logger.info(f"[{req.chargePointId}] Sent StartTransaction with txId={tx_id}")
+        logger.info("[%s] Sent StartTransaction with txId=%s", req.chargePointId, tx_id)
         
         # 创建充电订单
-        charger = next((c for c in load_chargers() if c["id"] == req.chargePointId), None)
+        charger = await get_charger(req.chargePointId)
         if charger is None:
             charger = get_default_charger(req.chargePointId)
         charging_rate = charger.get("charging_rate", 7.0)
         order_id = f"order_{tx_id}"
         start_time = now_iso()
-        create_order(
+        await create_order(
             order_id=order_id,
             charger_id=req.chargePointId,
             user_id=req.idTag,  # 使用idTag作为user_id
@@ -1015,13 +1712,9 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
             start_time=start_time,
         )
         # 将订单ID保存到charger的session中
-        session = charger.setdefault("session", {
-            "authorized": False,
-            "transaction_id": None,
-            "meter": 0,
-        })
+        session = charger["session"]
         session["order_id"] = order_id
-        save_charger(charger)
+        await save_charger(charger)
         
         return RemoteResponse(
             success=True,
@@ -1029,7 +1722,7 @@ async def remote_start(req: RemoteStartRequest) -> RemoteResponse:
             details={"transactionId": tx_id, "idTag": req.idTag, "orderId": order_id},
         )
     except Exception as e:
-        logger.error(f"[{req.chargePointId}] Error starting transaction: {e}", exc_info=True)
+        logger.error("[%s] Error starting transaction: %s", req.chargePointId, e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1043,52 +1736,29 @@ async def remote_stop(req: RemoteStopRequest) -> RemoteResponse:
     with unique message IDs. This simplified version directly sends JSON.
     """
     ws = charger_websockets.get(req.chargePointId)
-    charger = next((c for c in load_chargers() if c["id"] == req.chargePointId), None)
+    charger = await get_charger(req.chargePointId)
     if charger is None:
         charger = get_default_charger(req.chargePointId)
     if not ws:
-        session = charger.setdefault("session", {
-            "authorized": False,
-            "transaction_id": None,
-            "meter": 0,
-        })
+        session = charger["session"]
         txn_id = session.get("transaction_id")
         order_id = session.get("order_id")
+        end_time_str = now_iso()
         
         # 更新订单：计算电量和时长
         if order_id:
-            order = get_order(order_id)
-            if order and order.get("status") == "ongoing":
-                start_time_str = order.get("start_time")
-                end_time_str = now_iso()
-                
-                # 计算时长（分钟）
-                start_time = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-                end_time = datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
-                duration_seconds = (end_time - start_time).total_seconds()
-                duration_minutes = duration_seconds / 60.0
-                
-                # 计算电量（kWh）= 充电速率（kW）× 时长（小时）
-                charging_rate = order.get("charging_rate", 7.0)
-                energy_kwh = charging_rate * (duration_minutes / 60.0)
-                
-                update_order(
-                    order_id=order_id,
-                    end_time=end_time_str,
-                    duration_minutes=round(duration_minutes, 2),
-                    energy_kwh=round(energy_kwh, 2),
-                )
+            await settle_order(order_id, end_time_str)
         
         session["transaction_id"] = None
         session["authorized"] = False
         session["order_id"] = None
         charger["status"] = "Available"
-        charger["last_seen"] = now_iso()
+        charger["last_seen"] = end_time_str
         session["meter"] = session.get("meter", 0)
-        save_charger(charger)
-        update_active(req.chargePointId, status="Available", txn_id=None)
+        await save_charger(charger)
+        await update_active(req.chargePointId, status="Available", txn_id=None)
         logger.info(
-            f"[{req.chargePointId}] RemoteStop fallback: WebSocket missing, simulated stop for tx={txn_id}, order={order_id}"
+            "[%s] RemoteStop fallback: WebSocket missing, simulated stop for tx=%s, order=%s", req.chargePointId, txn_id, order_id
         )
         return RemoteResponse(
             success=True,
@@ -1099,7 +1769,7 @@ async def remote_stop(req: RemoteStopRequest) -> RemoteResponse:
     txn_id = None
     order_id = None
     if charger:
-        session = charger.get("session", {})
+        session = charger["session"]
         txn_id = session.get("transaction_id")
         order_id = session.get("order_id")
     if not txn_id:
@@ -1110,10 +1780,10 @@ async def remote_stop(req: RemoteStopRequest) -> RemoteResponse:
         )
     try:
         # Send RemoteStopTransaction (simplified format)
-        call = json.dumps({
+        call = orjson.dumps({
             "action": "RemoteStopTransaction",
             "transactionId": txn_id,
-        })
+        }).decode()
         await ws.send_text(call)
         
         # 注意：在实际的OCPP实现中，应该等待StopTransaction响应后再更新订单
@@ -1129,298 +1799,174 @@ async def remote_stop(req: RemoteStopRequest) -> RemoteResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/getConfiguration", response_model=RemoteResponse, tags=["REST"])
-async def get_configuration(req: GetConfigurationRequest) -> RemoteResponse:
+def _present_fields(*items: tuple[str, Any]) -> Dict[str, Any]:
+    """只保留值不为 None 的可选字段"""
+    return {key: value for key, value in items if value is not None}
+
+
+async def _ocpp_endpoint(charger_id: str, action: str, payload: Dict[str, Any]) -> ORJSONResponse:
     """
-    获取充电桩配置参数。
+    向充电桩发送 OCPP 调用并透传结果（字段同 RemoteResponse）
+    
+    跳过响应模型校验和 jsonable_encoder，直接由 orjson 序列化
     """
     try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "GetConfiguration",
-            {"key": req.keys} if req.keys else {}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="GetConfiguration sent" if result.get("success") else "Failed",
-            details=result
-        )
+        result = await send_ocpp_call(charger_id, action, payload)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in GetConfiguration: {e}", exc_info=True)
+        logger.error("Error in %s: %s", action, e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    success = result.get("success", False)
+    return ORJSONResponse({
+        "success": success,
+        "message": f"{action} sent" if success else "Failed",
+        "details": result,
+    })
 
 
-@app.post("/api/changeConfiguration", response_model=RemoteResponse, tags=["REST"])
-async def change_configuration(req: ChangeConfigurationRequest) -> RemoteResponse:
+@app.post("/api/getConfiguration", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def get_configuration(req: GetConfigurationRequest) -> ORJSONResponse:
+    """
+    获取充电桩配置参数。
+    """
+    return await _ocpp_endpoint(req.chargePointId, "GetConfiguration", {"key": req.keys} if req.keys else {})
+
+
+@app.post("/api/changeConfiguration", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def change_configuration(req: ChangeConfigurationRequest) -> ORJSONResponse:
     """
     更改充电桩配置参数。
     """
-    try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "ChangeConfiguration",
-            {"key": req.key, "value": req.value}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="ChangeConfiguration sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in ChangeConfiguration: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _ocpp_endpoint(req.chargePointId, "ChangeConfiguration", {"key": req.key, "value": req.value})
 
 
-@app.post("/api/reset", response_model=RemoteResponse, tags=["REST"])
-async def reset_charger(req: ResetRequest) -> RemoteResponse:
+@app.post("/api/reset", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def reset_charger(req: ResetRequest) -> ORJSONResponse:
     """
     重置充电桩（软重启或硬重启）。
     """
-    try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "Reset",
-            {"type": req.type}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="Reset sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in Reset: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _ocpp_endpoint(req.chargePointId, "Reset", {"type": req.type})
 
 
-@app.post("/api/unlockConnector", response_model=RemoteResponse, tags=["REST"])
-async def unlock_connector(req: UnlockConnectorRequest) -> RemoteResponse:
+@app.post("/api/unlockConnector", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def unlock_connector(req: UnlockConnectorRequest) -> ORJSONResponse:
     """
     解锁连接器。
     """
-    try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "UnlockConnector",
-            {"connectorId": req.connectorId}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="UnlockConnector sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in UnlockConnector: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _ocpp_endpoint(req.chargePointId, "UnlockConnector", {"connectorId": req.connectorId})
 
 
-@app.post("/api/changeAvailability", response_model=RemoteResponse, tags=["REST"])
-async def change_availability(req: ChangeAvailabilityRequest) -> RemoteResponse:
+@app.post("/api/changeAvailability", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def change_availability(req: ChangeAvailabilityRequest) -> ORJSONResponse:
     """
     更改充电桩或连接器的可用性。
     """
-    try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "ChangeAvailability",
-            {"connectorId": req.connectorId, "type": req.type}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="ChangeAvailability sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in ChangeAvailability: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _ocpp_endpoint(req.chargePointId, "ChangeAvailability", {"connectorId": req.connectorId, "type": req.type})
 
 
-@app.post("/api/setChargingProfile", response_model=RemoteResponse, tags=["REST"])
-async def set_charging_profile(req: SetChargingProfileRequest) -> RemoteResponse:
+@app.post("/api/setChargingProfile", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def set_charging_profile(req: SetChargingProfileRequest) -> ORJSONResponse:
     """
     设置充电配置文件。
     """
-    try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "SetChargingProfile",
-            {
-                "connectorId": req.connectorId,
-                "csChargingProfiles": req.csChargingProfiles
-            }
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="SetChargingProfile sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in SetChargingProfile: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _ocpp_endpoint(req.chargePointId, "SetChargingProfile", {
+        "connectorId": req.connectorId,
+        "csChargingProfiles": req.csChargingProfiles
+    })
 
 
-@app.post("/api/clearChargingProfile", response_model=RemoteResponse, tags=["REST"])
-async def clear_charging_profile(req: ClearChargingProfileRequest) -> RemoteResponse:
+@app.post("/api/clearChargingProfile", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def clear_charging_profile(req: ClearChargingProfileRequest) -> ORJSONResponse:
     """
     清除充电配置文件。
     """
-    try:
-        payload = {}
-        if req.id is not None:
-            payload["id"] = req.id
-        if req.connectorId is not None:
-            payload["connectorId"] = req.connectorId
-        if req.chargingProfilePurpose is not None:
-            payload["chargingProfilePurpose"] = req.chargingProfilePurpose
-        if req.stackLevel is not None:
-            payload["stackLevel"] = req.stackLevel
-        
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "ClearChargingProfile",
-            payload
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="ClearChargingProfile sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in ClearChargingProfile: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    payload = _present_fields(
+        ("id", req.id),
+        ("connectorId", req.connectorId),
+        ("chargingProfilePurpose", req.chargingProfilePurpose),
+        ("stackLevel", req.stackLevel),
+    )
+    return await _ocpp_endpoint(req.chargePointId, "ClearChargingProfile", payload)
 
 
-@app.post("/api/getDiagnostics", response_model=RemoteResponse, tags=["REST"])
-async def get_diagnostics(req: GetDiagnosticsRequest) -> RemoteResponse:
+@app.post("/api/getDiagnostics", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def get_diagnostics(req: GetDiagnosticsRequest) -> ORJSONResponse:
     """
     获取诊断信息。
     """
-    try:
-        payload = {"location": req.location}
-        if req.retries is not None:
-            payload["retries"] = req.retries
-        if req.retryInterval is not None:
-            payload["retryInterval"] = req.retryInterval
-        if req.startTime is not None:
-            payload["startTime"] = req.startTime
-        if req.stopTime is not None:
-            payload["stopTime"] = req.stopTime
-        
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "GetDiagnostics",
-            payload
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="GetDiagnostics sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in GetDiagnostics: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    payload = {
+        "location": req.location,
+        **_present_fields(
+            ("retries", req.retries),
+            ("retryInterval", req.retryInterval),
+            ("startTime", req.startTime),
+            ("stopTime", req.stopTime),
+        ),
+    }
+    return await _ocpp_endpoint(req.chargePointId, "GetDiagnostics", payload)
 
 
-@app.post("/api/updateFirmware", response_model=RemoteResponse, tags=["REST"])
-async def update_firmware(req: UpdateFirmwareRequest) -> RemoteResponse:
+@app.post("/api/updateFirmware", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def update_firmware(req: UpdateFirmwareRequest) -> ORJSONResponse:
     """
     更新固件。
     """
-    try:
-        payload = {
-            "location": req.location,
-            "retrieveDate": req.retrieveDate
-        }
-        if req.retryInterval is not None:
-            payload["retryInterval"] = req.retryInterval
-        if req.retries is not None:
-            payload["retries"] = req.retries
-        
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "UpdateFirmware",
-            payload
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="UpdateFirmware sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in UpdateFirmware: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    payload = {
+        "location": req.location,
+        "retrieveDate": req.retrieveDate,
+        **_present_fields(("retryInterval", req.retryInterval), ("retries", req.retries)),
+    }
+    return await _ocpp_endpoint(req.chargePointId, "UpdateFirmware", payload)
 
 
-@app.post("/api/reserveNow", response_model=RemoteResponse, tags=["REST"])
-async def reserve_now(req: ReserveNowRequest) -> RemoteResponse:
+@app.post("/api/reserveNow", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def reserve_now(req: ReserveNowRequest) -> ORJSONResponse:
     """
     预约充电。
     """
-    try:
-        payload = {
-            "connectorId": req.connectorId,
-            "expiryDate": req.expiryDate,
-            "idTag": req.idTag,
-            "reservationId": req.reservationId
-        }
-        if req.parentIdTag is not None:
-            payload["parentIdTag"] = req.parentIdTag
-        
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "ReserveNow",
-            payload
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="ReserveNow sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in ReserveNow: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    payload = {
+        "connectorId": req.connectorId,
+        "expiryDate": req.expiryDate,
+        "idTag": req.idTag,
+        "reservationId": req.reservationId,
+        **_present_fields(("parentIdTag", req.parentIdTag)),
+    }
+    return await _ocpp_endpoint(req.chargePointId, "ReserveNow", payload)
 
 
-@app.post("/api/cancelReservation", response_model=RemoteResponse, tags=["REST"])
-async def cancel_reservation(req: CancelReservationRequest) -> RemoteResponse:
+@app.post("/api/cancelReservation", response_model=None, responses={200: {"model": RemoteResponse}}, tags=["REST"])
+async def cancel_reservation(req: CancelReservationRequest) -> ORJSONResponse:
     """
     取消预约。
     """
+    return await _ocpp_endpoint(req.chargePointId, "CancelReservation", {"reservationId": req.reservationId})
+
+
+def _message_score(message_id: str) -> int:
+    """留言ID格式为 msg_{毫秒时间戳}，用作排序分数"""
     try:
-        result = await send_ocpp_call(
-            req.chargePointId,
-            "CancelReservation",
-            {"reservationId": req.reservationId}
-        )
-        return RemoteResponse(
-            success=result.get("success", False),
-            message="CancelReservation sent" if result.get("success") else "Failed",
-            details=result
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in CancelReservation: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        return int(message_id.rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+async def migrate_messages_once() -> None:
+    """启动时执行一次：把旧的留言列表迁移到按ID索引的 Hash + Sorted Set"""
+    items = await redis_client.lrange(MESSAGES_LIST_KEY, 0, -1)
+    if not items:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for val in items:
+        try:
+            message_id = orjson.loads(val)["id"]
+        except Exception:
+            continue
+        pipe.hset(MESSAGES_HASH_KEY, message_id, val)
+        pipe.zadd(MESSAGES_INDEX_KEY, {message_id: _message_score(message_id)})
+    pipe.delete(MESSAGES_LIST_KEY)
+    await pipe.execute()
+    logger.info("留言数据迁移完成: %s 条", len(items))
 
 
 @app.post("/api/messages", response_model=RemoteResponse, tags=["REST"])
@@ -1428,7 +1974,7 @@ async def create_message(req: CreateMessageRequest) -> RemoteResponse:
     """
     Create a new support message from user.
     """
-    message_id = f"msg_{int(datetime.now().timestamp() * 1000)}"
+    message_id = f"msg_{_time_id(1_000_000)}"
     message_data = {
         "id": message_id,
         "userId": req.userId,
@@ -1440,12 +1986,22 @@ async def create_message(req: CreateMessageRequest) -> RemoteResponse:
         "status": "pending",
     }
     
-    # Save to Redis list
-    redis_client.lpush(MESSAGES_LIST_KEY, json.dumps(message_data))
+    # 按ID保存并加入时间索引（一次往返）
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(MESSAGES_HASH_KEY, message_id, orjson.dumps(message_data))
+        pipe.zadd(MESSAGES_INDEX_KEY, {message_id: _message_score(message_id)})
+        pipe.zcard(MESSAGES_INDEX_KEY)
+        count = (await pipe.execute())[-1]
     # Keep only last 100 messages
-    redis_client.ltrim(MESSAGES_LIST_KEY, 0, 99)
+    if count > MESSAGES_MAX:
+        expired = await redis_client.zrange(MESSAGES_INDEX_KEY, 0, count - MESSAGES_MAX - 1)
+        if expired:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hdel(MESSAGES_HASH_KEY, *expired)
+                pipe.zrem(MESSAGES_INDEX_KEY, *expired)
+                await pipe.execute()
     
-    logger.info(f"New message from user {req.username} ({req.userId}): {req.message[:50]}")
+    logger.info("New message from user %s (%s): %s", req.username, req.userId, req.message[:50])
     
     return RemoteResponse(
         success=True,
@@ -1455,19 +2011,22 @@ async def create_message(req: CreateMessageRequest) -> RemoteResponse:
 
 
 @app.get("/api/messages", tags=["REST"])
-def list_messages() -> List[Dict[str, Any]]:
+async def list_messages() -> List[Dict[str, Any]]:
     """
     List all support messages (admin view).
     """
-    items = redis_client.lrange(MESSAGES_LIST_KEY, 0, -1)
+    # 与原列表接口一致，按创建时间从旧到新返回
+    message_ids = await redis_client.zrange(MESSAGES_INDEX_KEY, 0, -1)
+    if not message_ids:
+        return []
     messages = []
-    for val in items:
+    for val in await redis_client.hmget(MESSAGES_HASH_KEY, message_ids):
+        if not val:
+            continue
         try:
-            messages.append(json.loads(val))
+            messages.append(orjson.loads(val))
         except Exception:
             continue
-    # Reverse to show newest first
-    messages.reverse()
     return messages
 
 
@@ -1476,28 +2035,19 @@ async def reply_message(req: ReplyMessageRequest) -> RemoteResponse:
     """
     Reply to a support message.
     """
-    # Find message in Redis
-    items = redis_client.lrange(MESSAGES_LIST_KEY, 0, -1)
-    found = False
-    
-    for i, val in enumerate(items):
-        try:
-            msg = json.loads(val)
-            if msg["id"] == req.messageId:
-                msg["reply"] = req.reply
-                msg["replied_at"] = now_iso()
-                msg["status"] = "replied"
-                # Update in Redis
-                redis_client.lset(MESSAGES_LIST_KEY, i, json.dumps(msg))
-                found = True
-                logger.info(f"Replied to message {req.messageId}: {req.reply[:50]}")
-                break
-        except Exception:
-            continue
-    
-    if not found:
+    # 按ID直接读取留言
+    val = await redis_client.hget(MESSAGES_HASH_KEY, req.messageId)
+    if not val:
         raise HTTPException(status_code=404, detail="Message not found")
     
+    msg = orjson.loads(val)
+    msg["reply"] = req.reply
+    msg["replied_at"] = now_iso()
+    msg["status"] = "replied"
+    # Update in Redis
+    await redis_client.hset(MESSAGES_HASH_KEY, req.messageId, orjson.dumps(msg))
+    logger.info("Replied to message %s: %s", req.messageId, req.reply[:50])
+    
     return RemoteResponse(
         success=True,
         message="Reply sent successfully",
@@ -1506,20 +2056,24 @@ async def reply_message(req: ReplyMessageRequest) -> RemoteResponse:
 
 
 @app.get("/api/orders", tags=["REST"])
-def get_orders(userId: str | None = None) -> List[Dict[str, Any]]:
+async def get_orders(userId: str | None = None) -> List[Dict[str, Any]]:
     """
     Get charging orders.
     If userId is provided, returns only orders for that user.
     Otherwise, returns all orders.
     """
     if userId:
-        return get_orders_by_user(userId)
+        return await get_orders_by_user(userId)
     else:
-        return get_all_orders()
+        return await get_all_orders()
+
+
+# 查找充电桩当前订单时，最多检查最近的订单数
+CURRENT_ORDER_LOOKBACK = 20
 
 
 @app.get("/api/orders/current", tags=["REST"])
-def get_current_order(chargePointId: str = Query(...), transactionId: int | None = Query(None)) -> Dict[str, Any]:
+async def get_current_order(chargePointId: str = Query(...), transactionId: int | None = Query(None)) -> Dict[str, Any]:
     """
     Get current ongoing order for a charger.
     If transactionId is provided, find order by transaction ID.
@@ -1528,27 +2082,24 @@ def get_current_order(chargePointId: str = Query(...), transactionId: int | None
     if transactionId:
         # 尝试通过transaction_id找到订单（订单ID格式为 order_{transactionId}）
         order_id = f"order_{transactionId}"
-        order = get_order(order_id)
+        order = await get_order(order_id)
         if order:
             # 返回订单，即使状态不是ongoing（可能刚创建）
             return order
     
     # 如果没有提供transactionId或找不到，查找充电桩的订单
-    charger = next((c for c in load_chargers() if c["id"] == chargePointId), None)
+    charger = await get_charger(chargePointId)
     if charger:
-        session = charger.get("session", {})
+        session = charger["session"]
         order_id = session.get("order_id")
         if order_id:
-            order = get_order(order_id)
+            order = await get_order(order_id)
             if order:
                 return order
     
-    # 如果都找不到，尝试查找该充电桩的所有订单，返回最新的进行中订单
-    all_orders = get_all_orders()
-    charger_orders = [o for o in all_orders if o.get("charger_id") == chargePointId]
+    # 如果都找不到，从充电桩订单索引中取最近的订单，返回最新的进行中订单
+    charger_orders = await get_recent_orders_by_charger(chargePointId, CURRENT_ORDER_LOOKBACK)
     if charger_orders:
-        # 按开始时间排序，返回最新的
-        charger_orders.sort(key=lambda x: x.get("start_time", ""), reverse=True)
         # 优先返回ongoing状态的，否则返回最新的
         ongoing_order = next((o for o in charger_orders if o.get("status") == "ongoing"), None)
         if ongoing_order:
@@ -1559,7 +2110,7 @@ def get_current_order(chargePointId: str = Query(...), transactionId: int | None
 
 
 @app.get("/api/orders/current/meter", tags=["REST"])
-def get_current_order_meter(
+async def get_current_order_meter(
     chargePointId: str = Query(...), 
     transactionId: int | None = Query(None)
 ) -> Dict[str, Any]:
@@ -1567,41 +2118,36 @@ def get_current_order_meter(
     获取当前充电订单的实时电量数据
     返回最新的 MeterValues 数据，用于实时显示电量和费用
     """
-    charger = next((c for c in load_chargers() if c["id"] == chargePointId), None)
-    if not charger:
-        raise HTTPException(status_code=404, detail="Charger not found")
-    
-    session = charger.get("session", {})
-    current_transaction_id = session.get("transaction_id")
+    # 缓存有效期内直接使用内存中的字段，过期后经 get_charger 重新加载
+    meta = active_meta.get(chargePointId)
+    if meta is None or _charger_cache_expires.get(chargePointId, 0.0) <= time.monotonic():
+        charger = await get_charger(chargePointId)
+        if not charger:
+            raise HTTPException(status_code=404, detail="Charger not found")
+        meta = _update_active_meta(charger)
     
     # 如果没有提供transactionId，使用充电桩当前的事务ID
     if not transactionId:
-        transactionId = current_transaction_id
+        transactionId = meta["transaction_id"]
     
     if not transactionId:
         raise HTTPException(status_code=404, detail="No active transaction")
     
-    # 获取当前电量（Wh），从充电桩的session中获取
-    meter_value_wh = session.get("meter", 0)
-    
-    # 转换为 kWh
-    meter_value_kwh = meter_value_wh / 1000.0
+    # 获取当前电量（Wh，整数），从充电桩的session中获取
+    meter_value_wh = int(meta["meter"] or 0)
     
     # 获取订单信息
-    order_id = session.get("order_id") or f"order_{transactionId}"
-    order = get_order(order_id)
+    order_id = meta["order_id"] or f"order_{transactionId}"
+    order = await get_order(order_id)
     
-    # 计算费用
-    price_per_kwh = charger.get("price_per_kwh", 2700.0)  # COP/kWh
-    total_cost = meter_value_kwh * price_per_kwh
+    # 计算费用：Wh × (COP/kWh × 100) / 1000，以 0.01 COP 为单位的整数，四舍五入
+    total_cost_x100 = (meter_value_wh * meta["price_x100"] + 500) // 1000
     
     # 计算充电时长（如果有订单）
     duration_minutes = None
     if order and order.get("start_time"):
         try:
-            start_time = datetime.fromisoformat(order["start_time"].replace('Z', '+00:00'))
-            now = datetime.now(timezone.utc)
-            duration_minutes = (now - start_time).total_seconds() / 60.0
+            duration_minutes = (time.time() - _order_start_ts(order)) / 60.0
         except:
             pass
     
@@ -1609,9 +2155,10 @@ def get_current_order_meter(
         "charger_id": chargePointId,
         "transaction_id": transactionId,
         "meter_value_wh": meter_value_wh,
-        "meter_value_kwh": round(meter_value_kwh, 3),
-        "price_per_kwh": price_per_kwh,
-        "total_cost": round(total_cost, 2),
+        # 只在输出时转换为小数
+        "meter_value_kwh": meter_value_wh / 1000,
+        "price_per_kwh": meta["price_per_kwh"],
+        "total_cost": total_cost_x100 / 100,
         "duration_minutes": round(duration_minutes, 1) if duration_minutes else None,
         "timestamp": now_iso(),
         "order_id": order_id if order else None,
@@ -1627,271 +2174,108 @@ async def ocpp_http(charger_id: str, request: Request):
     - POST: 充电桩发送 OCPP 消息
     - GET: 充电桩轮询获取待处理的 CSMS 消息
     """
-    if not MQTT_AVAILABLE or not hasattr(transport_manager, 'adapters'):
-        raise HTTPException(status_code=503, detail="传输管理器未初始化")
-    
-    settings = get_settings()
-    if not settings.enable_http_transport:
-        raise HTTPException(status_code=503, detail="HTTP 传输未启用")
-    
-    # 获取 HTTP 适配器
-    http_adapter = transport_manager.get_adapter(TransportType.HTTP)
+    # 启动时绑定的 HTTP 适配器（仅在启用 HTTP 传输时存在）
+    http_adapter = request.app.state.http_ocpp_adapter
     if not http_adapter:
-        raise HTTPException(status_code=503, detail="HTTP 传输适配器不可用")
+        raise HTTPException(status_code=503, detail="HTTP 传输未启用")
     
     try:
         return await http_adapter.handle_http_request(charger_id, request)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[{charger_id}] HTTP OCPP 请求处理错误: {e}", exc_info=True)
+        logger.error("[%s] HTTP OCPP 请求处理错误: %s", charger_id, e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.websocket("/ocpp")
 async def ocpp_ws(ws: WebSocket, id: str = Query(..., description="Charger ID")):
     # Enforce subprotocol negotiation for OCPP 1.6J
-    requested_proto = (ws.headers.get("sec-websocket-protocol") or "").strip()
-    requested = [p.strip() for p in requested_proto.split(",") if p.strip()]
-    if "ocpp1.6" not in requested:
+    # ASGI 服务器已把 Sec-WebSocket-Protocol 解析为 scope["subprotocols"] 列表
+    if "ocpp1.6" not in ws.scope.get("subprotocols", ()):
         # Refuse if client does not offer ocpp1.6
         await ws.close(code=1002)
         return
     await ws.accept(subprotocol="ocpp1.6")
+    # 响应经发送队列发出，接收循环不等待发送完成
+    outbox = ResponseBatcher(ws)
+    outbox.start()
     # Register WebSocket connection
-    charger_websockets[id] = ws
-    logger.info(f"[{id}] WebSocket connected, subprotocol=ocpp1.6")
+    await charger_websockets.register(id, ws)
+    logger.info("[%s] WebSocket connected, subprotocol=ocpp1.6", id)
     
     charger = None
     try:
         # Initialize charger record
-        charger = next((c for c in load_chargers() if c["id"] == id), None)
+        charger = await get_charger(id)
         if charger is None:
             charger = get_default_charger(id)
             try:
-                save_charger(charger)
-                logger.info(f"[{id}] New charger registered")
+                await save_charger(charger)
+                logger.info("[%s] New charger registered", id)
             except Exception as e:
-                logger.warning(f"[{id}] 无法保存充电桩到Redis（但继续连接）: {e}")
+                logger.warning("[%s] 无法保存充电桩到Redis（但继续连接）: %s", id, e)
         # initialize in-memory record
-        update_active(id)
+        await update_active(id)
 
-        await ws.send_text(json.dumps({"result": "Connected", "id": id}))
+        await outbox.send({"result": "Connected", "id": id})
 
         while True:
-            raw = await ws.receive_text()
+            # 文本帧和二进制帧都直接交给 orjson 解析，二进制帧不经过 str 解码
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            raw = message.get("bytes")
+            if raw is None:
+                raw = message.get("text", "")
             try:
-                msg = json.loads(raw)
-            except Exception:
-                await ws.send_text(json.dumps({"error": "Invalid JSON"}))
+                msg = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                await outbox.send({"error": "Invalid JSON"})
+                continue
+
+            # CSMS 调用的响应，交给 send_ocpp_call 中等待的调用
+            if resolve_pending_call(id, msg):
+                continue
+            if not isinstance(msg, dict):
+                await outbox.send({"error": "Invalid message"})
                 continue
 
             action = str(msg.get("action", "")).strip()
             payload = msg.get("payload", {})
             
-            logger.info(f"[{id}] <- OCPP {action} | payload={json.dumps(payload)}")
+            logger.info("[%s] <- OCPP %s | payload=%s", id, action, payload)
 
-            charger = next((c for c in load_chargers() if c["id"] == id), get_default_charger(id))
-            charger["last_seen"] = now_iso()
+            handler = _WS_HANDLERS.get(action)
+            if handler is None:
+                await outbox.send({"error": "UnknownAction", "action": action})
+                continue
 
-            # Simplified handlers for demo
-            if action == "BootNotification":
-                try:
-                    charger["status"] = "Available"
-                    vendor = str(payload.get("vendor", ""))
-                    model = str(payload.get("model", ""))
-                    firmware_version = str(payload.get("firmwareVersion", ""))
-                    serial_number = str(payload.get("serialNumber", ""))
-                    
-                    # 更新充电桩信息
-                    charger["vendor"] = vendor if vendor else charger.get("vendor")
-                    charger["model"] = model if model else charger.get("model")
-                    charger["firmware_version"] = firmware_version if firmware_version else charger.get("firmware_version")
-                    charger["serial_number"] = serial_number if serial_number else charger.get("serial_number")
-                    
-                    update_active(id, vendor=vendor or None, model=model or None, status="Available")
-                    save_charger(charger)  # 这里可能失败，但不影响响应
-                    
-                    logger.info(f"[{id}] BootNotification: vendor={vendor}, model={model}, firmware={firmware_version}, serial={serial_number}")
-                except Exception as e:
-                    logger.error(f"[{id}] BootNotification处理错误（但继续响应）: {e}", exc_info=True)
-                
-                # 无论Redis是否成功，都返回正常的OCPP响应
-                resp = {
-                    "action": action,
-                    "status": "Accepted",
-                    "currentTime": now_iso(),
-                    "interval": 30,
-                }
-                logger.info(f"[{id}] -> OCPP BootNotificationResponse | status=Accepted")
-                await ws.send_text(json.dumps(resp))
-
-            elif action == "Heartbeat":
-                update_active(id)
-                save_charger(charger)
-                resp = {"action": action, "currentTime": now_iso()}
-                logger.info(f"[{id}] -> OCPP HeartbeatResponse | currentTime={now_iso()}")
-                await ws.send_text(json.dumps(resp))
-
-            elif action == "StatusNotification":
-                new_status = str(payload.get("status", "Unknown"))
-                charger["status"] = new_status
-                # 修复：如果状态变为 Available，自动清理 transaction_id
-                if new_status == "Available":
-                    session = charger.setdefault("session", {
-                        "authorized": False,
-                        "transaction_id": None,
-                        "meter": 0,
-                    })
-                    if session.get("transaction_id") is not None:
-                        logger.info(f"[{id}] Auto-cleared transaction_id when status changed to Available")
-                        session["transaction_id"] = None
-                        session["order_id"] = None
-                update_active(id, status=new_status)
-                save_charger(charger)
-                logger.info(f"[{id}] -> OCPP StatusNotificationAccepted | status={new_status}")
-                await ws.send_text(json.dumps({"action": action}))
-
-            elif action == "Authorize":
-                id_tag = str(payload.get("idTag", ""))
-                charger["session"]["authorized"] = True if id_tag else False
-                save_charger(charger)
-                auth_status = "Accepted" if id_tag else "Invalid"
-                logger.info(f"[{id}] -> OCPP AuthorizeResponse | status={auth_status}")
-                await ws.send_text(
-                    json.dumps(
-                        {
-                            "action": action,
-                            "idTagInfo": {"status": auth_status},
-                        }
-                    )
-                )
-
-            elif action == "StartTransaction":
-                tx_id = payload.get("transactionId") or int(datetime.now().timestamp())
-                id_tag = str(payload.get("idTag", ""))
-                charger["session"]["transaction_id"] = tx_id
-                charger["status"] = "Charging"
-                
-                # 创建充电订单
-                charging_rate = charger.get("charging_rate", 7.0)
-                order_id = f"order_{tx_id}"
-                start_time = now_iso()
-                create_order(
-                    order_id=order_id,
-                    charger_id=id,
-                    user_id=id_tag,  # 使用idTag作为user_id
-                    id_tag=id_tag,
-                    charging_rate=charging_rate,
-                    start_time=start_time,
-                )
-                charger["session"]["order_id"] = order_id
-                
-                update_active(id, status="Charging", txn_id=tx_id)
-                save_charger(charger)
-                logger.info(f"[{id}] -> OCPP StartTransactionResponse | txId={tx_id}, orderId={order_id}")
-                await ws.send_text(
-                    json.dumps(
-                        {
-                            "action": action,
-                            "transactionId": tx_id,
-                            "idTagInfo": {"status": "Accepted"},
-                        }
-                    )
-                )
-
-            elif action == "MeterValues":
-                meter = int(payload.get("meter", charger["session"].get("meter", 0)))
-                charger["session"]["meter"] = meter
-                save_charger(charger)
-                logger.info(f"[{id}] -> OCPP MeterValuesAccepted | meter={meter}")
-                await ws.send_text(json.dumps({"action": action}))
-
-            elif action == "StopTransaction":
-                tx_id = charger["session"].get("transaction_id")
-                order_id = charger["session"].get("order_id")
-                
-                # 更新订单：计算电量和时长
-                if order_id:
-                    order = get_order(order_id)
-                    if order and order.get("status") == "ongoing":
-                        start_time_str = order.get("start_time")
-                        end_time_str = now_iso()
-                        
-                        # 计算时长（分钟）
-                        start_time = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-                        end_time = datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
-                        duration_seconds = (end_time - start_time).total_seconds()
-                        duration_minutes = duration_seconds / 60.0
-                        
-                        # 计算电量（kWh）= 充电速率（kW）× 时长（小时）
-                        charging_rate = order.get("charging_rate", 7.0)
-                        energy_kwh = charging_rate * (duration_minutes / 60.0)
-                        
-                        update_order(
-                            order_id=order_id,
-                            end_time=end_time_str,
-                            duration_minutes=round(duration_minutes, 2),
-                            energy_kwh=round(energy_kwh, 2),
-                        )
-                
-                charger["session"]["transaction_id"] = None
-                charger["session"]["order_id"] = None
-                charger["status"] = "Available"
-                update_active(id, status="Available", txn_id=None)
-                save_charger(charger)
-                logger.info(f"[{id}] -> OCPP StopTransactionResponse | txId={tx_id}, orderId={order_id}")
-                await ws.send_text(
-                    json.dumps(
-                        {
-                            "action": action,
-                            "stopped": True,
-                            "transactionId": tx_id,
-                            "idTagInfo": {"status": "Accepted"},
-                        }
-                    )
-                )
-
-            elif action == "FirmwareStatusNotification":
-                status = str(payload.get("status", "Unknown"))
-                logger.info(f"[{id}] FirmwareStatusNotification: {status}")
-                save_charger(charger)
-                await ws.send_text(json.dumps({"action": action}))
-
-            elif action == "DiagnosticsStatusNotification":
-                status = str(payload.get("status", "Unknown"))
-                logger.info(f"[{id}] DiagnosticsStatusNotification: {status}")
-                save_charger(charger)
-                await ws.send_text(json.dumps({"action": action}))
-
-            elif action == "DataTransfer":
-                vendor_id = str(payload.get("vendorId", ""))
-                message_id = str(payload.get("messageId", ""))
-                data = payload.get("data")
-                logger.info(f"[{id}] DataTransfer from {vendor_id}, messageId={message_id}")
-                save_charger(charger)
-                # 返回接受状态
-                await ws.send_text(json.dumps({
-                    "action": action,
-                    "status": "Accepted",
-                    "data": None
-                }))
+            # 整条消息使用同一个时间戳
+            ts = now_iso()
+            # 沿用循环外取到的充电桩对象；只有其他端点替换了缓存对象或缓存过期时才重新加载
+            if charger_cache.get(id) is not charger or _charger_cache_expires.get(id, 0.0) <= time.monotonic():
+                charger = await get_charger(id) or get_default_charger(id)
+            charger["last_seen"] = ts
 
-            else:
-                await ws.send_text(json.dumps({"error": "UnknownAction", "action": action}))
+            resp = await handler(id, charger, payload, ts)
+            logger.info("[%s] -> OCPP %sResponse | %s", id, action, resp)
+            await outbox.send(_ws_response(action, resp))
+            if resp.get("responseBatching"):
+                await outbox.enable_batching()
 
     except WebSocketDisconnect:
         # Mark last seen on disconnect
-        logger.info(f"[{id}] WebSocket disconnected")
+        logger.info("[%s] WebSocket disconnected", id)
         if charger:
             try:
                 charger["last_seen"] = now_iso()
-                save_charger(charger)
+                await save_charger(charger)
             except Exception:
                 pass  # Redis错误不影响断开连接
-        update_active(id)
+        await update_active(id)
     except Exception as e:
-        logger.error(f"[{id}] WebSocket处理错误: {e}", exc_info=True)
+        logger.error("[%s] WebSocket处理错误: %s", id, e, exc_info=True)
         # 尝试发送错误响应（如果连接还活着）
         try:
             # 检查是否是Redis错误，如果是，发送更友好的错误信息
@@ -1899,17 +2283,24 @@ async def ocpp_ws(ws: WebSocket, id: str = Query(..., description="Charger ID"))
             if "MISCONF" in error_detail or "Redis" in error_detail:
                 error_detail = "Redis配置错误，请联系管理员"
             
-            await ws.send_text(json.dumps({
+            await outbox.send({
                 "error": "InternalError", 
                 "detail": error_detail[:200]  # 限制错误信息长度
-            }))
+            })
         except Exception:
             # 连接可能已关闭，忽略
             pass
     finally:
+        await outbox.stop()
         # Unregister WebSocket connection
-        charger_websockets.pop(id, None)
-        logger.info(f"[{id}] WebSocket unregistered")
+        # 同一ID已重连时保留新连接及其等待中的调用
+        if await charger_websockets.unregister(id, ws):
+            active_meta.pop(id, None)
+            # 连接已断开，让仍在等待响应的调用立即失败
+            for future in pending_calls.pop(id, {}).values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Charger {id} disconnected"))
+        logger.info("[%s] WebSocket unregistered", id)
         try:
             await ws.close()
         except Exception:
@@ -1922,7 +2313,7 @@ try:
     app.include_router(api_router)
     logger.info("API v1 路由已注册")
 except ImportError as e:
-    logger.warning(f"API v1 路由注册失败（导入错误）: {e}，某些功能可能无法使用")
+    logger.warning("API v1 路由注册失败（导入错误）: %s，某些功能可能无法使用", e)
 except Exception as e:
-    logger.error(f"API v1 路由注册出错: {e}", exc_info=True)
+    logger.error("API v1 路由注册出错: %s", e, exc_info=True)
 
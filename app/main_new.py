@@ -16,7 +16,8 @@ from app.core.exceptions import (
     validation_exception_handler, general_exception_handler
 )
 from app.database import init_db, check_db_health
-from fastapi.responses import JSONResponse
+from app.database.batch_writer import start_batch_writers, stop_batch_writers
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi import HTTPException
 
@@ -54,10 +55,15 @@ async def lifespan(app: FastAPI):
     if not check_db_health():
         logger.warning("数据库连接健康检查失败")
     
+    # 计量值等历史记录批量写入
+    start_batch_writers()
+    
     # 如果启用分布式模式，启动消息订阅器
     if settings.enable_distributed:
+        from app.ocpp.distributed_connection_manager import distributed_connection_manager
         from app.ocpp.redis_message_subscriber import redis_message_subscriber
-        redis_message_subscriber.start()
+        await distributed_connection_manager.rebuild_connected_index()
+        await redis_message_subscriber.start()
         logger.info("分布式模式已启用，消息订阅器已启动")
     
     yield
@@ -65,7 +71,8 @@ async def lifespan(app: FastAPI):
     # 关闭时
     if settings.enable_distributed:
         from app.ocpp.redis_message_subscriber import redis_message_subscriber
-        redis_message_subscriber.stop()
+        await redis_message_subscriber.stop()
+    await stop_batch_writers()
     logger.info("应用关闭")
 
 
@@ -75,6 +82,8 @@ app = FastAPI(
     version=settings.app_version,
     description="OCPP 1.6J 充电站管理系统",
     lifespan=lifespan,
+    # 使用 orjson 序列化响应
+    default_response_class=ORJSONResponse,
     docs_url=settings.docs_url,
     redoc_url=settings.redoc_url
 )
@@ -116,14 +125,14 @@ def health():
 
 
 @app.get("/health/detailed", tags=["System"])
-def health_detailed():
-    """详细健康检查"""
+def health_detailed() -> ORJSONResponse:
+    """详细健康检查（直接返回 ORJSONResponse，跳过 jsonable_encoder）"""
     from app.ocpp.connection_manager import connection_manager
     
     db_healthy = check_db_health()
     ws_connections = connection_manager.count()
     
-    return {
+    return ORJSONResponse(content={
         "ok": db_healthy,
         "service": settings.app_name,
         "version": settings.app_version,
@@ -137,7 +146,7 @@ def health_detailed():
                 "status": "operational"
             }
         }
-    }
+    })
 
 
 if __name__ == "__main__":
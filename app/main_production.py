@@ -15,7 +15,7 @@ from fastapi import (
     HTTPException, Depends, Request
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy.orm import Session
 import redis
 
@@ -68,6 +68,8 @@ app = FastAPI(
     version=settings.app_version,
     description="OCPP 1.6J 充电站管理系统 - 生产版本",
     lifespan=lifespan,
+    # 使用 orjson 序列化响应
+    default_response_class=ORJSONResponse,
     docs_url=settings.docs_url,
     redoc_url=settings.redoc_url
 )
@@ -117,8 +119,8 @@ def health() -> Dict[str, Any]:
 
 
 @app.get("/health/detailed", tags=["System"])
-def health_detailed() -> Dict[str, Any]:
-    """详细健康检查"""
+def health_detailed() -> ORJSONResponse:
+    """详细健康检查（直接返回 ORJSONResponse，跳过 jsonable_encoder）"""
     db_healthy = check_db_health()
     
     try:
@@ -129,7 +131,7 @@ def health_detailed() -> Dict[str, Any]:
     
     ws_connections = len(charger_websockets)
     
-    return {
+    return ORJSONResponse(content={
         "ok": db_healthy and redis_healthy,
         "service": settings.app_name,
         "version": settings.app_version,
@@ -148,7 +150,7 @@ def health_detailed() -> Dict[str, Any]:
                 "status": "operational"
             }
         }
-    }
+    })
 
 
 # ---- 导入现有功能 ----
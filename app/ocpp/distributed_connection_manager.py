@@ -1,6 +1,6 @@
 #
 # 分布式连接管理器
-# 支持多服务器部署，使用Redis共享连接状态
+# 支持多服务器部署，使用Redis共享连接状态（redis.asyncio，不阻塞事件循环）
 #
 
 import json
@@ -9,7 +9,7 @@ import uuid
 from typing import Dict, Optional
 from datetime import datetime, timezone, timedelta
 from fastapi import WebSocket
-import redis
+import redis.asyncio as aioredis
 from app.core.config import get_settings
 from app.core.logging_config import get_logger
 
@@ -29,13 +29,16 @@ class DistributedConnectionManager:
     
     def __init__(self):
         self.server_id = self._generate_server_id()
-        self.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+        self.redis_client = aioredis.from_url(settings.redis_url, decode_responses=True)
         self._local_connections: Dict[str, WebSocket] = {}  # 本地连接缓存
+        self._connected_at: Dict[str, str] = {}  # 本地连接的建立时间，续期时无需先读取Redis
         
         # Redis键前缀
         self.CONNECTION_KEY_PREFIX = "ocpp:connection:"
         self.SERVER_KEY_PREFIX = "ocpp:server:"
         self.MESSAGE_QUEUE_PREFIX = "ocpp:message:"
+        # 所有已连接充电桩ID的集合，连接/断开时维护，避免 KEYS 扫描
+        self.CONNECTED_CHARGERS_KEY = "ocpp:connected_chargers"
         
         logger.info(f"分布式连接管理器初始化，服务器ID: {self.server_id}")
     
@@ -44,47 +47,43 @@ class DistributedConnectionManager:
         hostname = socket.gethostname()
         return f"{hostname}-{uuid.uuid4().hex[:8]}"
     
-    def connect(self, charger_id: str, websocket: WebSocket):
+    async def connect(self, charger_id: str, websocket: WebSocket):
         """注册连接（本地和Redis）"""
         # 存储本地连接
         self._local_connections[charger_id] = websocket
         
-        # 在Redis中注册连接信息
-        connection_info = {
-            "charger_id": charger_id,
-            "server_id": self.server_id,
-            "connected_at": datetime.now(timezone.utc).isoformat(),
-            "last_seen": datetime.now(timezone.utc).isoformat(),
-        }
+        now = datetime.now(timezone.utc).isoformat()
+        self._connected_at[charger_id] = now
         
+        # 所有写入放在一个管道中，一次往返
+        pipe = self.redis_client.pipeline(transaction=False)
         # 设置连接信息（TTL: 1小时，通过心跳续期）
-        connection_key = f"{self.CONNECTION_KEY_PREFIX}{charger_id}"
-        self.redis_client.setex(
-            connection_key,
+        pipe.setex(
+            f"{self.CONNECTION_KEY_PREFIX}{charger_id}",
             3600,  # 1小时TTL
-            json.dumps(connection_info)
+            self._connection_info(charger_id, now)
         )
-        
         # 记录服务器处理的充电桩
         server_key = f"{self.SERVER_KEY_PREFIX}{self.server_id}"
-        self.redis_client.sadd(server_key, charger_id)
-        self.redis_client.expire(server_key, 3600)  # 服务器键也设置TTL
+        pipe.sadd(server_key, charger_id)
+        pipe.expire(server_key, 3600)  # 服务器键也设置TTL
+        pipe.sadd(self.CONNECTED_CHARGERS_KEY, charger_id)
+        await pipe.execute()
         
         logger.info(f"[{charger_id}] WebSocket连接已注册到服务器 {self.server_id}")
     
-    def disconnect(self, charger_id: str):
+    async def disconnect(self, charger_id: str):
         """断开连接（清理本地和Redis）"""
         # 清理本地连接
-        if charger_id in self._local_connections:
-            del self._local_connections[charger_id]
+        self._local_connections.pop(charger_id, None)
+        self._connected_at.pop(charger_id, None)
         
-        # 清理Redis中的连接信息
-        connection_key = f"{self.CONNECTION_KEY_PREFIX}{charger_id}"
-        self.redis_client.delete(connection_key)
-        
-        # 从服务器列表中移除
-        server_key = f"{self.SERVER_KEY_PREFIX}{self.server_id}"
-        self.redis_client.srem(server_key, charger_id)
+        # 清理Redis中的连接信息，并从服务器列表中移除（一次往返）
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(f"{self.CONNECTION_KEY_PREFIX}{charger_id}")
+        pipe.srem(f"{self.SERVER_KEY_PREFIX}{self.server_id}", charger_id)
+        pipe.srem(self.CONNECTED_CHARGERS_KEY, charger_id)
+        await pipe.execute()
         
         logger.info(f"[{charger_id}] WebSocket连接已断开")
     
@@ -96,42 +95,87 @@ class DistributedConnectionManager:
         """检查是否在本服务器连接"""
         return charger_id in self._local_connections
     
-    def is_connected(self, charger_id: str) -> bool:
+    async def is_connected(self, charger_id: str) -> bool:
         """检查充电桩是否在任何服务器连接（查询Redis）"""
         connection_key = f"{self.CONNECTION_KEY_PREFIX}{charger_id}"
-        return self.redis_client.exists(connection_key) > 0
+        return await self.redis_client.exists(connection_key) > 0
     
-    def get_connection_server(self, charger_id: str) -> Optional[str]:
+    async def get_connection_server(self, charger_id: str) -> Optional[str]:
         """获取充电桩连接的服务器ID"""
         connection_key = f"{self.CONNECTION_KEY_PREFIX}{charger_id}"
-        connection_info = self.redis_client.get(connection_key)
+        connection_info = await self.redis_client.get(connection_key)
         if connection_info:
             info = json.loads(connection_info)
             return info.get("server_id")
         return None
     
-    def update_last_seen(self, charger_id: str):
+    async def update_last_seen(self, charger_id: str):
         """更新最后活跃时间（心跳续期）"""
-        connection_key = f"{self.CONNECTION_KEY_PREFIX}{charger_id}"
-        connection_info = self.redis_client.get(connection_key)
+        connected_at = self._connected_at.get(charger_id)
+        if connected_at is None:
+            return
+        # 连接信息由本地状态重新生成，直接覆盖并续期TTL，不需要先 GET
+        await self.redis_client.setex(
+            f"{self.CONNECTION_KEY_PREFIX}{charger_id}",
+            3600,
+            self._connection_info(charger_id, connected_at)
+        )
+    
+    def _connection_info(self, charger_id: str, connected_at: str) -> str:
+        """生成存入Redis的连接信息"""
+        return json.dumps({
+            "charger_id": charger_id,
+            "server_id": self.server_id,
+            "connected_at": connected_at,
+            "last_seen": datetime.now(timezone.utc).isoformat(),
+        })
+    
+    async def get_all_connected_chargers(self) -> list:
+        """
+        获取所有已连接的充电桩ID（从Redis）
         
-        if connection_info:
-            info = json.loads(connection_info)
-            info["last_seen"] = datetime.now(timezone.utc).isoformat()
-            
-            # 更新并续期TTL
-            self.redis_client.setex(
-                connection_key,
-                3600,
-                json.dumps(info)
-            )
-    
-    def get_all_connected_chargers(self) -> list:
-        """获取所有已连接的充电桩ID（从Redis）"""
-        pattern = f"{self.CONNECTION_KEY_PREFIX}*"
-        keys = self.redis_client.keys(pattern)
-        charger_ids = [key.replace(self.CONNECTION_KEY_PREFIX, "") for key in keys]
-        return charger_ids
+        连接信息已过期（服务器异常退出、TTL到期未续期）的充电桩不返回，并顺便从集合中移除
+        """
+        charger_ids = list(await self.redis_client.smembers(self.CONNECTED_CHARGERS_KEY))
+        if not charger_ids:
+            return []
+        pipe = self.redis_client.pipeline(transaction=False)
+        for charger_id in charger_ids:
+            pipe.exists(f"{self.CONNECTION_KEY_PREFIX}{charger_id}")
+        live, stale = [], []
+        for charger_id, exists in zip(charger_ids, await pipe.execute()):
+            (live if exists else stale).append(charger_id)
+        if stale:
+            await self.redis_client.srem(self.CONNECTED_CHARGERS_KEY, *stale)
+            logger.info(f"从已连接充电桩集合移除 {len(stale)} 个过期记录")
+        return live
+    
+    async def rebuild_connected_index(self) -> int:
+        """
+        启动时校正已连接充电桩集合：补上有连接信息的充电桩，
+        移除连接信息已过期的充电桩（如其他服务器异常退出后残留的记录）
+        """
+        prefix_len = len(self.CONNECTION_KEY_PREFIX)
+        live = {
+            key[prefix_len:]
+            async for key in self.redis_client.scan_iter(match=f"{self.CONNECTION_KEY_PREFIX}*", count=1000)
+        }
+        candidates = [cid for cid in await self.redis_client.smembers(self.CONNECTED_CHARGERS_KEY) if cid not in live]
+        
+        # 扫描期间可能有新连接，移除前再确认一次连接信息确实不存在
+        pipe = self.redis_client.pipeline(transaction=False)
+        for charger_id in candidates:
+            pipe.exists(f"{self.CONNECTION_KEY_PREFIX}{charger_id}")
+        stale = [cid for cid, exists in zip(candidates, await pipe.execute()) if not exists]
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        if live:
+            pipe.sadd(self.CONNECTED_CHARGERS_KEY, *live)
+        if stale:
+            pipe.srem(self.CONNECTED_CHARGERS_KEY, *stale)
+        await pipe.execute()
+        logger.info(f"已连接充电桩集合已校正: {len(live)} 个在线，移除 {len(stale)} 个过期记录")
+        return len(live)
     
     def get_local_chargers(self) -> list:
         """获取本服务器处理的充电桩ID"""
@@ -141,34 +185,14 @@ class DistributedConnectionManager:
         """获取本服务器连接数"""
         return len(self._local_connections)
     
-    def count_total(self) -> int:
-        """获取所有服务器总连接数"""
-        return len(self.get_all_connected_chargers())
+    async def count_total(self) -> int:
+        """获取所有服务器总连接数（不计连接信息已过期的充电桩）"""
+        return len(await self.get_all_connected_chargers())
     
-    def publish_message(self, charger_id: str, message: dict):
+    async def publish_message(self, charger_id: str, message: dict):
         """发布消息到Redis Pub/Sub（用于跨服务器通信）"""
         channel = f"{self.MESSAGE_QUEUE_PREFIX}{charger_id}"
-        self.redis_client.publish(channel, json.dumps(message))
-    
-    def subscribe_messages(self, charger_id: str, callback):
-        """订阅充电桩的消息（异步处理）"""
-        import threading
-        channel = f"{self.MESSAGE_QUEUE_PREFIX}{charger_id}"
-        pubsub = self.redis_client.pubsub()
-        pubsub.subscribe(channel)
-        
-        def message_handler():
-            for message in pubsub.listen():
-                if message['type'] == 'message':
-                    try:
-                        data = json.loads(message['data'])
-                        callback(charger_id, data)
-                    except Exception as e:
-                        logger.error(f"处理订阅消息失败: {e}", exc_info=True)
-        
-        thread = threading.Thread(target=message_handler, daemon=True)
-        thread.start()
-        return pubsub
+        await self.redis_client.publish(channel, json.dumps(message))
 
 
 # 全局分布式连接管理器实例
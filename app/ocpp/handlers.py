@@ -4,21 +4,50 @@
 #
 
 import json
-from datetime import datetime, timezone
-from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
 from app.ocpp.connection_manager import connection_manager
 from app.database import get_db, Charger, Transaction, Order, Session
-from app.database.models import MeterValue as MeterValueModel
+from app.database.batch_writer import meter_value_writer
+from app.database.models import normalize_charger_status
+from app.core.config import get_settings
+from sqlalchemy import select, update, or_
 import logging
 
 logger = logging.getLogger("ocpp_csms")
 
+# 充电桩 last_seen 落库的最小间隔
+_LAST_SEEN_PERSIST_INTERVAL = timedelta(seconds=get_settings().db_last_seen_interval_seconds)
+
 
 def now_iso() -> str:
     """获取当前ISO格式时间"""
     return datetime.now(timezone.utc).isoformat()
 
 
+# 单独成列保存的测量项 -> MeterValue列名
+_HOT_MEASURANDS = {
+    "Voltage": "voltage",
+    "Current.Import": "current",
+    "SoC": "soc",
+}
+
+
+def extract_hot_measurands(meter_values: List[Dict[str, Any]]) -> Dict[str, float]:
+    """从OCPP meterValue列表中取出电压、电流、SoC（同一测量项取最后一个值）"""
+    result = {}
+    for meter_value in meter_values:
+        for sampled in meter_value.get("sampledValue", []):
+            column = _HOT_MEASURANDS.get(sampled.get("measurand"))
+            if column is None:
+                continue
+            try:
+                result[column] = float(sampled.get("value"))
+            except (TypeError, ValueError):
+                continue
+    return result
+
+
 class OCPPHandler:
     """OCPP消息处理器"""
     
@@ -59,9 +88,17 @@ class OCPPHandler:
     
     async def handle_heartbeat(self, charger_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """处理Heartbeat消息"""
-        charger = self.db.query(Charger).filter(Charger.id == charger_id).first()
-        if charger:
-            charger.last_seen = datetime.now(timezone.utc)
+        # 单条UPDATE，且距上次落库不足间隔时不改写行
+        now = datetime.now(timezone.utc)
+        result = self.db.execute(
+            update(Charger)
+            .where(
+                Charger.id == charger_id,
+                or_(Charger.last_seen.is_(None), Charger.last_seen < now - _LAST_SEEN_PERSIST_INTERVAL)
+            )
+            .values(last_seen=now)
+        )
+        if result.rowcount:
             self.db.commit()
         
         return {
@@ -75,7 +112,7 @@ class OCPPHandler:
         
         charger = self.db.query(Charger).filter(Charger.id == charger_id).first()
         if charger:
-            charger.status = new_status
+            charger.status = normalize_charger_status(new_status)
             charger.last_seen = datetime.now(timezone.utc)
             
             # 如果状态变为Available，清理事务ID
@@ -204,20 +241,30 @@ class OCPPHandler:
         tx_id = payload.get("transactionId")
         
         if tx_id:
-            transaction = self.db.query(Transaction).filter(
-                Transaction.charger_id == charger_id,
-                Transaction.transaction_id == tx_id
-            ).first()
-            
-            if transaction:
-                # 创建计量值记录
-                meter_value = MeterValueModel(
-                    transaction_id=transaction.id,
-                    timestamp=datetime.now(timezone.utc),
-                    value=meter
+            # 只取事务主键，不实例化ORM对象
+            transaction_pk = self.db.execute(
+                select(Transaction.id).where(
+                    Transaction.charger_id == charger_id,
+                    Transaction.transaction_id == tx_id
                 )
-                self.db.add(meter_value)
-                self.db.commit()
+            ).scalar()
+            
+            if transaction_pk is not None:
+                # 计量值记录交给批量写入器以Core INSERT合并写入
+                sampled_value = payload.get("meterValue") or None
+                row = {
+                    "transaction_id": transaction_pk,
+                    "connector_id": None,
+                    "timestamp": datetime.now(timezone.utc),
+                    "value": meter,
+                    "sampled_value": sampled_value,
+                    "voltage": None,
+                    "current": None,
+                    "soc": None,
+                }
+                if sampled_value:
+                    row.update(extract_hot_measurands(sampled_value))
+                meter_value_writer.put(row)
         
         return {"action": "MeterValues"}
     
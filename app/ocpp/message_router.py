@@ -39,7 +39,7 @@ class MessageRouter:
             return await MessageRouter._send_local(charger_id, action, payload, timeout)
         
         # 检查是否在其他服务器连接
-        server_id = manager.get_connection_server(charger_id)
+        server_id = await manager.get_connection_server(charger_id)
         if server_id:
             # 在其他服务器，通过消息队列转发
             return await MessageRouter._send_remote(charger_id, action, payload, server_id, timeout)
@@ -88,7 +88,7 @@ class MessageRouter:
         
         # 发布到Redis Pub/Sub
         channel = f"ocpp:route:{charger_id}"
-        manager.redis_client.publish(channel, json.dumps(message))
+        await manager.redis_client.publish(channel, json.dumps(message))
         
         # 等待响应（通过Redis键值对）
         response_key = f"ocpp:response:{message_id}"
@@ -97,15 +97,15 @@ class MessageRouter:
             # 轮询等待响应（最多timeout秒）
             start_time = asyncio.get_event_loop().time()
             while (asyncio.get_event_loop().time() - start_time) < timeout:
-                response = manager.redis_client.get(response_key)
+                response = await manager.redis_client.get(response_key)
                 if response:
                     response_data = json.loads(response)
-                    manager.redis_client.delete(response_key)  # 清理
+                    await manager.redis_client.delete(response_key)  # 清理
                     return response_data
                 await asyncio.sleep(0.1)  # 等待100ms后重试
             
             # 超时
-            manager.redis_client.delete(response_key)
+            await manager.redis_client.delete(response_key)
             return {
                 "success": False,
                 "error": "Timeout waiting for remote response"
@@ -135,7 +135,7 @@ class MessageRouter:
                 # 将响应发送回请求服务器
                 response_key = f"ocpp:response:{message_id}"
                 manager = distributed_connection_manager
-                manager.redis_client.setex(
+                await manager.redis_client.setex(
                     response_key,
                     int(timeout) + 1,
                     json.dumps(result)
@@ -145,7 +145,7 @@ class MessageRouter:
                 # 发送错误响应
                 response_key = f"ocpp:response:{message_id}"
                 manager = distributed_connection_manager
-                manager.redis_client.setex(
+                await manager.redis_client.setex(
                     response_key,
                     int(timeout) + 1,
                     json.dumps({
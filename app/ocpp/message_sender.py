@@ -4,7 +4,7 @@
 #
 
 import asyncio
-import json
+import orjson
 from typing import Dict, Any
 from fastapi import HTTPException
 from app.ocpp.connection_manager import connection_manager
@@ -39,13 +39,14 @@ class OCPPMessageSender:
                 "action": action,
                 "payload": payload
             }
-            await ws.send_text(json.dumps(message))
+            # OCPP-J 使用文本帧；调用方传入的 Decimal 等类型按字符串输出
+            await ws.send_text(orjson.dumps(message, default=str).decode())
             logger.info(f"[{charger_id}] -> CSMS发送OCPP调用: {action}")
             
             # 等待响应（简化版本，实际应该使用消息ID匹配）
             try:
                 response = await asyncio.wait_for(ws.receive_text(), timeout=timeout)
-                response_data = json.loads(response)
+                response_data = orjson.loads(response)
                 logger.info(f"[{charger_id}] <- 收到响应: {action}")
                 return {"success": True, "data": response_data}
             except asyncio.TimeoutError:
@@ -24,7 +24,8 @@ from contextlib import asynccontextmanager
 # 2. 创建统一的 OCPP 消息处理函数
 async def handle_ocpp_message(charger_id: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     \"\"\"统一的 OCPP 消息处理函数，所有传输方式都使用这个函数\"\"\"
-    charger = next((c for c in load_chargers() if c["id"] == charger_id), get_default_charger(charger_id))
+    # 按ID直接读取单个充电桩（HGETALL charger:{id}），不要扫描 load_chargers()
+    charger = await get_charger(charger_id) or get_default_charger(charger_id)
     charger["last_seen"] = now_iso()
     
     # 这里可以复用现有的消息处理逻辑
@@ -0,0 +1,98 @@
+#
+# WebSocket 响应发送队列
+# 接收循环只把响应放入队列，由每个连接的后台任务发送；
+# 充电桩在 BootNotification 中声明 responseBatching 后，短时间内的多条响应合并为一个 JSON 数组帧；
+# 响应可以是字典，也可以是已序列化的 JSON 文本（固定内容的响应模板）；
+# 队列有上限，对端读取过慢时接收循环在 send 处等待，不再继续读入新消息
+#
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Union
+import orjson
+from fastapi import WebSocket
+
+logger = logging.getLogger("ocpp_csms")
+
+# 队列中的模式切换标记，保证切换前的响应仍按单条发送
+_ENABLE_BATCHING = object()
+
+
+class ResponseBatcher:
+    """单个 WebSocket 连接的响应发送器"""
+
+    def __init__(self, ws: WebSocket, linger: float = 0.002, max_batch: int = 100, max_queue: int = 1000):
+        self.ws = ws
+        self.linger = linger
+        self.max_batch = max_batch
+        self.batching = False
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    async def send(self, message: Union[Dict[str, Any], str]) -> None:
+        """加入一条待发送的响应（字典或已序列化的 JSON 文本），队列已满时等待"""
+        await self._queue.put(message)
+
+    async def enable_batching(self) -> None:
+        """此前已排队的响应发送完后，开始合并发送"""
+        await self._queue.put(_ENABLE_BATCHING)
+
+    def start(self) -> None:
+        """启动发送任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止发送任务，并尽量发送队列中剩余的响应"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._send_batch(self._drain([]))
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.batching:
+                # 攒批窗口：等待期间到达的响应合并到同一帧
+                await asyncio.sleep(self.linger)
+            await self._send_batch(self._drain(batch))
+
+    def _drain(self, batch: List[Any]) -> List[Any]:
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _send_batch(self, batch: List[Any]) -> None:
+        pending: List[Union[Dict[str, Any], str]] = []
+        for item in batch:
+            if item is _ENABLE_BATCHING:
+                await self._send(pending)
+                pending = []
+                self.batching = True
+            elif self.batching:
+                pending.append(item)
+            else:
+                await self._send([item])
+        await self._send(pending)
+
+    async def _send(self, messages: List[Union[Dict[str, Any], str]]) -> None:
+        if not messages:
+            return
+        try:
+            if len(messages) == 1:
+                message = messages[0]
+                await self.ws.send_text(message if isinstance(message, str) else orjson.dumps(message).decode())
+            else:
+                # 已序列化的响应原样拼接进数组
+                parts = [m if isinstance(m, str) else orjson.dumps(m).decode() for m in messages]
+                await self.ws.send_text("[" + ",".join(parts) + "]")
+        except Exception as e:
+            logger.warning(f"WebSocket 发送响应失败（{len(messages)} 条）: {e}")
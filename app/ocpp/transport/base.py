@@ -10,6 +10,12 @@ import logging
 
 logger = logging.getLogger("ocpp_csms")
 
+# OCPP错误日志记录（数据库不可用时跳过）
+try:
+    from app.utils.history_recorder import record_ocpp_error
+except ImportError:
+    record_ocpp_error = None
+
 
 class TransportType(str, Enum):
     """传输类型"""
@@ -90,5 +96,7 @@ class TransportAdapter(ABC):
             return await self.message_handler(charger_id, action, payload)
         except Exception as e:
             logger.error(f"[{charger_id}] 消息处理错误: {e}", exc_info=True)
+            if record_ocpp_error is not None:
+                record_ocpp_error(charger_id, action, "InternalError", str(e), payload)
             return {"error": str(e)}
 
@@ -3,9 +3,10 @@
 # 处理WebSocket连接和消息路由
 #
 
-import json
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect, Query, HTTPException
 from app.ocpp.handlers import OCPPHandler
+from app.ocpp.response_batcher import ResponseBatcher
 from app.database import get_db
 from app.core.logging_config import get_logger
 from app.core.config import get_settings
@@ -26,17 +27,21 @@ async def ocpp_websocket_route(websocket: WebSocket, id: str = Query(..., descri
     OCPP WebSocket路由
     处理充电桩的WebSocket连接
     """
-    # 强制OCPP 1.6子协议协商
-    requested_proto = (websocket.headers.get("sec-websocket-protocol") or "").strip()
-    requested = [p.strip() for p in requested_proto.split(",") if p.strip()]
-    if "ocpp1.6" not in requested:
+    # 强制OCPP 1.6子协议协商（使用 ASGI 已解析的 scope["subprotocols"]）
+    if "ocpp1.6" not in websocket.scope.get("subprotocols", ()):
         await websocket.close(code=1002)
         return
     
     await websocket.accept(subprotocol="ocpp1.6")
+    # 响应经发送队列发出；充电桩声明支持时合并为 JSON 数组帧
+    outbox = ResponseBatcher(websocket)
+    outbox.start()
     
-    # 注册连接
-    connection_manager.connect(id, websocket)
+    # 注册连接（分布式模式需要写入Redis）
+    if settings.enable_distributed:
+        await connection_manager.connect(id, websocket)
+    else:
+        connection_manager.connect(id, websocket)
     logger.info(f"[{id}] WebSocket连接已建立，子协议=ocpp1.6")
     
     # 获取数据库会话
@@ -47,7 +52,7 @@ async def ocpp_websocket_route(websocket: WebSocket, id: str = Query(..., descri
         handler = OCPPHandler(db)
         
         # 发送连接确认
-        await websocket.send_text(json.dumps({"result": "Connected", "id": id}))
+        await outbox.send({"result": "Connected", "id": id})
         
         # 定期更新心跳（分布式模式）
         if settings.enable_distributed:
@@ -55,39 +60,50 @@ async def ocpp_websocket_route(websocket: WebSocket, id: str = Query(..., descri
             async def heartbeat_updater():
                 while True:
                     await asyncio.sleep(30)  # 每30秒更新一次
-                    connection_manager.update_last_seen(id)
+                    await connection_manager.update_last_seen(id)
             
             heartbeat_task = asyncio.create_task(heartbeat_updater())
         
         while True:
             raw = await websocket.receive_text()
             try:
-                msg = json.loads(raw)
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({"error": "Invalid JSON"}))
+                msg = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                await outbox.send({"error": "Invalid JSON"})
                 continue
             
             action = str(msg.get("action", "")).strip()
             payload = msg.get("payload", {})
             
-            logger.info(f"[{id}] <- OCPP {action} | payload={json.dumps(payload)}")
+            logger.info("[%s] <- OCPP %s | payload=%s", id, action, payload)
             
             try:
                 # 处理消息
                 response = await handler.handle_message(id, action, payload)
                 
+                # 与 /ocpp 相同：BootNotification 中声明 responseBatching 后开始合并发送
+                batching = (
+                    action == "BootNotification"
+                    and payload.get("responseBatching") is True
+                    and response.get("status") == "Accepted"
+                )
+                if batching:
+                    response["responseBatching"] = True
+                
                 logger.info(f"[{id}] -> OCPP响应: {action}")
-                await websocket.send_text(json.dumps(response))
+                await outbox.send(response)
+                if batching:
+                    await outbox.enable_batching()
                 
             except ValueError as e:
                 logger.error(f"[{id}] 未知的OCPP动作: {action}")
-                await websocket.send_text(json.dumps({"error": "UnknownAction", "action": action}))
+                await outbox.send({"error": "UnknownAction", "action": action})
             except Exception as e:
                 logger.error(f"[{id}] 处理消息失败: {e}", exc_info=True)
-                await websocket.send_text(json.dumps({
+                await outbox.send({
                     "error": "InternalError", 
                     "detail": str(e)
-                }))
+                })
     
     except WebSocketDisconnect:
         logger.info(f"[{id}] WebSocket断开连接")
@@ -97,7 +113,11 @@ async def ocpp_websocket_route(websocket: WebSocket, id: str = Query(..., descri
         # 停止心跳任务
         if settings.enable_distributed and 'heartbeat_task' in locals():
             heartbeat_task.cancel()
+        await outbox.stop()
         # 断开连接
-        connection_manager.disconnect(id)
+        if settings.enable_distributed:
+            await connection_manager.disconnect(id)
+        else:
+            connection_manager.disconnect(id)
         logger.info(f"[{id}] WebSocket已注销")
 
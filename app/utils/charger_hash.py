@@ -0,0 +1,45 @@
+#
+# 充电桩 Redis Hash 存储格式
+# 每个充电桩一个 Hash（charger:{id}），字段值为 JSON 编码以保留类型，
+# 嵌套的 session/location 展开为 "session.meter"、"location.latitude" 这样的字段，
+# 只需改写变化的字段（如心跳只写 last_seen）
+#
+
+from typing import Any, Dict, Mapping
+import orjson
+
+CHARGER_KEY_PREFIX = "charger:"
+# 所有充电桩ID的集合，用于列出充电桩
+CHARGERS_INDEX_KEY = "chargers:index"
+# 旧格式：所有充电桩 JSON 存在同一个 Hash 中，仅用于启动时迁移
+LEGACY_CHARGERS_HASH_KEY = "chargers"
+
+
+def charger_key(charger_id: str) -> str:
+    """充电桩 Hash 的键"""
+    return f"{CHARGER_KEY_PREFIX}{charger_id}"
+
+
+def flatten_charger(charger: Mapping[str, Any]) -> Dict[str, str]:
+    """将充电桩字典展开为 Hash 字段（值为 JSON 字符串）"""
+    fields: Dict[str, str] = {}
+    for name, value in charger.items():
+        if isinstance(value, dict):
+            for sub_name, sub_value in value.items():
+                fields[f"{name}.{sub_name}"] = orjson.dumps(sub_value).decode()
+        else:
+            fields[name] = orjson.dumps(value).decode()
+    return fields
+
+
+def unflatten_charger(fields: Mapping[str, Any]) -> Dict[str, Any]:
+    """将 Hash 字段还原为充电桩字典"""
+    charger: Dict[str, Any] = {}
+    for field, raw in fields.items():
+        value = orjson.loads(raw)
+        name, sep, sub_name = field.partition(".")
+        if sep:
+            charger.setdefault(name, {})[sub_name] = value
+        else:
+            charger[name] = value
+    return charger
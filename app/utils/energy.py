@@ -0,0 +1,24 @@
+#
+# 订单结算计算
+# 根据开始/结束时间戳和充电速率计算充电时长和电量
+# 全部使用整数运算（秒、瓦），结果以 0.01 为单位，只在输出时转换为小数
+#
+
+from typing import Tuple
+
+
+def compute_energy_x100(start_ts: int, end_ts: int, rate_w: int) -> Tuple[int, int]:
+    """
+    计算充电时长和电量（四舍五入到 0.01）
+    
+    Args:
+        start_ts: 开始时间（Unix时间戳，秒）
+        end_ts: 结束时间（Unix时间戳，秒）
+        rate_w: 充电速率（W）
+        
+    Returns:
+        (时长（分钟 × 100）, 电量（kWh × 100）)
+    """
+    duration_s = end_ts - start_ts
+    # 分钟 × 100 = 秒 × 100 / 60；kWh × 100 = W × 秒 / 36000
+    return (duration_s * 100 + 30) // 60, (rate_w * duration_s + 18_000) // 36_000
@@ -3,108 +3,309 @@
 # 用于记录充电桩心跳和状态变化历史到数据库
 #
 
+import asyncio
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, HeartbeatHistory, StatusHistory, Charger
+from app.database.models import normalize_charger_status
+from app.database.batch_writer import heartbeat_writer, status_writer, error_log_writer
 from app.core.logging_config import get_logger
 
 logger = get_logger("ocpp_csms")
 
 
+# 每个充电桩最近一次写入的心跳/状态时间
+# 记录经批量写入器异步落库，刚提交的记录可能尚未写入，计算间隔时以内存中的时间为准
+_last_heartbeat_time: Dict[str, datetime] = {}
+_last_status_time: Dict[str, datetime] = {}
+
+# 心跳/状态队列：消息处理只入队，后台任务在线程中批量补查上一次记录的时间，再计算间隔并提交给批量写入器
+HEARTBEAT_BATCH_SIZE = 1000
+_heartbeat_queue: "asyncio.Queue[Any]" = asyncio.Queue()
+_heartbeat_task: Optional[asyncio.Task] = None
+_status_queue: "asyncio.Queue[Any]" = asyncio.Queue()
+_status_task: Optional[asyncio.Task] = None
+
+# 队列中的停止标记：后台任务处理完手头的批次后退出
+_STOP = object()
+
+
+def _heartbeat_health(interval_seconds: Optional[float]) -> str:
+    """按心跳间隔判断健康状态"""
+    if interval_seconds is None or interval_seconds <= 35:
+        return "normal"
+    if interval_seconds <= 60:
+        return "warning"
+    return "abnormal"
+
+
 def record_heartbeat(charger_id: str, previous_heartbeat_time: Optional[datetime] = None) -> None:
     """
-    记录心跳历史
+    记录心跳历史（加入批量写入队列）
     
     Args:
         charger_id: 充电桩ID
         previous_heartbeat_time: 上一次心跳时间，用于计算间隔
     """
+    try:
+        current_time = datetime.now(timezone.utc)
+        
+        # 计算心跳间隔
+        interval_seconds = None
+        if previous_heartbeat_time:
+            interval_seconds = (current_time - previous_heartbeat_time).total_seconds()
+        health_status = _heartbeat_health(interval_seconds)
+        
+        heartbeat_writer.put({
+            "charger_id": charger_id,
+            "timestamp": current_time,
+            "health_status": health_status,
+            "interval_seconds": interval_seconds,
+        })
+        _last_heartbeat_time[charger_id] = current_time
+        
+        logger.debug(f"[{charger_id}] 心跳记录已提交: {health_status}, 间隔: {interval_seconds}s")
+    except Exception as e:
+        logger.error(f"[{charger_id}] 记录心跳历史失败: {e}", exc_info=True)
+
+
+def enqueue_heartbeat(charger_id: str) -> None:
+    """记录一次心跳；后台任务未启动时直接同步记录"""
+    if _heartbeat_task is None:
+        record_heartbeat(charger_id, get_last_heartbeat_time(charger_id))
+        return
+    _heartbeat_queue.put_nowait((charger_id, datetime.now(timezone.utc)))
+
+
+def record_heartbeats_bulk(rows: List[Tuple[str, datetime]]) -> None:
+    """
+    批量记录心跳（加入批量写入队列）
+    
+    Args:
+        rows: (充电桩ID, 心跳时间) 列表，按时间先后排列；上一次心跳时间取内存中的记录
+    """
+    for charger_id, current_time in rows:
+        previous = _last_heartbeat_time.get(charger_id)
+        interval_seconds = (current_time - previous).total_seconds() if previous else None
+        heartbeat_writer.put({
+            "charger_id": charger_id,
+            "timestamp": current_time,
+            "health_status": _heartbeat_health(interval_seconds),
+            "interval_seconds": interval_seconds,
+        })
+        _last_heartbeat_time[charger_id] = current_time
+    logger.debug(f"批量提交心跳记录: {len(rows)} 条")
+
+
+def _get_last_heartbeat_times(charger_ids: Iterable[str]) -> Dict[str, datetime]:
+    """一次查询获取多个充电桩最后一次心跳的时间"""
     try:
         db: Session = SessionLocal()
         try:
-            current_time = datetime.now(timezone.utc)
-            
-            # 计算心跳间隔
-            interval_seconds = None
-            health_status = "normal"
-            
-            if previous_heartbeat_time:
-                interval_seconds = (current_time - previous_heartbeat_time).total_seconds()
-                # 判断健康状态
-                if interval_seconds <= 35:
-                    health_status = "normal"
-                elif interval_seconds <= 60:
-                    health_status = "warning"
-                else:
-                    health_status = "abnormal"
-            
-            # 创建心跳记录
-            heartbeat = HeartbeatHistory(
-                charger_id=charger_id,
-                timestamp=current_time,
-                health_status=health_status,
-                interval_seconds=interval_seconds
-            )
-            
-            db.add(heartbeat)
-            db.commit()
-            
-            logger.debug(f"[{charger_id}] 心跳记录已保存: {health_status}, 间隔: {interval_seconds}s")
-        except Exception as e:
-            db.rollback()
-            logger.error(f"[{charger_id}] 记录心跳历史失败: {e}", exc_info=True)
+            rows = db.query(HeartbeatHistory.charger_id, func.max(HeartbeatHistory.timestamp)).filter(
+                HeartbeatHistory.charger_id.in_(list(charger_ids))
+            ).group_by(HeartbeatHistory.charger_id).all()
+            return {charger_id: timestamp for charger_id, timestamp in rows}
         finally:
             db.close()
     except Exception as e:
-        logger.error(f"[{charger_id}] 创建数据库会话失败: {e}", exc_info=True)
+        logger.error(f"批量获取最后心跳时间失败: {e}", exc_info=True)
+        return {}
+
+
+async def _consume(
+    queue: "asyncio.Queue[Any]",
+    last_times: Dict[str, datetime],
+    needs_last_time: Callable[[Tuple], bool],
+    fetch_last_times: Callable[[Iterable[str]], Dict[str, datetime]],
+    record_bulk: Callable[[List[Tuple]], None],
+    name: str,
+) -> None:
+    """
+    批量处理队列中的记录；本进程还没见过的充电桩，在线程中一次查询补上一次记录的时间，
+    收到停止标记时处理完手头的批次后退出
+    """
+    stopping = False
+    while not stopping:
+        item = await queue.get()
+        if item is _STOP:
+            return
+        batch = [item]
+        while len(batch) < HEARTBEAT_BATCH_SIZE and not queue.empty():
+            item = queue.get_nowait()
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        try:
+            missing = {row[0] for row in batch if row[0] not in last_times and needs_last_time(row)}
+            if missing:
+                for charger_id, timestamp in (await asyncio.to_thread(fetch_last_times, missing)).items():
+                    last_times.setdefault(charger_id, timestamp)
+            record_bulk(batch)
+        except Exception as e:
+            logger.error(f"批量记录{name}失败（{len(batch)} 条）: {e}", exc_info=True)
+
+
+async def _stop_consumer(task: asyncio.Task, queue: "asyncio.Queue[Any]") -> None:
+    """通知后台任务停止并等待它处理完已入队的记录"""
+    queue.put_nowait(_STOP)
+    await task
+
+
+def start_heartbeat_recorder() -> None:
+    """启动心跳/状态记录后台任务（需在事件循环中调用）"""
+    global _heartbeat_task, _status_task
+    if _heartbeat_task is None:
+        _heartbeat_task = asyncio.create_task(_consume(
+            _heartbeat_queue, _last_heartbeat_time, lambda row: True,
+            _get_last_heartbeat_times, record_heartbeats_bulk, "心跳历史",
+        ))
+    if _status_task is None:
+        _status_task = asyncio.create_task(_consume(
+            _status_queue, _last_status_time, lambda row: bool(row[2]),
+            _get_last_status_times, record_status_changes_bulk, "状态历史",
+        ))
+
+
+async def stop_heartbeat_recorder() -> None:
+    """停止心跳/状态记录任务，队列中已有的记录全部提交后返回"""
+    global _heartbeat_task, _status_task
+    if _heartbeat_task is not None:
+        await _stop_consumer(_heartbeat_task, _heartbeat_queue)
+        _heartbeat_task = None
+    if _status_task is not None:
+        await _stop_consumer(_status_task, _status_queue)
+        _status_task = None
+
+
+def enqueue_status_change(charger_id: str, new_status: str, previous_status: Optional[str] = None) -> None:
+    """记录一次状态变化；后台任务未启动时直接同步记录"""
+    if _status_task is None:
+        record_status_change(charger_id, new_status, previous_status)
+        return
+    _status_queue.put_nowait((charger_id, new_status, previous_status, datetime.now(timezone.utc)))
+
+
+def record_status_changes_bulk(rows: List[Tuple[str, str, Optional[str], datetime]]) -> None:
+    """
+    批量记录状态变化（加入批量写入队列）
+    
+    Args:
+        rows: (充电桩ID, 新状态, 之前的状态, 变化时间) 列表，按时间先后排列；上一个状态的开始时间取内存中的记录
+    """
+    for charger_id, new_status, previous_status, current_time in rows:
+        duration_seconds = None
+        if previous_status:
+            last_status_time = _last_status_time.get(charger_id)
+            if last_status_time:
+                duration_seconds = (current_time - last_status_time).total_seconds()
+        status_writer.put({
+            "charger_id": charger_id,
+            "status": normalize_charger_status(new_status),
+            "previous_status": normalize_charger_status(previous_status),
+            "timestamp": current_time,
+            "duration_seconds": duration_seconds,
+        })
+        _last_status_time[charger_id] = current_time
+    logger.debug(f"批量提交状态变化记录: {len(rows)} 条")
 
 
 def record_status_change(charger_id: str, new_status: str, previous_status: Optional[str] = None) -> None:
     """
-    记录状态变化历史
+    记录状态变化历史（加入批量写入队列）
     
     Args:
         charger_id: 充电桩ID
         new_status: 新状态
         previous_status: 之前的状态
     """
+    try:
+        current_time = datetime.now(timezone.utc)
+        
+        # 计算上一个状态的持续时间
+        duration_seconds = None
+        if previous_status:
+            last_status_time = _last_status_time.get(charger_id) or _get_last_status_time(charger_id)
+            if last_status_time:
+                duration_seconds = (current_time - last_status_time).total_seconds()
+        
+        status_writer.put({
+            "charger_id": charger_id,
+            "status": normalize_charger_status(new_status),
+            "previous_status": normalize_charger_status(previous_status),
+            "timestamp": current_time,
+            "duration_seconds": duration_seconds,
+        })
+        _last_status_time[charger_id] = current_time
+        
+        logger.debug(f"[{charger_id}] 状态变化已提交: {previous_status} -> {new_status}")
+    except Exception as e:
+        logger.error(f"[{charger_id}] 记录状态历史失败: {e}", exc_info=True)
+
+
+def record_ocpp_error(
+    charger_id: Optional[str],
+    action: str,
+    error_code: str,
+    error_description: Optional[str] = None,
+    request_payload: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    记录OCPP错误日志（加入批量写入队列）
+    
+    Args:
+        charger_id: 充电桩ID
+        action: OCPP动作
+        error_code: 错误代码
+        error_description: 错误描述
+        request_payload: 请求数据
+    """
+    try:
+        error_log_writer.put({
+            "charger_id": charger_id,
+            "action": action,
+            "error_code": error_code,
+            "error_description": error_description,
+            "request_payload": request_payload,
+            "response_payload": None,
+            "timestamp": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        logger.error(f"[{charger_id}] 记录OCPP错误日志失败: {e}", exc_info=True)
+
+
+def _get_last_status_time(charger_id: str) -> Optional[datetime]:
+    """从数据库获取最后一条状态记录的时间"""
     try:
         db: Session = SessionLocal()
         try:
-            current_time = datetime.now(timezone.utc)
-            
-            # 计算上一个状态的持续时间
-            duration_seconds = None
-            if previous_status:
-                # 查找上一个状态记录
-                last_status_record = db.query(StatusHistory).filter(
-                    StatusHistory.charger_id == charger_id
-                ).order_by(StatusHistory.timestamp.desc()).first()
-                
-                if last_status_record:
-                    duration_seconds = (current_time - last_status_record.timestamp).total_seconds()
-            
-            # 创建状态记录
-            status_record = StatusHistory(
-                charger_id=charger_id,
-                status=new_status,
-                previous_status=previous_status,
-                timestamp=current_time,
-                duration_seconds=duration_seconds
-            )
-            
-            db.add(status_record)
-            db.commit()
-            
-            logger.debug(f"[{charger_id}] 状态变化已记录: {previous_status} -> {new_status}")
-        except Exception as e:
-            db.rollback()
-            logger.error(f"[{charger_id}] 记录状态历史失败: {e}", exc_info=True)
+            return db.query(StatusHistory.timestamp).filter(
+                StatusHistory.charger_id == charger_id
+            ).order_by(StatusHistory.timestamp.desc()).limit(1).scalar()
         finally:
             db.close()
     except Exception as e:
-        logger.error(f"[{charger_id}] 创建数据库会话失败: {e}", exc_info=True)
+        logger.error(f"[{charger_id}] 获取最后状态时间失败: {e}", exc_info=True)
+        return None
+
+
+def _get_last_status_times(charger_ids: Iterable[str]) -> Dict[str, datetime]:
+    """一次查询获取多个充电桩最后一条状态记录的时间"""
+    try:
+        db: Session = SessionLocal()
+        try:
+            rows = db.query(StatusHistory.charger_id, func.max(StatusHistory.timestamp)).filter(
+                StatusHistory.charger_id.in_(list(charger_ids))
+            ).group_by(StatusHistory.charger_id).all()
+            return {charger_id: timestamp for charger_id, timestamp in rows}
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"批量获取最后状态时间失败: {e}", exc_info=True)
+        return {}
 
 
 def get_last_heartbeat_time(charger_id: str) -> Optional[datetime]:
@@ -117,6 +318,10 @@ def get_last_heartbeat_time(charger_id: str) -> Optional[datetime]:
     Returns:
         最后一次心跳时间，如果没有则返回None
     """
+    cached = _last_heartbeat_time.get(charger_id)
+    if cached is not None:
+        return cached
+    
     try:
         db: Session = SessionLocal()
         try:
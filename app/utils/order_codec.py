@@ -0,0 +1,48 @@
+#
+# 订单 JSON 解码
+# 订单是固定结构，安装了 msgspec 时按 Struct 模式解码（C实现，直接产出类型化字段），
+# 未安装时回退到 orjson
+#
+
+import logging
+from typing import Any, Dict, Optional
+import orjson
+
+logger = logging.getLogger("ocpp_csms")
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+    logger.info("msgspec 未安装，订单解码使用 orjson")
+
+
+if MSGSPEC_AVAILABLE:
+    class OrderStruct(msgspec.Struct):
+        """充电订单"""
+        id: str
+        charger_id: str
+        user_id: Optional[str] = None
+        id_tag: Optional[str] = None
+        charging_rate: float = 7.0
+        start_time: Optional[str] = None
+        start_ts: Optional[int] = None
+        end_time: Optional[str] = None
+        duration_minutes: Optional[float] = None
+        energy_kwh: Optional[float] = None
+        status: str = "ongoing"
+
+    _order_decoder = msgspec.json.Decoder(OrderStruct)
+
+
+def decode_order(raw: Any) -> Dict[str, Any]:
+    """解码一条订单JSON为字典，格式不正确时抛出 ValueError"""
+    if MSGSPEC_AVAILABLE:
+        if isinstance(raw, str):
+            raw = raw.encode()
+        try:
+            return msgspec.structs.asdict(_order_decoder.decode(raw))
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return orjson.loads(raw)
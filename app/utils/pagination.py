@@ -0,0 +1,25 @@
+#
+# 分页工具
+# 基于 (start_time, id) 的键集（seek）分页游标编解码
+#
+
+import base64
+from datetime import datetime
+from typing import Any, Callable, Tuple
+from fastapi import HTTPException
+
+
+def encode_cursor(start_time: datetime, row_id: Any) -> str:
+    """将最后一行的 (start_time, id) 编码为不透明游标"""
+    raw = f"{start_time.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, id_type: Callable[[str], Any] = str) -> Tuple[datetime, Any]:
+    """解码游标，格式错误时返回400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_time_str, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(start_time_str), id_type(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
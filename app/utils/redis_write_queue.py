@@ -0,0 +1,117 @@
+#
+# Redis 异步写入队列
+# 热路径上的 HSET 先合并进内存中的待写表，由后台任务通过 redis.asyncio 管道批量写入，
+# 读取方先查待写表，保证刚写入但尚未落到 Redis 的数据可见
+#
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+import redis.asyncio as aioredis
+
+logger = logging.getLogger("ocpp_csms")
+
+
+class RedisWriteQueue:
+    """按 key/field 合并的 HSET 写入队列"""
+
+    def __init__(self, client: aioredis.Redis, max_batch: int = 500, interval: float = 0.05, retry_delay: float = 1.0):
+        self._client = client
+        self.max_batch = max_batch
+        self.interval = interval
+        # 写入失败后等待多久再重试
+        self.retry_delay = retry_delay
+        # 待写入和正在写入的数据（key -> {field: value}），同一字段只保留最新值
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def hset(self, key: str, field: Optional[str] = None, value: Any = None, mapping: Optional[Dict[str, Any]] = None) -> None:
+        """加入一次 HSET（单个字段或 mapping）；需在事件循环中调用，后台任务未启动时自动启动"""
+        if self._task is None:
+            self.start()
+        fields = self._pending.setdefault(key, {})
+        if field is not None:
+            fields[field] = value
+        if mapping:
+            fields.update(mapping)
+        self._wakeup.set()
+
+    def get(self, key: str, field: str) -> Optional[Any]:
+        """返回尚未写入 Redis 的值，没有时返回None"""
+        value = self._pending.get(key, {}).get(field)
+        if value is None:
+            value = self._inflight.get(key, {}).get(field)
+        return value
+
+    def pending_fields(self, key: str) -> Dict[str, Any]:
+        """返回某个 Hash 中尚未写入 Redis 的全部字段"""
+        fields = dict(self._inflight.get(key, ()))
+        fields.update(self._pending.get(key, ()))
+        return fields
+
+    def start(self) -> None:
+        """启动后台写入任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Redis 异步写入队列已启动")
+
+    async def stop(self) -> None:
+        """停止后台任务：等待正在进行的写入完成，再把剩余数据写入 Redis"""
+        if self._task is None:
+            return
+        # 不取消任务，避免正在执行的管道写入被打断而丢失数据
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._stopping = False
+        await self._flush()
+        logger.info("Redis 异步写入队列已停止")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            await self._wakeup.wait()
+            # 攒批窗口：等待期间同一字段的多次写入会被合并
+            if not self._stopping:
+                await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            if not await self._flush() and not self._stopping:
+                await asyncio.sleep(self.retry_delay)
+
+    async def _flush(self) -> bool:
+        """写入待写表中的全部数据，失败时放回待写表并返回False"""
+        if not self._pending:
+            return True
+        self._inflight, self._pending = self._pending, {}
+        items = list(self._inflight.items())
+        try:
+            for start in range(0, len(items), self.max_batch):
+                async with self._client.pipeline(transaction=False) as pipe:
+                    for key, fields in items[start:start + self.max_batch]:
+                        pipe.hset(key, mapping=fields)
+                    await pipe.execute()
+            logger.debug(f"Redis 批量写入 {len(items)} 个键")
+            return True
+        except asyncio.CancelledError:
+            # 任务被取消（如事件循环关闭）时数据留在待写表中
+            self._requeue()
+            raise
+        except Exception as e:
+            logger.error(f"Redis 批量写入失败（{len(items)} 个键），稍后重试: {e}")
+            self._requeue()
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return False
+        finally:
+            self._inflight = {}
+
+    def _requeue(self) -> None:
+        """把正在写入的数据放回待写表，不覆盖期间产生的新值"""
+        for key, fields in self._inflight.items():
+            pending = self._pending.setdefault(key, {})
+            for field, value in fields.items():
+                pending.setdefault(field, value)
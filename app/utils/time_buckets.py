@@ -0,0 +1,83 @@
+#
+# 时间分桶工具
+# 将按时间升序的状态记录按小时分桶，每个桶保留最后一个状态
+# 安装了 numba 时，大窗口下的分桶计算使用JIT编译版本
+#
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+from app.core.logging_config import get_logger
+
+logger = get_logger("ocpp_csms")
+
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.info("numba 未安装，状态分桶使用纯Python实现")
+
+# 记录数少于该值时，构造数组的开销大于JIT带来的收益
+NUMBA_MIN_RECORDS = 2000
+
+_ONE_HOUR = timedelta(hours=1)
+_ONE_US = timedelta(microseconds=1)
+_HOUR_US = 3_600_000_000
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _bucket_last_ids(offsets_us, status_ids, hours):
+        """
+        offsets_us 为各记录距 end_time 的整数微秒数，与纯Python实现的 timedelta 运算完全一致；
+        第 i 个桶覆盖 [end_time - (i+1)h, end_time - ih)，-1 表示空桶
+        """
+        buckets = np.full(hours, -1, dtype=np.int16)
+        for k in range(offsets_us.shape[0]):
+            offset = offsets_us[k]
+            if offset <= 0:
+                continue
+            idx = (offset - 1) // _HOUR_US
+            if 0 <= idx < hours:
+                buckets[idx] = status_ids[k]
+        return buckets
+
+
+def bucket_last_status(
+    timestamps: Sequence[datetime],
+    statuses: Sequence[str],
+    end_time: datetime,
+    hours: int
+) -> List[Optional[str]]:
+    """
+    按小时分桶，返回每个桶内最后一个状态（无记录为None）
+
+    第 i 个桶覆盖 [end_time - (i+1)h, end_time - ih)，记录需按时间升序
+    """
+    if NUMBA_AVAILABLE and len(timestamps) >= NUMBA_MIN_RECORDS:
+        status_names: List[str] = []
+        status_to_id = {}
+        ids = []
+        for status in statuses:
+            status_id = status_to_id.get(status)
+            if status_id is None:
+                status_id = status_to_id[status] = len(status_names)
+                status_names.append(status)
+            ids.append(status_id)
+        offsets_us = np.fromiter(
+            ((end_time - t) // _ONE_US for t in timestamps), dtype=np.int64, count=len(timestamps)
+        )
+        status_ids = np.array(ids, dtype=np.int16)
+        bucket_ids = _bucket_last_ids(offsets_us, status_ids, hours)
+        return [status_names[i] if i >= 0 else None for i in bucket_ids.tolist()]
+
+    buckets: List[Optional[str]] = [None] * hours
+    for timestamp, status in zip(timestamps, statuses):
+        offset = end_time - timestamp
+        if offset <= timedelta(0):
+            continue
+        idx = (offset - _ONE_US) // _ONE_HOUR
+        if idx < hours:
+            buckets[idx] = status
+    return buckets
@@ -0,0 +1,55 @@
+#
+# WebSocket 连接注册表
+# 按充电桩ID分片，注册/注销只锁对应分片，查找不加锁（单次 dict 读取是原子的），
+# 充电桩数量很大时避免所有连接争用同一个映射
+#
+
+import asyncio
+from typing import Dict, Generic, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ShardedRegistry(Generic[T]):
+    """按 key 分片的连接映射"""
+
+    def __init__(self, shards: int = 16):
+        # 分片数取2的幂，用位与代替取模
+        if shards <= 0 or shards & (shards - 1):
+            raise ValueError("shards must be a power of two")
+        self._mask = shards - 1
+        self._maps: List[Dict[str, T]] = [{} for _ in range(shards)]
+        self._locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(shards)]
+
+    def _shard(self, key: str) -> int:
+        return hash(key) & self._mask
+
+    def get(self, key: str) -> Optional[T]:
+        """查找连接（不加锁）"""
+        return self._maps[self._shard(key)].get(key)
+
+    async def register(self, key: str, value: T) -> None:
+        """注册连接，同一ID的旧连接被替换"""
+        idx = self._shard(key)
+        async with self._locks[idx]:
+            self._maps[idx][key] = value
+
+    async def unregister(self, key: str, value: T) -> bool:
+        """注销连接；若该ID已被新连接替换则保留新连接，返回是否移除"""
+        idx = self._shard(key)
+        async with self._locks[idx]:
+            shard = self._maps[idx]
+            if shard.get(key) is value:
+                del shard[key]
+                return True
+            return False
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._maps[self._shard(key)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._maps)
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self._maps:
+            yield from list(shard)